@@ -1,62 +1,38 @@
+import time
+STARTUP_T0 = time.perf_counter()
+
 import customtkinter as ctk
 from tkinter import filedialog
 import threading
-import subprocess
 import os
 import sys
 
+from glitchstem.catalog import describe as describe_catalog_entry, get_catalog, register_model
+from glitchstem.combine import METHODS as COMBINE_METHODS
+from glitchstem.delivery import DEFAULT_FORMAT, DELIVERY_FORMATS
+from glitchstem.drums import DRUM_SAMPLE_RATE, count_hits, drums_available, transcribe_drums, write_drum_midi
+from glitchstem.engine import SeparationEngine
+from glitchstem.features import FeatureStore
+from glitchstem.gating import DEFAULT_GATE_DB, SilenceGate
+from glitchstem.hardware import cached_gpu_info, get_recommended_preset
+from glitchstem.logpump import LogPump
+from glitchstem.metrics import MetricsWriter
+from glitchstem.midi_batch import job_record, plan_midi_batch, run_midi_batch
+from glitchstem.models import MODEL_DATABASE, HARDWARE_PRESETS, ENSEMBLE_PRESETS
+from glitchstem.oom import MemoryProfile
+from glitchstem.paths import app_path
+from glitchstem.residency import inprocess_available
+from glitchstem.staging import InputStaging
+from glitchstem.stem_cache import StemCache
+from glitchstem.tracing import finish_run, span, start_run
+from glitchstem.transcription import (PIANO_SAMPLE_RATE, get_transcription_engine, transcribe_stream,
+                                      transcription_available)
+from glitchstem.tuning import TuningStore
+
 # Theme
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("dark-blue")
 
-# GPU Detection
-def detect_gpu_info():
-    """Detect NVIDIA GPU and VRAM size"""
-    gpu_info = {"name": None, "vram_gb": 0, "cuda_available": False}
-    
-    # Try PyTorch first (most reliable if available)
-    try:
-        import torch
-        if torch.cuda.is_available():
-            gpu_info["cuda_available"] = True
-            gpu_info["name"] = torch.cuda.get_device_name(0)
-            gpu_info["vram_gb"] = torch.cuda.get_device_properties(0).total_memory / (1024**3)
-            return gpu_info
-    except:
-        pass
-    
-    # Fallback: nvidia-smi
-    try:
-        result = subprocess.run(
-            ["nvidia-smi", "--query-gpu=name,memory.total", "--format=csv,noheader,nounits"],
-            capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        if result.returncode == 0:
-            parts = result.stdout.strip().split(", ")
-            if len(parts) >= 2:
-                gpu_info["name"] = parts[0]
-                gpu_info["vram_gb"] = float(parts[1]) / 1024  # MB to GB
-                gpu_info["cuda_available"] = True
-    except:
-        pass
-    
-    return gpu_info
-
-def get_recommended_preset(vram_gb):
-    """Get recommended preset based on VRAM"""
-    if vram_gb <= 0:
-        return "CPU Only (No GPU)"
-    elif vram_gb < 5:
-        return "Laptop / Low VRAM (2-4GB)"
-    elif vram_gb < 9:
-        return "Mid-Range (6-8GB VRAM)"
-    elif vram_gb < 14:
-        return "High-End (10-12GB VRAM)"
-    elif vram_gb < 22:
-        return "Enthusiast (16-24GB VRAM)"
-    else:
-        return "🔥 GOD MODE (24GB+ VRAM)"
-
 # Slider parameter info (for tooltips)
 PARAM_INFO = {
     "seg_size": {
@@ -79,308 +55,21 @@ PARAM_INFO = {
     }
 }
 
-# Drum transcription using librosa (load first as it's used by both)
-DRUMS_AVAILABLE = False
-try:
-    import librosa
-    import numpy as np
-    from mido import MidiFile, MidiTrack, Message
-    DRUMS_AVAILABLE = True
-except ImportError:
-    pass
-
-# MIDI extraction available flag
-MIDI_AVAILABLE = False
-PIANO_SAMPLE_RATE = 16000  # piano_transcription expects 16kHz
-try:
-    from piano_transcription_inference import PianoTranscription
-    import torch
-    MIDI_AVAILABLE = True
-except ImportError:
-    pass
-
-# GM Drum Map (standard MIDI drum notes)
-DRUM_MAP = {
-    'kick': 36,      # Bass Drum 1
-    'snare': 38,     # Acoustic Snare
-    'hihat': 42,     # Closed Hi-Hat
-    'hihat_open': 46, # Open Hi-Hat
-    'tom_low': 45,   # Low Tom
-    'tom_mid': 47,   # Mid Tom
-    'tom_high': 50,  # High Tom
-    'crash': 49,     # Crash Cymbal 1
-    'ride': 51,      # Ride Cymbal 1
-}
+# Drum transcription (librosa + mido) and melodic MIDI: only checked for here,
+# the modules themselves are imported in the background once the window is up
+DRUMS_AVAILABLE = drums_available()
+MIDI_AVAILABLE = transcription_available()
+# Load the piano transcription model in the background at startup
+PRELOAD_MIDI_MODEL = True
 
-# Model database with descriptions and filenames
-MODEL_DATABASE = {
-    # === 🆕 CUTTING EDGE (2025) ===
-    "BS-Roformer-SW-6stem": {
-        "file": "BS-Roformer-SW.ckpt",
-        "desc": "🆕 6-stem (vocals/bass/drums/guitar/piano/other) - jarredou",
-        "category": "multi-stem"
-    },
-    "BS-Roformer-MaleFemale": {
-        "file": "model_chorus_bs_roformer_ep_267_sdr_24.1275.ckpt",
-        "desc": "🆕 Split vocals into Male/Female (SDR 24.1) - Sucial",
-        "category": "vocals"
-    },
-    "BS-Roformer-VocalsRevive-V3": {
-        "file": "bs_roformer_vocals_revive_v3e_unwa.ckpt",
-        "desc": "🆕 Enhance/restore degraded vocals - Unwa",
-        "category": "utility"
-    },
-    "BS-Roformer-InstResurrection": {
-        "file": "bs_roformer_instrumental_resurrection_unwa.ckpt",
-        "desc": "🆕 Restore/enhance instrumentals - Unwa",
-        "category": "utility"
-    },
-    # === VOCALS - TOP TIER ===
-    "MelBand-Kim-Vocals": {
-        "file": "vocals_mel_band_roformer.ckpt",
-        "desc": "Best vocal extraction (SDR 12.6) - Kimberley Jensen",
-        "category": "vocals"
-    },
-    "MelBand-BigBeta4": {
-        "file": "melband_roformer_big_beta4.ckpt",
-        "desc": "Top-tier vocals (SDR 12.5) - unwa fine-tune",
-        "category": "vocals"
-    },
-    "MelBand-BigBeta5e": {
-        "file": "melband_roformer_big_beta5e.ckpt",
-        "desc": "Excellent vocals (SDR 12.4) - unwa",
-        "category": "vocals"
-    },
-    "MelBand-Kim-FT-Unwa": {
-        "file": "mel_band_roformer_kim_ft_unwa.ckpt",
-        "desc": "Kim model fine-tuned (SDR 12.4) - unwa",
-        "category": "vocals"
-    },
-    "MelBand-BigSYHFT-V1": {
-        "file": "MelBandRoformerBigSYHFTV1.ckpt",
-        "desc": "Big SYHFT vocals (SDR 12.3) - SYH99999",
-        "category": "vocals"
-    },
-    "BS-Roformer-ViperX-1296": {
-        "file": "model_bs_roformer_ep_368_sdr_12.9628.ckpt",
-        "desc": "BS-Roformer vocals (SDR 12.1) - ViperX",
-        "category": "vocals"
-    },
-    "BS-Roformer-ViperX-1297": {
-        "file": "model_bs_roformer_ep_317_sdr_12.9755.ckpt",
-        "desc": "Classic BS-Roformer (SDR 11.8) - ViperX",
-        "category": "vocals"
-    },
-    # === INSTRUMENTAL - TOP TIER ===
-    "MelBand-Inst-V2": {
-        "file": "melband_roformer_inst_v2.ckpt",
-        "desc": "Best instrumental (SDR 16.1) - Unwa",
-        "category": "instrumental"
-    },
-    "MelBand-InstVoc-Duality-V2": {
-        "file": "melband_roformer_instvox_duality_v2.ckpt",
-        "desc": "Balanced vocal/inst (SDR 16.1/11.0) - Unwa",
-        "category": "instrumental"
-    },
-    "MelBand-Inst-Bleedless-V3": {
-        "file": "mel_band_roformer_instrumental_bleedless_v3_gabox.ckpt",
-        "desc": "Minimal vocal bleed instrumental - Gabox",
-        "category": "instrumental"
-    },
-    # === DRUMS - SEPARATION ===
-    "DrumSep-6way": {
-        "file": "MDX23C-DrumSep-aufr33-jarredou.ckpt",
-        "desc": "🥁 Splits drums: kick/snare/toms/hh/ride/crash - aufr33",
-        "category": "drums"
-    },
-    "BS-Roformer-DrumBass": {
-        "file": "model_bs_roformer_ep_937_sdr_10.5309.ckpt",
-        "desc": "Isolate drum+bass from mix (SDR 10.5) - ViperX",
-        "category": "drums"
-    },
-    "Kuielab-Drums-A": {
-        "file": "kuielab_a_drums.onnx",
-        "desc": "Extract drums from mix (SDR 7.0) - Kuielab",
-        "category": "drums"
-    },
-    "Kuielab-Drums-B": {
-        "file": "kuielab_b_drums.onnx",
-        "desc": "Extract drums from mix (SDR 7.1) - Kuielab",
-        "category": "drums"
-    },
-    # === MULTI-STEM ===
-    "HTDemucs-ft": {
-        "file": "htdemucs_ft.yaml",
-        "desc": "4-stem (vocals/drums/bass/other) - Meta",
-        "category": "multi-stem"
-    },
-    "HTDemucs-6s": {
-        "file": "htdemucs_6s.yaml",
-        "desc": "6-stem (+guitar/piano) - Meta",
-        "category": "multi-stem"
-    },
-    # === UTILITY / POST-PROCESSING ===
-    # De-Reverb models
-    "DeReverb-MelBand-Anvuew": {
-        "file": "dereverb_mel_band_roformer_anvuew_sdr_19.1729.ckpt",
-        "desc": "Remove reverb (SDR 19.2) - anvuew - BEST",
-        "category": "utility"
-    },
-    "DeReverb-SuperBig": {
-        "file": "dereverb_super_big_mbr_ep_346.ckpt",
-        "desc": "Heavy de-reverb (large model) - Sucial",
-        "category": "utility"
-    },
-    "DeReverb-Echo-V2": {
-        "file": "dereverb-echo_mel_band_roformer_sdr_13.4843_v2.ckpt",
-        "desc": "Remove reverb + echo combined - Sucial",
-        "category": "utility"
-    },
-    "DeReverb-BS-Roformer": {
-        "file": "deverb_bs_roformer_8_384dim_10depth.ckpt",
-        "desc": "BS-Roformer de-reverb variant",
-        "category": "utility"
-    },
-    # De-Noise models
-    "Denoise-MelBand": {
-        "file": "denoise_mel_band_roformer_aufr33_sdr_27.9959.ckpt",
-        "desc": "Noise removal (SDR 28.0) - aufr33 - BEST",
-        "category": "utility"
-    },
-    "Denoise-Aggressive": {
-        "file": "denoise_mel_band_roformer_aufr33_aggr_sdr_27.9768.ckpt",
-        "desc": "Aggressive noise removal - aufr33",
-        "category": "utility"
-    },
-    "Denoise-Debleed": {
-        "file": "mel_band_roformer_denoise_debleed_gabox.ckpt",
-        "desc": "Denoise + remove stem bleed - Gabox",
-        "category": "utility"
-    },
-    # Bleed suppression (removes vocal remnants from instrumentals)
-    "Bleed-Suppressor": {
-        "file": "mel_band_roformer_bleed_suppressor_v1.ckpt",
-        "desc": "Remove vocal bleed from instrumentals - unwa",
-        "category": "utility"
-    },
-    # Instrumental enhancement
-    "Inst-Fullness-V3": {
-        "file": "mel_band_roformer_instrumental_fullness_v3_gabox.ckpt",
-        "desc": "Enhance instrumental fullness/body - Gabox",
-        "category": "utility"
-    },
-}
+# Console: how often queued log lines are drawn, how many per frame, and how
+# many lines the console keeps (oldest are trimmed)
+LOG_INTERVAL_MS = 50
+LOG_LINES_PER_FRAME = 2000
+CONSOLE_MAX_LINES = 5000
 
-# Hardware presets for different PC configurations
-HARDWARE_PRESETS = {
-    "CPU Only (No GPU)": {
-        "desc": "For systems without NVIDIA GPU or CUDA support",
-        "requirements": "Any CPU, 8GB+ RAM, No GPU required",
-        "seg_size": 128,
-        "overlap": 4,
-        "batch_size": 1,
-        "notes": "Slowest but works on any system. Expect 5-10x longer processing times.",
-        "recommended_models": ["HTDemucs-ft", "Kuielab-Drums-A"]
-    },
-    "Laptop / Low VRAM (2-4GB)": {
-        "desc": "Entry-level NVIDIA GPUs (GTX 1050, 1650, MX series)",
-        "requirements": "NVIDIA GPU with 2-4GB VRAM, CUDA support",
-        "seg_size": 128,
-        "overlap": 4,
-        "batch_size": 1,
-        "notes": "Safe settings to avoid VRAM crashes. Avoid large models.",
-        "recommended_models": ["HTDemucs-ft", "Kuielab-Drums-A", "Kuielab-Drums-B"]
-    },
-    "Mid-Range (6-8GB VRAM)": {
-        "desc": "GTX 1060/1070/1080, RTX 2060/2070, RTX 3060",
-        "requirements": "NVIDIA GPU with 6-8GB VRAM",
-        "seg_size": 256,
-        "overlap": 8,
-        "batch_size": 2,
-        "notes": "Good balance of speed and quality. Most models work well.",
-        "recommended_models": ["MelBand-Kim-Vocals", "MelBand-Inst-V2", "HTDemucs-ft"]
-    },
-    "High-End (10-12GB VRAM)": {
-        "desc": "RTX 2080, RTX 3060 Ti/3070/3080, RTX 4070",
-        "requirements": "NVIDIA GPU with 10-12GB VRAM",
-        "seg_size": 512,
-        "overlap": 10,
-        "batch_size": 4,
-        "notes": "Fast processing with high quality. All models supported.",
-        "recommended_models": ["MelBand-BigBeta4", "BS-Roformer-SW-6stem", "DrumSep-6way"]
-    },
-    "Enthusiast (16-24GB VRAM)": {
-        "desc": "RTX 3090/3090 Ti, RTX 4080/4090, A5000/A6000",
-        "requirements": "NVIDIA GPU with 16-24GB VRAM",
-        "seg_size": 1024,
-        "overlap": 12,
-        "batch_size": 6,
-        "notes": "High quality settings. Can run multiple models in ensemble.",
-        "recommended_models": ["All models supported", "Ensemble workflows recommended"]
-    },
-    "🔥 GOD MODE (24GB+ VRAM)": {
-        "desc": "Maximum quality - RTX 3090 Ti, RTX 4090, Pro cards",
-        "requirements": "NVIDIA GPU with 24GB+ VRAM (3090 Ti, 4090, A6000)",
-        "seg_size": 2048,
-        "overlap": 12,
-        "batch_size": 8,
-        "notes": "Maximum segment size for best quality. No compromises.",
-        "recommended_models": ["All models at max settings", "Complex ensembles"]
-    },
-}
-
-# Ensemble presets - run multiple models and average results
-ENSEMBLE_PRESETS = {
-    "ENSEMBLE: 🥁 Drum Isolation + Split": {
-        "desc": "Extract drums from mix → split into kick/snare/hh/toms/cymbals",
-        "models": ["HTDemucs-ft"],
-        "post_process": "DrumSep-6way",
-        "output_stem": "drums"
-    },
-    "ENSEMBLE: 🎸 Clean Instrumental": {
-        "desc": "Best instrumental + de-reverb + bleed removal",
-        "models": ["MelBand-Inst-V2"],
-        "post_process": "Bleed-Suppressor",
-        "output_stem": "instrumental"
-    },
-    "ENSEMBLE: 🎸 Studio Instrumental": {
-        "desc": "Instrumental → denoise → de-reverb (cleanest output)",
-        "models": ["MelBand-Inst-Bleedless-V3"],
-        "post_process": "Denoise-MelBand",
-        "output_stem": "instrumental"
-    },
-    "ENSEMBLE: Ultimate Instrumental": {
-        "desc": "Two top models for comparison/averaging",
-        "models": ["MelBand-Inst-V2", "MelBand-Inst-Bleedless-V3"],
-        "post_process": None,
-        "output_stem": "instrumental"
-    },
-    "ENSEMBLE: 🎛️ Full Mix Breakdown": {
-        "desc": "HTDemucs 4-stem (drums/bass/vocals/other) + denoise",
-        "models": ["HTDemucs-ft"],
-        "post_process": "Denoise-MelBand",
-        "output_stem": "instrumental"
-    },
-    "ENSEMBLE: Studio Master": {
-        "desc": "Vocals + instrumental separation with de-reverb",
-        "models": ["MelBand-Kim-Vocals", "MelBand-Inst-V2"],
-        "post_process": "DeReverb-MelBand-Anvuew",
-        "output_stem": "vocals"
-    },
-    "ENSEMBLE: Ultimate Vocals": {
-        "desc": "Best vocal quality - 2 top models + de-reverb",
-        "models": ["MelBand-Kim-Vocals", "MelBand-BigBeta4"],
-        "post_process": "DeReverb-MelBand-Anvuew",
-        "output_stem": "vocals"
-    },
-    "⚙️ CUSTOM ENSEMBLE...": {
-        "desc": "Build your own workflow - click to configure",
-        "models": [],
-        "post_process": None,
-        "output_stem": "custom",
-        "is_custom": True
-    },
-}
+# Job and pass records of every run (progress updates only drive the bar)
+METRICS_LOG = app_path("metrics.jsonl")
 
 class GlitchStemUltraApp(ctk.CTk):
     def __init__(self):
@@ -391,10 +80,19 @@ class GlitchStemUltraApp(ctk.CTk):
         self.resizable(True, True)
         self.minsize(850, 950)
 
+        # Worker threads only queue log lines; _pump_log draws them on the Tk thread
+        self.log_pump = LogPump()
+        self.metrics_log = MetricsWriter(METRICS_LOG, progress=False)
+        # Latest progress record of the running pass, read by _pump_log
+        self.progress_state = None
+
         # Data
         self.input_file = ""
         self.output_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "Stems_Output"))
-        self.separator_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "venv_ultra", "Scripts", "audio-separator"))
+        self.engine = SeparationEngine(log=self.log, stem_cache=StemCache(), staging=InputStaging(),
+                                       metrics=self.on_metrics, memory_profile=MemoryProfile())
+        self.feature_store = FeatureStore()
+        self.separator_path = self.engine.separator_path
 
         # Layout
         self.grid_columnconfigure(0, weight=1)
@@ -522,20 +220,65 @@ class GlitchStemUltraApp(ctk.CTk):
         self.manual_note = ctk.CTkLabel(self.settings_frame, text="(Adjust sliders manually to fine-tune)", 
                                         font=("Roboto", 9), text_color="#666")
         self.manual_note.grid(row=11, column=0, columnspan=2, pady=(5, 10))
+
+        # Keep models loaded between passes (in-process backend)
+        self.keep_models_var = ctk.BooleanVar(value=False)
+        self.keep_models_check = ctk.CTkCheckBox(self.settings_frame, text="Keep models loaded between passes",
+                                                 variable=self.keep_models_var, command=self.on_keep_models_change,
+                                                 font=("Roboto", 11))
+        self.keep_models_check.grid(row=12, column=0, columnspan=2, pady=(0, 10))
+        if not inprocess_available():
+            self.keep_models_check.configure(state="disabled")
+
+        # Per-model settings from `glitchstem tune` (override the sliders for tuned models)
+        self.use_tuned_var = ctk.BooleanVar(value=False)
+        self.use_tuned_check = ctk.CTkCheckBox(self.settings_frame, text="Use auto-tuned settings per model",
+                                               variable=self.use_tuned_var, command=self.on_use_tuned_change,
+                                               font=("Roboto", 11))
+        self.use_tuned_check.grid(row=13, column=0, columnspan=2, pady=(0, 10))
+
+        # Run models only where the input has signal (see glitchstem.gating)
+        self.skip_silence_var = ctk.BooleanVar(value=False)
+        self.skip_silence_check = ctk.CTkCheckBox(self.settings_frame, text="Skip silent regions",
+                                                  variable=self.skip_silence_var, command=self.on_skip_silence_change,
+                                                  font=("Roboto", 11))
+        self.skip_silence_check.grid(row=14, column=0, columnspan=2, pady=(0, 10))
+
+        # Encoding of the finished stems (written in the background, see glitchstem.delivery)
+        ctk.CTkLabel(self.settings_frame, text="Output format").grid(row=15, column=0, sticky="e", padx=10)
+        self.output_format_var = ctk.StringVar(value=DEFAULT_FORMAT)
+        self.output_format_combo = ctk.CTkComboBox(self.settings_frame, variable=self.output_format_var,
+                                                   values=list(DELIVERY_FORMATS), width=120,
+                                                   command=self.on_output_format_change)
+        self.output_format_combo.grid(row=15, column=1, sticky="w", padx=10, pady=(0, 10))
         
         # 4. Console Output
         self.console = ctk.CTkTextbox(self, height=180, font=("Consolas", 10), text_color="#bbb")
         self.console.grid(row=5, column=0, padx=20, pady=10, sticky="ew")
         self.console.insert("0.0", "Tex's Glitch Stem Ultra initialized.\nGPU acceleration enabled via PyTorch CUDA.\n")
+        # Progress bar key -> console line, for the progress lines at the end of the console
+        self.console_bars = {}
+        self.after(LOG_INTERVAL_MS, self._pump_log)
+
+        # 5. Pass progress
+        progress_frame = ctk.CTkFrame(self, fg_color="transparent")
+        progress_frame.grid(row=6, column=0, padx=20, pady=(0, 10), sticky="ew")
+        progress_frame.grid_columnconfigure(0, weight=1)
+        self.progress_bar = ctk.CTkProgressBar(progress_frame, progress_color="#00e5ff")
+        self.progress_bar.grid(row=0, column=0, sticky="ew")
+        self.progress_bar.set(0)
+        self.progress_label = ctk.CTkLabel(progress_frame, text="Idle", font=("Consolas", 10), text_color="#888")
+        self.progress_label.grid(row=0, column=1, padx=(10, 0))
+        self.shown_progress = None
 
-        # 5. Run Button
+        # 6. Run Button
         self.btn_run = ctk.CTkButton(self, text="INITIALIZE SEPARATION", command=self.run_separation, 
                                      height=50, fg_color="#00e5ff", text_color="black", font=("Roboto", 16, "bold"))
-        self.btn_run.grid(row=6, column=0, padx=20, pady=(0, 10), sticky="ew")
+        self.btn_run.grid(row=7, column=0, padx=20, pady=(0, 10), sticky="ew")
 
-        # 6. MIDI Extraction Section
+        # 7. MIDI Extraction Section
         self.midi_frame = ctk.CTkFrame(self)
-        self.midi_frame.grid(row=7, column=0, padx=20, pady=5, sticky="ew")
+        self.midi_frame.grid(row=8, column=0, padx=20, pady=5, sticky="ew")
         self.midi_frame.grid_columnconfigure(0, weight=1)
         self.midi_frame.grid_columnconfigure(1, weight=1)
         
@@ -553,6 +296,10 @@ class GlitchStemUltraApp(ctk.CTk):
         self.midi_file_label = ctk.CTkLabel(midi_file_frame, text="No stem selected", font=("Consolas", 10), text_color="#666")
         self.midi_file_label.pack(side="left", padx=10)
         
+        self.btn_midi_batch = ctk.CTkButton(midi_file_frame, text="Batch Folder...", width=120,
+                                             command=self.run_midi_batch, fg_color="#333", hover_color="#444")
+        self.btn_midi_batch.pack(side="left", padx=5)
+        
         # Piano/Melodic extraction (left)
         piano_frame = ctk.CTkFrame(self.midi_frame)
         piano_frame.grid(row=2, column=0, padx=10, pady=10, sticky="nsew")
@@ -579,18 +326,76 @@ class GlitchStemUltraApp(ctk.CTk):
         
         self.midi_input_file = ""
         
-        if not MIDI_AVAILABLE:
-            self.btn_midi_extract.configure(state="disabled")
-        if not DRUMS_AVAILABLE:
-            self.btn_drum_extract.configure(state="disabled")
+        # Enabled by on_imports_ready once librosa / torch have been imported
+        self.btn_midi_extract.configure(state="disabled", text="Loading...")
+        self.btn_drum_extract.configure(state="disabled", text="Loading...")
+        self.btn_midi_batch.configure(state="disabled")
 
-        # 7. Footer
+        # 8. Footer
         self.footer = ctk.CTkLabel(self, text="TeXmExDeX Type Tunes", font=("Roboto", 11), text_color="#666")
-        self.footer.grid(row=8, column=0, pady=(10, 15), sticky="s")
+        self.footer.grid(row=9, column=0, pady=(10, 15), sticky="s")
+
+        # Hardware probe and heavy imports run off the Tk thread; the app is
+        # "ready" once both have reported back
+        self.startup_pending = {"hardware", "imports"}
+        self.after(0, self.on_first_window)
 
         # Auto-detect GPU and set recommended preset
         self.auto_detect_hardware()
 
+        # Warm melodic transcription model, shared by every extraction
+        self.transcriber = get_transcription_engine(log=self.log)
+        if MIDI_AVAILABLE and PRELOAD_MIDI_MODEL:
+            self.log(">> Loading piano transcription model in the background...")
+            self.transcriber.start(preload=True)
+
+        threading.Thread(target=self._import_thread, name="imports", daemon=True).start()
+        # The catalog section of the model dropdown fills in once it is indexed
+        threading.Thread(target=self._catalog_thread, name="catalog", daemon=True).start()
+
+    def on_first_window(self):
+        """First pass of the event loop: the window is on screen"""
+        self.log(f">> Window ready in {time.perf_counter() - STARTUP_T0:.2f}s")
+
+    def startup_step_done(self, step):
+        self.startup_pending.discard(step)
+        if not self.startup_pending:
+            self.log(f">> Startup complete in {time.perf_counter() - STARTUP_T0:.2f}s")
+
+    def _import_thread(self):
+        """Import the MIDI extraction stack in the background"""
+        drums_ready = midi_ready = False
+        if DRUMS_AVAILABLE:
+            try:
+                # librosa loads submodules on first use; pull in the ones the drum path needs
+                import librosa.beat
+                import librosa.feature
+                import librosa.onset
+                import mido
+                drums_ready = True
+            except Exception as e:
+                self.after(0, self.log, f">> Drum transcription unavailable: {str(e)}")
+        if MIDI_AVAILABLE:
+            try:
+                import piano_transcription_inference
+                midi_ready = True
+            except Exception as e:
+                self.after(0, self.log, f">> Melodic transcription unavailable: {str(e)}")
+        self.after(0, self.on_imports_ready, drums_ready, midi_ready)
+
+    def on_imports_ready(self, drums_ready, midi_ready):
+        if midi_ready:
+            self.btn_midi_extract.configure(state="normal", text="Extract Melodic MIDI")
+        else:
+            self.btn_midi_extract.configure(text="Extract Melodic MIDI")
+        if drums_ready:
+            self.btn_drum_extract.configure(state="normal", text="Extract Drum MIDI")
+        else:
+            self.btn_drum_extract.configure(text="Extract Drum MIDI")
+        if drums_ready or midi_ready:
+            self.btn_midi_batch.configure(state="normal")
+        self.startup_step_done("imports")
+
     def build_model_list(self):
         """Build display list with categories - BEST/NEWEST FIRST"""
         models = []
@@ -652,31 +457,42 @@ class GlitchStemUltraApp(ctk.CTk):
         elif selection in MODEL_DATABASE:
             self.model_desc.configure(text=MODEL_DATABASE[selection]["desc"])
         else:
-            self.model_desc.configure(text="")
+            # Catalog models join MODEL_DATABASE once picked
+            key = register_model(selection)
+            self.model_desc.configure(text=MODEL_DATABASE[key]["desc"] if key else "")
 
     def refresh_models(self):
-        """Check for new models from audio-separator"""
+        """Re-read the model catalog (models_list.json) and list what is new"""
         self.log("\n>> Checking for model updates...")
         self.btn_refresh.configure(state="disabled", text="Checking...")
-        thread = threading.Thread(target=self._refresh_models_thread)
-        thread.start()
+        threading.Thread(target=self._catalog_thread, args=(True,), name="catalog", daemon=True).start()
 
-    def _refresh_models_thread(self):
+    def _catalog_thread(self, verbose=False):
+        """Load the indexed model catalog off the Tk thread (no separator process needed)"""
         try:
-            cmd = [self.separator_path, "--list_models", "--list_limit", "200"]
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
-                                       text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            output, _ = process.communicate(timeout=30)
-            
-            # Count models
-            model_count = output.count(".ckpt") + output.count(".onnx") + output.count(".yaml")
-            self.log(f">> Found {model_count} models available in audio-separator")
-            self.log(">> Tip: Run 'pip install --upgrade audio-separator[gpu]' for newest models")
-            
-        except Exception as e:
-            self.log(f">> Error checking models: {str(e)}")
-        
+            catalog = get_catalog(reload=verbose)
+        except (OSError, ValueError) as e:
+            self.after(0, self.log, f">> Model catalog unavailable: {str(e)}")
+            catalog = None
+        self.after(0, self.on_catalog_ready, catalog, verbose)
+
+    def on_catalog_ready(self, catalog, verbose):
+        """Append the catalog models MODEL_DATABASE does not have to the dropdown"""
         self.btn_refresh.configure(state="normal", text="🔄 Check Updates")
+        if catalog is None:
+            return
+        fresh = catalog.new_models()
+        header = "═══ 📚 MORE MODELS (catalog) ═══"
+        base = self.model_list[:self.model_list.index(header)] if header in self.model_list else self.model_list
+        self.model_list = base + ([header] + [entry["key"] for entry in fresh] if fresh else [])
+        self.model_combo.configure(values=self.model_list)
+        if verbose:
+            archs = ", ".join(f"{count} {arch}" for arch, count in catalog.architectures().items())
+            self.log(f">> Found {len(catalog)} models in the catalog ({archs}), {len(fresh)} not in the curated list")
+            for entry in fresh[:5]:
+                self.log(f"   {entry['key']}: {describe_catalog_entry(entry)}")
+            self.log(">> Tip: Run 'pip install --upgrade audio-separator[gpu]' and "
+                     "'audio-separator --list_models --list_format json > models_list.json' for newest models")
 
     def select_file(self):
         filename = filedialog.askopenfilename(filetypes=[("Audio Files", "*.wav *.mp3 *.flac *.m4a *.ogg")])
@@ -747,6 +563,43 @@ class GlitchStemUltraApp(ctk.CTk):
             self.tooltip.destroy()
             self.tooltip = None
 
+    def on_keep_models_change(self):
+        """Switch between a fresh separator process per pass and resident models"""
+        if self.keep_models_var.get():
+            self.engine.backend = "inprocess"
+            self.log(">> Models will stay loaded between passes")
+        else:
+            self.engine.backend = "subprocess"
+            if self.engine.model_cache is not None:
+                self.engine.model_cache.clear()
+            self.log(">> Models will be loaded fresh for every pass")
+
+    def on_use_tuned_change(self):
+        """Run tuned models with their benchmarked settings instead of the sliders"""
+        if not self.use_tuned_var.get():
+            self.engine.tuned_settings = None
+            self.log(">> Using slider settings for every model")
+            return
+        tuned = TuningStore().tuned_settings()
+        self.engine.tuned_settings = tuned
+        if tuned:
+            self.log(f">> Using tuned settings for {len(tuned)} model(s): {', '.join(sorted(tuned))}")
+        else:
+            self.log(">> No tuned settings for this machine yet - run: glitchstem tune")
+
+    def on_skip_silence_change(self):
+        """Gate every pass: near-silent stretches skip inference"""
+        if self.skip_silence_var.get():
+            self.engine.gate = SilenceGate()
+            self.log(f">> Skipping regions below {DEFAULT_GATE_DB:g} dBFS")
+        else:
+            self.engine.gate = None
+            self.log(">> Running models on the whole input")
+
+    def on_output_format_change(self, selection):
+        self.engine.output_format = selection
+        self.log(f">> Final stems will be written as {selection}")
+
     def on_hardware_preset_change(self, selection):
         """Apply hardware preset settings"""
         if selection not in HARDWARE_PRESETS:
@@ -773,11 +626,20 @@ class GlitchStemUltraApp(ctk.CTk):
         self.log(f"   Segment: {preset['seg_size']}, Overlap: {preset['overlap']}, Batch: {preset['batch_size']}")
 
     def auto_detect_hardware(self):
-        """Auto-detect GPU and set recommended preset"""
+        """Auto-detect GPU in the background (cached on disk), then set the recommended preset"""
         self.log(">> Detecting hardware...")
-        
-        gpu_info = detect_gpu_info()
-        
+        threading.Thread(target=self._detect_hardware_thread, name="hardware", daemon=True).start()
+
+    def _detect_hardware_thread(self):
+        try:
+            gpu_info = cached_gpu_info()
+        except Exception as e:
+            self.after(0, self.log, f">> Hardware detection failed: {str(e)}")
+            gpu_info = {"name": None, "vram_gb": 0, "cuda_available": False}
+        self.after(0, self.apply_hardware, gpu_info)
+
+    def apply_hardware(self, gpu_info):
+        """Log the probe result and select its recommended preset"""
         if gpu_info["cuda_available"] and gpu_info["name"]:
             vram = gpu_info["vram_gb"]
             self.log(f">> GPU Detected: {gpu_info['name']}")
@@ -795,11 +657,69 @@ class GlitchStemUltraApp(ctk.CTk):
             self.log(">> Tip: Install CUDA drivers for GPU acceleration")
             self.hardware_var.set("CPU Only (No GPU)")
             self.on_hardware_preset_change("CPU Only (No GPU)")
+        self.startup_step_done("hardware")
 
     def log(self, message):
-        self.console.insert("end", message + "\n")
+        """Queue a console message (safe from any thread)"""
+        self.log_pump.push(message)
+
+    def on_metrics(self, record):
+        """Engine metrics callback (any thread): log records, keep the latest progress"""
+        self.metrics_log(record)
+        if record["type"] == "progress":
+            self.progress_state = record
+        elif record["type"] == "job":
+            self.progress_state = {"type": "job", "percent": 100, "workflow": record["workflow"],
+                                   "status": record["status"], "seconds": record["seconds"]}
+
+    def _pump_log(self):
+        """Draw queued log lines in one batch; progress bars are redrawn in place"""
+        try:
+            lines = self.log_pump.drain(LOG_LINES_PER_FRAME)
+            if lines:
+                self._write_console(lines)
+            self._update_progress()
+        finally:
+            self.after(LOG_INTERVAL_MS, self._pump_log)
+
+    def _update_progress(self):
+        state = self.progress_state
+        if state is self.shown_progress or state is None:
+            return
+        self.shown_progress = state
+        self.progress_bar.set(state["percent"] / 100)
+        if state["type"] == "job":
+            text = f"{state['workflow']}: {state['status']} in {state['seconds']:.1f}s"
+        else:
+            eta = state.get("eta_seconds")
+            text = f"{state['model']}: {state['percent']}%" + (f", ETA {int(eta) // 60}:{int(eta) % 60:02d}" if eta is not None else "")
+        self.progress_label.configure(text=text)
+
+    def _write_console(self, lines):
+        first_new = int(self.console.index("end-1c").split(".")[0])
+        appended = []
+        for line, key in lines:
+            row = self.console_bars.get(key) if key is not None else None
+            if row is None:
+                if key is None:
+                    self.console_bars.clear()
+                else:
+                    self.console_bars[key] = first_new + len(appended)
+                appended.append(line)
+            elif row >= first_new:
+                appended[row - first_new] = line
+            else:
+                self.console.delete(f"{row}.0", f"{row}.end")
+                self.console.insert(f"{row}.0", line)
+        if appended:
+            self.console.insert("end", "\n".join(appended) + "\n")
+
+        # Keep the console a bounded ring buffer
+        excess = int(self.console.index("end-1c").split(".")[0]) - 1 - CONSOLE_MAX_LINES
+        if excess > 0:
+            self.console.delete("1.0", f"{excess + 1}.0")
+            self.console_bars = {key: row - excess for key, row in self.console_bars.items() if row > excess}
         self.console.see("end")
-        self.update_idletasks()
 
     def run_separation(self):
         if not self.input_file:
@@ -862,6 +782,13 @@ class GlitchStemUltraApp(ctk.CTk):
         self.custom_stem = ctk.CTkComboBox(model_frame, values=["vocals", "instrumental", "drums", "other"], width=200)
         self.custom_stem.set("vocals")
         self.custom_stem.pack(pady=5)
+
+        ctk.CTkLabel(model_frame, text="Combine passes (when 2 models):", font=("Roboto", 11)).pack(pady=(15,5))
+        # No weight inputs in the dialog, so "weighted" is left out
+        combine_methods = [m for m in COMBINE_METHODS if m != "weighted"]
+        self.custom_combine = ctk.CTkComboBox(model_frame, values=["(None)"] + combine_methods, width=200)
+        self.custom_combine.set("(None)")
+        self.custom_combine.pack(pady=5)
         
         # Run button
         ctk.CTkButton(dialog, text="RUN CUSTOM WORKFLOW", height=40, fg_color="#00e5ff", text_color="black",
@@ -875,6 +802,7 @@ class GlitchStemUltraApp(ctk.CTk):
         
         post_process = self.custom_post.get() if self.custom_post.get() != "(None)" else None
         output_stem = self.custom_stem.get()
+        combine = self.custom_combine.get() if self.custom_combine.get() != "(None)" else None
         
         dialog.destroy()
         
@@ -882,209 +810,68 @@ class GlitchStemUltraApp(ctk.CTk):
         self.custom_ensemble_config = {
             "models": models,
             "post_process": post_process,
-            "output_stem": output_stem
+            "output_stem": output_stem,
+            "combine": combine
         }
         
         self.log(f"\n>> CUSTOM WORKFLOW:")
         self.log(f"   Models: {', '.join(models)}")
         if post_process:
             self.log(f"   Post-process: {post_process} → {output_stem}")
+        if combine and len(models) > 1:
+            self.log(f"   Combine: {combine}")
         
         self.btn_run.configure(state="disabled", text="PROCESSING...")
         thread = threading.Thread(target=self.process_custom_ensemble)
         thread.start()
 
+    def current_settings(self):
+        """Inference settings from the sliders"""
+        return {
+            "seg_size": int(self.seg_size.get()),
+            "overlap": int(self.overlap.get()),
+            "batch_size": int(self.batch_size.get()),
+        }
+
     def process_custom_ensemble(self):
         """Process custom ensemble workflow"""
-        config = self.custom_ensemble_config
-        models = config["models"]
-        post_process = config.get("post_process")
-        output_stem = config.get("output_stem", "vocals")
-        
-        base_name = os.path.splitext(os.path.basename(self.input_file))[0]
-        ensemble_dir = os.path.join(self.output_dir, f"{base_name}_custom")
-        if not os.path.exists(ensemble_dir):
-            os.makedirs(ensemble_dir)
-        
-        self.log(f"\n{'='*50}")
-        self.log(f"CUSTOM ENSEMBLE")
-        self.log(f"{'='*50}\n")
-        
-        all_success = True
-        for i, model_name in enumerate(models, 1):
-            self.log(f"\n[{i}/{len(models)}] Processing with {model_name}...")
-            model_output_dir = os.path.join(ensemble_dir, f"pass_{i}_{model_name}")
-            if not os.path.exists(model_output_dir):
-                os.makedirs(model_output_dir)
-            
-            success = self.run_model(model_name, self.input_file, model_output_dir)
-            if not success:
-                all_success = False
-                self.log(f">> WARNING: {model_name} failed")
-        
-        # Post-processing
-        if post_process and all_success:
-            self.log(f"\n[POST] Applying {post_process}...")
-            pass1_dir = os.path.join(ensemble_dir, f"pass_1_{models[0]}")
-            post_dir = os.path.join(ensemble_dir, "post_processed")
-            if not os.path.exists(post_dir):
-                os.makedirs(post_dir)
-            
-            for f in os.listdir(pass1_dir):
-                if not f.endswith(".wav"):
-                    continue
-                if output_stem.lower() in f.lower():
-                    target_file = os.path.join(pass1_dir, f)
-                    self.log(f">> Processing: {os.path.basename(target_file)}")
-                    self.run_model(post_process, target_file, post_dir)
-                    break
-        
-        self.log(f"\n{'='*50}")
-        self.log(f">> CUSTOM ENSEMBLE COMPLETE")
-        self.log(f">> Output: {ensemble_dir}")
-        self.log(f"{'='*50}")
-        
+        self.engine.settings.update(self.current_settings())
+        self.engine.process_custom_ensemble(self.custom_ensemble_config, self.input_file, self.output_dir)
+        self.finish_separation()
+
+    def finish_separation(self):
+        """Free the button for the next run; the final line waits for the background writer"""
         self.btn_run.configure(state="normal", text="INITIALIZE SEPARATION")
+        fmt = self.engine.output_format
+        # Take the futures over, so an earlier run's unfinished encode isn't reported twice
+        pending, self.engine.pending_outputs = self.engine.pending_outputs, []
+        for future in pending:
+            future.add_done_callback(lambda f: self.on_outputs_written(f, fmt))
 
-    def run_model(self, model_name, input_file, output_dir, suffix=""):
-        """Run a single model and return output files"""
-        if model_name not in MODEL_DATABASE:
-            self.log(f"ERROR: Unknown model {model_name}")
-            return None
-            
-        model_data = MODEL_DATABASE[model_name]
-        model_filename = model_data["file"]
-        
-        cmd = [
-            self.separator_path,
-            input_file,
-            "--model_filename", model_filename,
-            "--output_dir", output_dir,
-            "--output_format", "wav",
-            "--normalization", "0.9",
-            "--use_autocast"
-        ]
-        
-        # Add architecture-specific params
-        if "htdemucs" in model_filename:
-            cmd.extend(["--demucs_shifts", "4", "--demucs_overlap", "0.25"])
+    def on_outputs_written(self, future, fmt):
+        """Writer future callback (writer thread)"""
+        written, failed = future.result()
+        if failed:
+            self.log(f">> ERROR: {failed} output(s) could not be written as {fmt}")
         else:
-            cmd.extend([
-                "--mdxc_segment_size", str(int(self.seg_size.get())),
-                "--mdxc_overlap", str(int(self.overlap.get())),
-                "--mdxc_batch_size", str(int(self.batch_size.get()))
-            ])
-        
-        self.log(f"Running: {model_name}")
-        
-        try:
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
-                                       text=True, bufsize=1, creationflags=subprocess.CREATE_NO_WINDOW)
-            for line in process.stdout:
-                line = line.strip()
-                if line:
-                    self.log(line)
-            process.wait()
-            return process.returncode == 0
-        except Exception as e:
-            self.log(f"ERROR: {str(e)}")
-            return False
+            self.log(f">> OUTPUT COMPLETE: {len(written)} stem(s) written as {fmt}")
+
+    def run_model(self, model_name, input_file, output_dir, suffix=""):
+        """Run a single model with the current slider settings"""
+        self.engine.settings.update(self.current_settings())
+        return self.engine.run_model(model_name, input_file, output_dir, suffix)
 
     def process_single(self, model_name):
         """Process with a single model"""
-        output_path = self.output_dir
-        if not os.path.exists(output_path):
-            os.makedirs(output_path)
-        
-        self.log(f"\n{'='*50}")
-        self.log(f"Starting separation: {model_name}")
-        self.log(f"{'='*50}")
-        
-        success = self.run_model(model_name, self.input_file, output_path)
-        
-        if success:
-            self.log(f"\n>> SEPARATION COMPLETE")
-            self.log(f">> Output: {output_path}")
-        else:
-            self.log("\n>> ERROR: Separation failed")
-        
-        self.btn_run.configure(state="normal", text="INITIALIZE SEPARATION")
+        self.engine.settings.update(self.current_settings())
+        self.engine.process_single(model_name, self.input_file, self.output_dir)
+        self.finish_separation()
 
     def process_ensemble(self, preset_name):
         """Process with ensemble (multiple models)"""
-        preset = ENSEMBLE_PRESETS[preset_name]
-        models = preset["models"]
-        post_process = preset.get("post_process")
-        
-        # Create temp directory for ensemble processing
-        base_name = os.path.splitext(os.path.basename(self.input_file))[0]
-        ensemble_dir = os.path.join(self.output_dir, f"{base_name}_ensemble")
-        if not os.path.exists(ensemble_dir):
-            os.makedirs(ensemble_dir)
-        
-        self.log(f"\n{'='*50}")
-        self.log(f"ENSEMBLE MODE: {preset_name}")
-        self.log(f"Models: {', '.join(models)}")
-        if post_process:
-            self.log(f"Post-processing: {post_process}")
-        self.log(f"{'='*50}\n")
-        
-        # Run each model
-        all_success = True
-        for i, model_name in enumerate(models, 1):
-            self.log(f"\n[{i}/{len(models)}] Processing with {model_name}...")
-            model_output_dir = os.path.join(ensemble_dir, f"pass_{i}_{model_name}")
-            if not os.path.exists(model_output_dir):
-                os.makedirs(model_output_dir)
-            
-            success = self.run_model(model_name, self.input_file, model_output_dir)
-            if not success:
-                all_success = False
-                self.log(f">> WARNING: {model_name} failed, continuing...")
-        
-        # Post-processing pass (de-reverb, denoise, drum split, etc.)
-        if post_process and all_success:
-            self.log(f"\n[POST] Applying {post_process}...")
-            pass1_dir = os.path.join(ensemble_dir, f"pass_1_{models[0]}")
-            post_dir = os.path.join(ensemble_dir, "post_processed")
-            if not os.path.exists(post_dir):
-                os.makedirs(post_dir)
-            
-            output_stem = preset.get("output_stem", "vocals")
-            
-            # Find the right stem file(s) based on preset type
-            target_files = []
-            for f in os.listdir(pass1_dir):
-                if not f.endswith(".wav"):
-                    continue
-                f_lower = f.lower()
-                if output_stem == "drums" and "drum" in f_lower:
-                    target_files.append(os.path.join(pass1_dir, f))
-                elif output_stem == "vocals" and "vocal" in f_lower:
-                    target_files.append(os.path.join(pass1_dir, f))
-                elif output_stem == "instrumental" and ("instrument" in f_lower or "other" in f_lower):
-                    target_files.append(os.path.join(pass1_dir, f))
-                elif output_stem == "both" and "vocal" in f_lower:
-                    # For "both", apply post-processing to vocals
-                    target_files.append(os.path.join(pass1_dir, f))
-            
-            if target_files:
-                for target_file in target_files:
-                    self.log(f">> Processing: {os.path.basename(target_file)}")
-                    self.run_model(post_process, target_file, post_dir)
-            else:
-                self.log(f">> WARNING: Could not find {output_stem} stem for post-processing")
-        
-        if all_success:
-            self.log(f"\n{'='*50}")
-            self.log(f">> ENSEMBLE COMPLETE")
-            self.log(f">> Output directory: {ensemble_dir}")
-            self.log(f">> Tip: Compare outputs from each pass, or average them in your DAW")
-            self.log(f"{'='*50}")
-        else:
-            self.log("\n>> ENSEMBLE COMPLETED WITH ERRORS")
-        
-        self.btn_run.configure(state="normal", text="INITIALIZE SEPARATION")
+        self.engine.settings.update(self.current_settings())
+        self.engine.process_ensemble(preset_name, self.input_file, self.output_dir)
+        self.finish_separation()
 
     def select_midi_input(self):
         """Select a stem file for MIDI extraction"""
@@ -1115,24 +902,22 @@ class GlitchStemUltraApp(ctk.CTk):
 
     def _midi_extraction_thread(self):
         """MIDI extraction worker thread"""
+        start = time.perf_counter()
+        trace = start_run(f"midi-melodic {os.path.basename(self.midi_input_file)}")
+        status = "failed"
         try:
             self.log(f"\n{'='*50}")
             self.log("MIDI EXTRACTION")
             self.log(f"{'='*50}")
             self.log(f"Input: {os.path.basename(self.midi_input_file)}")
-            self.log("Loading audio...")
-            
-            # Load audio using librosa (compatible with all versions)
-            audio, sr = librosa.load(self.midi_input_file, sr=PIANO_SAMPLE_RATE, mono=True)
             
-            # Determine device
-            device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            self.log(f"Using device: {device.upper()}")
+            # 16 kHz audio is decoded block by block (and cached per stem) while
+            # earlier chunks are already being transcribed
+            features = self.feature_store.features(self.midi_input_file)
             
-            # Initialize transcriber with explicit checkpoint path (fixes Windows path issue)
-            self.log("Initializing piano transcription model...")
-            checkpoint_path = os.path.join(os.path.expanduser('~'), 'piano_transcription_inference_data', 'note_F1=0.9677_pedal_F1=0.9186.pth')
-            transcriptor = PianoTranscription(device=device, checkpoint_path=checkpoint_path)
+            # The model stays loaded between extractions; only the first one waits for it
+            if not self.transcriber.loaded:
+                self.log("Initializing piano transcription model...")
             
             # Generate output path
             input_dir = os.path.dirname(self.midi_input_file)
@@ -1142,17 +927,54 @@ class GlitchStemUltraApp(ctk.CTk):
             self.log("Transcribing to MIDI...")
             
             # Run transcription
-            transcriptor.transcribe(audio, midi_output)
+            result = transcribe_stream(self.transcriber, features.pcm_blocks(PIANO_SAMPLE_RATE), midi_output)
+            stats = self.transcriber.stats()
             
             self.log(f"\n>> MIDI EXTRACTION COMPLETE")
             self.log(f">> Output: {midi_output}")
+            self.log(f">> Device: {stats['device'].upper()} | {result['notes']} notes | "
+                     f"inference {result['seconds']:.1f}s over {result['chunks']} chunk(s) | "
+                     f"model load {stats['load_seconds']:.1f}s (once)")
             self.log(f"{'='*50}")
+            self.on_metrics(job_record(self.midi_input_file, "melodic", midi_output, start, time=time.time(),
+                                       notes=result["notes"], chunks=result["chunks"],
+                                       load_seconds=stats["load_seconds"], decode_seconds=result["decode_seconds"],
+                                       inference_seconds=result["seconds"], write_seconds=result["write_seconds"]))
+            status = "ok"
             
         except Exception as e:
             self.log(f"MIDI ERROR: {str(e)}")
         
+        finish_run(trace, log=self.log, status=status)
         self.btn_midi_extract.configure(state="normal", text="Extract Melodic MIDI")
 
+    def run_midi_batch(self):
+        """Transcribe every stem in a folder (drums and melodic routed by stem name)"""
+        initial_dir = self.output_dir if os.path.exists(self.output_dir) else None
+        folder = filedialog.askdirectory(initialdir=initial_dir)
+        if not folder:
+            return
+        
+        self.btn_midi_batch.configure(state="disabled", text="Extracting...")
+        thread = threading.Thread(target=self._midi_batch_thread, args=(folder,))
+        thread.start()
+
+    def _midi_batch_thread(self, folder):
+        """Folder MIDI batch worker thread"""
+        try:
+            self.log(f"\n{'='*50}")
+            self.log("🎹 BATCH MIDI EXTRACTION")
+            self.log(f"{'='*50}")
+            self.log(f"Folder: {folder}")
+            
+            plan = plan_midi_batch(folder, recursive=True)
+            run_midi_batch(plan, log=self.log, metrics=self.on_metrics)
+            self.log(f"{'='*50}")
+        except Exception as e:
+            self.log(f"MIDI BATCH ERROR: {str(e)}")
+        
+        self.btn_midi_batch.configure(state="normal", text="Batch Folder...")
+
     def run_drum_extraction(self):
         """Run drum transcription on selected stem"""
         if not self.midi_input_file:
@@ -1169,125 +991,51 @@ class GlitchStemUltraApp(ctk.CTk):
 
     def _drum_extraction_thread(self):
         """Drum transcription worker thread using onset detection + frequency analysis"""
+        start = time.perf_counter()
+        trace = start_run(f"midi-drums {os.path.basename(self.midi_input_file)}")
+        status = "failed"
         try:
             self.log(f"\n{'='*50}")
             self.log("🥁 DRUM TRANSCRIPTION")
             self.log(f"{'='*50}")
             self.log(f"Input: {os.path.basename(self.midi_input_file)}")
             
-            # Load audio
-            self.log("Loading audio...")
-            y, sr = librosa.load(self.midi_input_file, sr=44100, mono=True)
-            
-            # Detect onsets
-            self.log("Detecting drum hits...")
-            onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-            onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr, backtrack=True)
-            onset_times = librosa.frames_to_time(onset_frames, sr=sr)
-            
-            self.log(f"Found {len(onset_times)} potential drum hits")
-            
-            # Analyze frequency content at each onset to classify drum type
-            self.log("Classifying drum hits (kick/snare/hihat)...")
-            
-            drum_hits = []
-            hop_length = 512
+            features = self.feature_store.features(self.midi_input_file)
+            if features.cached:
+                self.log(">> Reusing cached analysis for this stem")
+            with span("drums.decode"):
+                features.pcm(DRUM_SAMPLE_RATE)
             
-            for onset_frame in onset_frames:
-                # Get a small window around the onset
-                start_sample = max(0, onset_frame * hop_length - 1024)
-                end_sample = min(len(y), onset_frame * hop_length + 4096)
-                segment = y[start_sample:end_sample]
-                
-                if len(segment) < 512:
-                    continue
-                
-                # Compute spectrum
-                spectrum = np.abs(np.fft.rfft(segment))
-                freqs = np.fft.rfftfreq(len(segment), 1/sr)
-                
-                # Frequency band energies
-                low_energy = np.sum(spectrum[(freqs >= 20) & (freqs < 150)])      # Kick range
-                mid_energy = np.sum(spectrum[(freqs >= 150) & (freqs < 1000)])    # Snare body
-                high_energy = np.sum(spectrum[(freqs >= 3000) & (freqs < 12000)]) # Hi-hat/cymbals
-                snare_crack = np.sum(spectrum[(freqs >= 1000) & (freqs < 5000)])  # Snare crack
-                
-                total_energy = low_energy + mid_energy + high_energy + snare_crack + 1e-10
-                
-                # Classify based on frequency distribution
-                low_ratio = low_energy / total_energy
-                high_ratio = high_energy / total_energy
-                snare_ratio = snare_crack / total_energy
-                
-                onset_time = librosa.frames_to_time(onset_frame, sr=sr)
-                
-                # Classification logic
-                if low_ratio > 0.4 and high_ratio < 0.2:
-                    drum_hits.append((onset_time, 'kick'))
-                elif snare_ratio > 0.25 and low_ratio > 0.15:
-                    drum_hits.append((onset_time, 'snare'))
-                elif high_ratio > 0.35:
-                    drum_hits.append((onset_time, 'hihat'))
-                else:
-                    # Default to hihat for ambiguous hits
-                    drum_hits.append((onset_time, 'hihat'))
-            
-            # Count hits by type
-            kick_count = sum(1 for _, t in drum_hits if t == 'kick')
-            snare_count = sum(1 for _, t in drum_hits if t == 'snare')
-            hihat_count = sum(1 for _, t in drum_hits if t == 'hihat')
-            
-            self.log(f"Classified: {kick_count} kicks, {snare_count} snares, {hihat_count} hi-hats")
-            
-            # Create MIDI file
-            self.log("Creating MIDI file...")
-            mid = MidiFile()
-            track = MidiTrack()
-            mid.tracks.append(track)
+            # Onsets, band energies and tempo are computed once per stem and cached
+            self.log("Detecting and classifying drum hits (kick/snare/hihat)...")
+            drum_hits, tempo = transcribe_drums(features)
+            self.log(f"Found {len(drum_hits)} drum hits, tempo ~{tempo:.1f} BPM")
             
-            # Set tempo (120 BPM default, can be detected)
-            tempo = 500000  # microseconds per beat (120 BPM)
-            track.append(Message('program_change', program=0, time=0))
-            
-            # Sort hits by time
-            drum_hits.sort(key=lambda x: x[0])
-            
-            # Convert to MIDI events
-            ticks_per_beat = mid.ticks_per_beat
-            prev_tick = 0
-            
-            for time_sec, drum_type in drum_hits:
-                # Convert time to ticks
-                tick = int(time_sec * ticks_per_beat * 2)  # Assuming 120 BPM
-                delta = max(0, tick - prev_tick)
-                
-                note = DRUM_MAP.get(drum_type, 42)
-                velocity = 100
-                
-                # Note on
-                track.append(Message('note_on', note=note, velocity=velocity, time=delta, channel=9))
-                # Note off (short duration for drums)
-                track.append(Message('note_off', note=note, velocity=0, time=50, channel=9))
-                
-                prev_tick = tick + 50
+            counts = count_hits(drum_hits)
+            self.log(f"Classified: {counts.get('kick', 0)} kicks, {counts.get('snare', 0)} snares, "
+                     f"{counts.get('hihat', 0)} hi-hats")
             
             # Save MIDI
+            self.log("Creating MIDI file...")
             input_dir = os.path.dirname(self.midi_input_file)
             input_name = os.path.splitext(os.path.basename(self.midi_input_file))[0]
-            midi_output = os.path.join(input_dir, f"{input_name}_drums.mid")
-            
-            mid.save(midi_output)
+            with span("drums.write_midi", hits=len(drum_hits)):
+                midi_output = write_drum_midi(drum_hits, os.path.join(input_dir, f"{input_name}_drums.mid"), bpm=tempo)
             
             self.log(f"\n>> DRUM TRANSCRIPTION COMPLETE")
             self.log(f">> Output: {midi_output}")
             self.log(f">> Total hits: {len(drum_hits)}")
             self.log(f"{'='*50}")
+            self.on_metrics(job_record(self.midi_input_file, "drums", midi_output, start, time=time.time(),
+                                       hits=len(drum_hits), counts=counts, tempo=tempo, cached=features.cached))
+            status = "ok"
             
         except Exception as e:
             self.log(f"DRUM ERROR: {str(e)}")
             import traceback
             self.log(traceback.format_exc())
         
+        finish_run(trace, log=self.log, status=status)
         self.btn_drum_extract.configure(state="normal", text="Extract Drum MIDI")
 
 
@@ -0,0 +1,11 @@
+@echo off
+:: Headless CLI - same venv as run_ultra.bat
+if not exist "%~dp0venv_ultra\Scripts\activate.bat" (
+    echo [ERROR] Virtual environment not found at venv_ultra
+    echo [INFO] Please run setup_ultra.bat first.
+    exit /b 1
+)
+
+call "%~dp0venv_ultra\Scripts\activate"
+set PYTHONPATH=%~dp0;%PYTHONPATH%
+python -m glitchstem %*
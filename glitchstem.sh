@@ -0,0 +1,7 @@
+#!/bin/sh
+# Headless CLI launcher for Linux/macOS render boxes - same venv as run_ultra.bat
+HERE="$(cd "$(dirname "$0")" && pwd)"
+if [ -f "$HERE/venv_ultra/bin/activate" ]; then
+    . "$HERE/venv_ultra/bin/activate"
+fi
+PYTHONPATH="$HERE${PYTHONPATH:+:$PYTHONPATH}" exec python3 -m glitchstem "$@"
@@ -0,0 +1,4 @@
+"""Headless separation engine behind Tex's Glitch Stem Ultra.
+
+Run ``python -m glitchstem --help`` (or the ``glitchstem`` launcher) for the CLI.
+"""
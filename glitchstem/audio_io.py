@@ -0,0 +1,118 @@
+"""Block-wise audio access: memory-mapped WAV reading and streaming writes.
+
+PCM16/PCM32/float WAV data is memory-mapped straight from the file and
+converted to float32 one block at a time, so combining or gating a
+20-minute stem never holds more than a block in memory. Anything else
+(24-bit, FLAC, ...) falls back to soundfile's seek/read.
+"""
+import os
+import struct
+
+import numpy as np
+
+# (format tag, bits) -> (dtype, scale to [-1, 1])
+WAV_DTYPES = {
+    (1, 16): ("<i2", 1.0 / 32768),
+    (1, 32): ("<i4", 1.0 / 2147483648),
+    (3, 32): ("<f4", 1.0),
+    (3, 64): ("<f8", 1.0),
+}
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+DEFAULT_BLOCK_FRAMES = 1 << 18  # ~6 s at 44.1 kHz
+
+
+def _wav_layout(path):
+    """(format, channels, samplerate, bits, data_offset, data_bytes) or None"""
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = struct.unpack("<4sI", chunk)
+            if chunk_id == b"fmt ":
+                body = f.read(size)
+                audio_format, channels, samplerate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                if audio_format == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                    audio_format = struct.unpack("<H", body[24:26])[0]
+                fmt = (audio_format, channels, samplerate, bits)
+                if size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                offset = f.tell()
+                # Streaming writers leave 0 / 0xFFFFFFFF until they finish; trust the file size
+                available = os.path.getsize(path) - offset
+                data_bytes = available if size in (0, 0xFFFFFFFF) else min(size, available)
+                return fmt + (offset, data_bytes)
+            else:
+                f.seek(size + (size % 2), os.SEEK_CUR)
+
+
+class AudioReader:
+    """Random-access float32 blocks of shape (frames, channels)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._memmap = None
+        self._sf = None
+
+        layout = _wav_layout(path) if path.lower().endswith(".wav") else None
+        if layout and (layout[0], layout[3]) in WAV_DTYPES:
+            audio_format, channels, samplerate, bits, offset, data_bytes = layout
+            dtype, self._scale = WAV_DTYPES[(audio_format, bits)]
+            frame_bytes = channels * bits // 8
+            self.frames = data_bytes // frame_bytes
+            self.channels = channels
+            self.samplerate = samplerate
+            if self.frames:
+                self._memmap = np.memmap(path, dtype=dtype, mode="r", offset=offset,
+                                         shape=(self.frames, channels))
+        else:
+            import soundfile as sf
+            self._sf = sf.SoundFile(path)
+            self.frames = self._sf.frames
+            self.channels = self._sf.channels
+            self.samplerate = self._sf.samplerate
+
+    def read(self, start, stop):
+        """Samples [start, stop) as float32, zero-padded outside the file"""
+        out = np.zeros((stop - start, self.channels), dtype=np.float32)
+        lo, hi = max(start, 0), min(stop, self.frames)
+        if hi <= lo:
+            return out
+        if self._memmap is not None:
+            block = self._memmap[lo:hi]
+            out[lo - start:hi - start] = block if self._scale == 1.0 else block * np.float32(self._scale)
+        else:
+            self._sf.seek(lo)
+            out[lo - start:hi - start] = self._sf.read(hi - lo, dtype="float32", always_2d=True)
+        return out
+
+    def blocks(self, block_frames=DEFAULT_BLOCK_FRAMES):
+        """Yield (start, block) over the whole file"""
+        for start in range(0, self.frames, block_frames):
+            yield start, self.read(start, min(start + block_frames, self.frames))
+
+    def close(self):
+        self._memmap = None
+        if self._sf is not None:
+            self._sf.close()
+            self._sf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_writer(path, samplerate, channels, subtype="PCM_16"):
+    """soundfile writer for block-by-block output"""
+    import soundfile as sf
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return sf.SoundFile(path, "w", samplerate=samplerate, channels=channels, subtype=subtype)
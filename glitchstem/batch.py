@@ -0,0 +1,167 @@
+"""Batch job collection and the bounded process-pool runner"""
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .delivery import DEFAULT_FORMAT
+from .engine import SeparationEngine
+from .gating import SilenceGate
+from .memory import GB, MemoryBudget
+from .metrics import MetricsWriter
+from .oom import DEFAULT_OOM_RETRIES, MemoryProfile
+from .residency import get_default_cache
+from .staging import InputStaging
+from .stem_cache import DEFAULT_CACHE_DIR, StemCache
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".m4a", ".ogg")
+
+
+def collect_inputs(source, recursive=False):
+    """Expand a file, folder or manifest into a list of job dicts.
+
+    A manifest is either a text file with one audio path per line ('#'
+    starts a comment) or a JSON list of {"input": ..., "model": ...}
+    entries. Relative manifest paths are resolved against the manifest's
+    folder. Entries without a "model" use the CLI's --model.
+    """
+    source = os.path.abspath(source)
+
+    if os.path.isdir(source):
+        return [{"input": path} for path in _scan_folder(source, recursive)]
+
+    ext = os.path.splitext(source)[1].lower()
+    if ext in AUDIO_EXTENSIONS:
+        return [{"input": source}]
+
+    base_dir = os.path.dirname(source)
+    with open(source, "r", encoding="utf-8") as f:
+        if ext == ".json":
+            entries = json.load(f)
+        else:
+            entries = [{"input": line.strip()} for line in f
+                       if line.strip() and not line.strip().startswith("#")]
+
+    jobs = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"input": entry}
+        job = dict(entry)
+        job["input"] = os.path.join(base_dir, os.path.expanduser(job["input"]))
+        jobs.append(job)
+    return jobs
+
+def _scan_folder(folder, recursive):
+    found = []
+    for root, dirs, files in os.walk(folder):
+        for f in sorted(files):
+            if f.lower().endswith(AUDIO_EXTENSIONS):
+                found.append(os.path.join(root, f))
+        if not recursive:
+            break
+    return found
+
+def build_engine(job, log, metrics=None):
+    """SeparationEngine for one job dict (the fields cli.separation_options fills in)"""
+    backend = job.get("backend", "subprocess")
+    model_cache = None
+    if backend == "inprocess":
+        # Shared by every job this process runs, so models stay loaded between files
+        budget_gb = job.get("model_cache_gb")
+        model_cache = get_default_cache(int(budget_gb * GB) if budget_gb else None)
+
+    stem_cache = None
+    if job.get("stem_cache", True):
+        stem_cache = StemCache(job.get("stem_cache_dir") or DEFAULT_CACHE_DIR)
+        if job.get("stem_cache_gb"):
+            stem_cache.max_bytes = int(job["stem_cache_gb"] * GB)
+
+    if metrics is None and job.get("metrics_path"):
+        metrics = MetricsWriter(job["metrics_path"])
+    return SeparationEngine(separator_path=job.get("separator_path"),
+                            settings=job.get("settings"),
+                            log=log, threads=job.get("threads"),
+                            backend=backend, model_cache=model_cache,
+                            stem_cache=stem_cache,
+                            memory_budget=MemoryBudget(int(job["memory_budget_gb"] * GB))
+                            if job.get("memory_budget_gb") else None,
+                            max_parallel_passes=job.get("parallel_passes"),
+                            stream_chunk_seconds=job.get("stream_chunk_seconds"),
+                            staging=InputStaging() if job.get("staging", True) else None,
+                            tuned_settings=job.get("tuned_settings"),
+                            metrics=metrics,
+                            gate=SilenceGate(job["gate_db"]) if job.get("gate_db") is not None else None,
+                            output_format=job.get("output_format", DEFAULT_FORMAT),
+                            scratch_dir=job.get("scratch_dir"),
+                            memory_profile=MemoryProfile() if job.get("oom_retries", DEFAULT_OOM_RETRIES) else None,
+                            oom_retries=job.get("oom_retries", DEFAULT_OOM_RETRIES),
+                            concurrent_jobs=job.get("concurrent_jobs", 1))
+
+def run_job(job):
+    """Run one job inside a pool worker and return a result dict"""
+    name = os.path.basename(job["input"])
+
+    def log(message):
+        # One write per message so concurrent passes don't interleave mid-line
+        lines = message.split("\n")
+        sys.stdout.write("".join(f"[{name}] {line}\n" for line in lines))
+        sys.stdout.flush()
+
+    engine = build_engine(job, log)
+    start = time.perf_counter()
+    try:
+        success = engine.process(job["model"], job["input"], job["output_dir"])
+        error = None
+    except Exception as e:
+        success = False
+        error = str(e)
+        log(f"ERROR: {error}")
+    # Report the job only once its outputs exist in their final format
+    if engine.wait_outputs() and success:
+        success, error = False, "some outputs could not be written"
+    result = {
+        "input": job["input"],
+        "model": job["model"],
+        "success": bool(success),
+        "error": error,
+        "seconds": time.perf_counter() - start,
+    }
+    if engine.last_job is not None:
+        result["metrics"] = engine.last_job
+    if engine.model_cache is not None:
+        result["model_cache"] = engine.model_cache.stats()
+    return result
+
+def threads_per_worker(workers):
+    """Split the machine's cores evenly across pool workers"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+def run_batch(jobs, workers=1, log=print):
+    """Run jobs through a bounded process pool, return their results in job order"""
+    if not jobs:
+        log(">> Nothing to process")
+        return []
+
+    workers = max(1, min(workers, len(jobs)))
+    log(f">> Processing {len(jobs)} file(s) with {workers} worker(s)")
+
+    start = time.perf_counter()
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_job, job): i for i, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                # Worker crashed hard (killed, unpicklable job, ...)
+                results[i] = {"input": jobs[i]["input"], "model": jobs[i]["model"],
+                              "success": False, "error": str(e), "seconds": 0.0}
+            status = "OK" if results[i]["success"] else "FAILED"
+            log(f">> [{done}/{len(jobs)}] {status}: {os.path.basename(jobs[i]['input'])}")
+
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for r in results if not r["success"])
+    log(f"\n>> BATCH COMPLETE: {len(jobs) - failed} ok, {failed} failed in {elapsed:.1f}s")
+    return results
@@ -0,0 +1,336 @@
+"""Reproducible headless benchmarks for the separation and MIDI pipelines.
+
+Everything runs on synthetic audio (drum loops, sine melodies, noise beds,
+or a mix of all three) against ``glitchstem.stub_separator`` in place of
+audio-separator. The stub models load and inference time from a fixed
+real-time factor. The timings therefore measure what the orchestration
+adds around inference: process startup, decoding and staging, scheduling
+of passes, output scans, combining, and the MIDI stages.
+
+``run_benchmarks`` times each case ``repeat`` times and returns a result
+document (median / min / mean seconds per case, plus the hardware profile
+and settings). ``compare_results`` checks it against a stored baseline
+and flags cases whose median got slower by more than the threshold.
+"""
+import fnmatch
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .engine import BASE_DIR, SeparationEngine
+from .hardware import CREATE_NO_WINDOW, hardware_fingerprint, hardware_profile
+from .models import ENSEMBLE_PRESETS
+from .paths import app_path
+from .staging import InputStaging
+from .stub_separator import DEFAULT_LOAD_SECONDS, DEFAULT_RTF, LOAD_SECONDS_ENV, RTF_ENV
+from .workflow import preset_graph
+
+DEFAULT_BASELINE = app_path("bench", "baseline.json")
+BENCH_FORMAT = 1
+
+DEFAULT_SECONDS = 30.0
+DEFAULT_REPEAT = 3
+SAMPLE_RATE = 44100
+BPM = 120
+
+# A case regresses when its median is this much slower than the baseline's
+# and the difference is above the timer noise
+REGRESSION_THRESHOLD = 0.10
+MIN_DELTA_SECONDS = 0.05
+
+SINGLE_MODEL = "MelBand-Kim-Vocals"
+SYNTH_KINDS = ("drums", "melody", "noise", "mix")
+
+
+def synth_audio(path, kind="mix", seconds=DEFAULT_SECONDS, sr=SAMPLE_RATE, bpm=BPM, seed=0):
+    """Write a stereo test signal: "drums", "melody", "noise" or "mix" (all three)"""
+    import numpy as np
+    import soundfile as sf
+
+    if kind not in SYNTH_KINDS:
+        raise ValueError(f"Unknown synthetic audio kind: {kind}")
+    rng = np.random.default_rng(seed)
+    frames = int(seconds * sr)
+    beat = int(sr * 60 / bpm)
+    mono = np.zeros(frames)
+
+    def place(sound, every, offset=0):
+        for start in range(offset, frames, every):
+            end = min(frames, start + len(sound))
+            mono[start:end] += sound[:end - start]
+
+    if kind in ("drums", "mix"):
+        t = np.arange(int(0.25 * sr)) / sr
+        kick = np.sin(2 * np.pi * (50 + 100 * np.exp(-t * 30)) * t) * np.exp(-t * 12)
+        snare = rng.standard_normal(len(t)) * np.exp(-t * 25) * 0.6
+        hat = np.diff(rng.standard_normal(int(0.05 * sr) + 1)) * np.exp(-np.arange(int(0.05 * sr)) / sr * 80) * 0.2
+        place(kick, 2 * beat)
+        place(snare, 2 * beat, beat)
+        place(hat, beat // 2)
+    if kind in ("melody", "mix"):
+        # A minor pentatonic, one note per eighth
+        scale = [220.0, 261.6, 293.7, 329.6, 392.0, 440.0]
+        note = beat // 2
+        t = np.arange(note) / sr
+        envelope = np.minimum(1, t * 200) * np.exp(-t * 4)
+        for start in range(0, frames, note):
+            freq = scale[rng.integers(len(scale))]
+            end = min(frames, start + note)
+            mono[start:end] += 0.3 * (np.sin(2 * np.pi * freq * t) * envelope)[:end - start]
+    if kind in ("noise", "mix"):
+        # Box-filtered noise: a soft bed rather than white hiss
+        bed = np.convolve(rng.standard_normal(frames), np.ones(32) / 32, mode="same")
+        mono += bed * 0.5
+
+    mono /= max(1e-9, np.abs(mono).max()) / 0.8
+    audio = np.stack([mono, np.roll(mono, int(0.01 * sr))], axis=1)
+    sf.write(path, audio.astype(np.float32), sr)
+    return path
+
+def stub_command(folder):
+    """Write a launcher for the stub separator; returns its path (used as separator_path)"""
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if os.name == "nt":
+        path = os.path.join(folder, "stub-separator.cmd")
+        script = f'@set "PYTHONPATH={package_parent};%PYTHONPATH%"\r\n@"{sys.executable}" -m glitchstem.stub_separator %*\r\n'
+    else:
+        path = os.path.join(folder, "stub-separator")
+        script = (f'#!/bin/sh\nPYTHONPATH="{package_parent}${{PYTHONPATH:+:$PYTHONPATH}}" '
+                  f'exec "{sys.executable}" -m glitchstem.stub_separator "$@"\n')
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(script)
+    os.chmod(path, 0o755)
+    return path
+
+class BenchContext:
+    """Shared inputs for the cases: synthetic audio and the stub launcher"""
+
+    def __init__(self, workdir, seconds):
+        self.workdir = workdir
+        self.seconds = seconds
+        self.stub = stub_command(workdir)
+        self.inputs = {}
+
+    def audio(self, kind, ext=".wav"):
+        """Synthetic input of this kind (written on first use)"""
+        key = (kind, ext)
+        if key not in self.inputs:
+            self.inputs[key] = synth_audio(os.path.join(self.workdir, f"bench_{kind}{ext}"), kind, self.seconds)
+        return self.inputs[key]
+
+    def scratch(self, name):
+        """Fresh empty folder for one run"""
+        path = os.path.join(self.workdir, "runs", name)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return path
+
+    def engine(self, scratch):
+        """Engine as the GUI builds it, minus the stem cache (every run does the work)"""
+        return SeparationEngine(separator_path=self.stub, log=lambda message: None,
+                                staging=InputStaging(os.path.join(scratch, "staging")))
+
+def _python_seconds(args, cwd=None):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable] + args, cwd=cwd, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True, creationflags=CREATE_NO_WINDOW)
+    seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError((result.stderr.strip().splitlines() or [f"exit code {result.returncode}"])[-1])
+    return seconds
+
+def _find_spec(name):
+    import importlib.util
+    return importlib.util.find_spec(name) is not None
+
+def bench_startup_import(ctx, run):
+    return _python_seconds(["-c", "import glitchstem.engine, glitchstem.cli"])
+
+def bench_startup_cli(ctx, run):
+    return _python_seconds(["-m", "glitchstem", "list"], cwd=os.path.dirname(os.path.dirname(__file__)))
+
+def bench_startup_gui(ctx, run):
+    # Module import only (tables, availability checks); no window is created
+    return _python_seconds(["-c", "import GlitchStemUltra"], cwd=BASE_DIR)
+
+def bench_single(ctx, run):
+    scratch = ctx.scratch(f"single-{run}")
+    engine = ctx.engine(scratch)
+    start = time.perf_counter()
+    if not engine.process_single(SINGLE_MODEL, ctx.audio("mix"), scratch):
+        raise RuntimeError("separation failed")
+    return time.perf_counter() - start
+
+def ensemble_case(preset_name):
+    def bench_ensemble(ctx, run):
+        scratch = ctx.scratch(f"ensemble-{run}")
+        engine = ctx.engine(scratch)
+        # FLAC input, so the decode-once staging is part of the measurement
+        source = ctx.audio("mix", ".flac")
+        start = time.perf_counter()
+        if not engine.process_ensemble(preset_name, source, scratch):
+            raise RuntimeError("ensemble failed")
+        return time.perf_counter() - start
+    return bench_ensemble
+
+def bench_drums(ctx, run):
+    from .drums import transcribe_drums
+    from .features import FeatureStore
+
+    store = FeatureStore(ctx.scratch(f"features-{run}"))
+    start = time.perf_counter()
+    transcribe_drums(store.features(ctx.audio("drums")))
+    return time.perf_counter() - start
+
+def bench_drums_cached(ctx, run):
+    from .drums import transcribe_drums
+    from .features import FeatureStore
+
+    store = FeatureStore(os.path.join(ctx.workdir, "features-warm"))
+    transcribe_drums(store.features(ctx.audio("drums")))
+    start = time.perf_counter()
+    transcribe_drums(FeatureStore(store.root).features(ctx.audio("drums")))
+    return time.perf_counter() - start
+
+def _grid_hits(seconds):
+    kinds = ["kick", "hihat", "snare", "hihat"]
+    step = 60 / BPM / 2
+    return [(i * step, kinds[i % 4]) for i in range(int(seconds / step))]
+
+def bench_midi_drums(ctx, run):
+    from .drums import write_drum_midi
+
+    hits = _grid_hits(ctx.seconds)
+    path = os.path.join(ctx.scratch(f"midi-{run}"), "drums.mid")
+    start = time.perf_counter()
+    write_drum_midi(hits, path, bpm=BPM)
+    return time.perf_counter() - start
+
+def bench_midi_melodic(ctx, run):
+    from piano_transcription_inference.utilities import write_events_to_midi
+
+    step = 60 / BPM / 2
+    notes = [{"onset_time": i * step, "offset_time": (i + 1) * step, "midi_note": 57 + i % 12, "velocity": 80}
+             for i in range(int(ctx.seconds / step))]
+    path = os.path.join(ctx.scratch(f"midi-{run}"), "melodic.mid")
+    start = time.perf_counter()
+    write_events_to_midi(start_time=0, note_events=notes, pedal_events=[], midi_path=path)
+    return time.perf_counter() - start
+
+def benchmark_cases():
+    """[(name, fn(ctx, run) -> seconds, required module or None, warm-up)] in run order.
+
+    Cases with warm-up get one untimed run first, so one-off imports and JIT
+    compilation in this process are not counted; startup cases measure a
+    fresh interpreter every time.
+    """
+    cases = [
+        ("startup.import", bench_startup_import, None, False),
+        ("startup.cli", bench_startup_cli, None, False),
+        ("startup.gui", bench_startup_gui, "customtkinter", False),
+        ("separate.single", bench_single, None, True),
+    ]
+    for name, preset in ENSEMBLE_PRESETS.items():
+        if not preset.get("is_custom"):
+            transcribes = any(node["op"] == "transcribe" for node in preset_graph(preset))
+            cases.append((f"ensemble.{_case_slug(name)}", ensemble_case(name),
+                          "librosa" if transcribes else None, True))
+    cases += [
+        ("drums.transcribe", bench_drums, "librosa", True),
+        ("drums.transcribe_cached", bench_drums_cached, "librosa", True),
+        ("midi.write_drums", bench_midi_drums, "mido", True),
+        ("midi.write_melodic", bench_midi_melodic, "piano_transcription_inference", True),
+    ]
+    return cases
+
+def _case_slug(preset_name):
+    plain = preset_name.split(":", 1)[-1]
+    return "-".join("".join(c if c.isalnum() else " " for c in plain.lower()).split())
+
+def summarize(runs):
+    return {"median": statistics.median(runs), "min": min(runs), "mean": statistics.fmean(runs), "runs": runs}
+
+def run_benchmarks(patterns=None, seconds=DEFAULT_SECONDS, repeat=DEFAULT_REPEAT,
+                   load_seconds=DEFAULT_LOAD_SECONDS, rtf=DEFAULT_RTF, workdir=None, log=print):
+    """Run the cases matching any of patterns (fnmatch, default all); returns the result document"""
+    cases = [c for c in benchmark_cases() if not patterns or any(fnmatch.fnmatch(c[0], p) for p in patterns)]
+    own_workdir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="glitchstem-bench-")
+    saved_env = {var: os.environ.get(var) for var in (LOAD_SECONDS_ENV, RTF_ENV)}
+    os.environ[LOAD_SECONDS_ENV] = str(load_seconds)
+    os.environ[RTF_ENV] = str(rtf)
+
+    results = {}
+    try:
+        ctx = BenchContext(workdir, seconds)
+        for name, fn, requires, warmup in cases:
+            if requires and not _find_spec(requires):
+                results[name] = {"status": "skipped", "reason": f"{requires} not installed"}
+                log(f"   {name:<40} skipped ({requires} not installed)")
+                continue
+            try:
+                if warmup:
+                    fn(ctx, "warmup")
+                runs = [fn(ctx, run) for run in range(repeat)]
+            except Exception as e:
+                results[name] = {"status": "failed", "error": str(e)}
+                log(f"   {name:<40} FAILED ({str(e)})")
+                continue
+            results[name] = dict(summarize(runs), status="ok")
+            log(f"   {name:<40} {results[name]['median']:8.3f}s median  ({results[name]['min']:.3f}s min)")
+    finally:
+        for var, value in saved_env.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    profile = hardware_profile()
+    return {"format": BENCH_FORMAT, "created": time.time(), "hardware": profile,
+            "fingerprint": hardware_fingerprint(profile), "python": sys.version.split()[0],
+            "config": {"seconds": seconds, "repeat": repeat, "load_seconds": load_seconds, "rtf": rtf},
+            "results": results}
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD, min_delta=MIN_DELTA_SECONDS):
+    """[{"case", "baseline", "current", "ratio", "status"}]; status is "regression",
+    "improvement", "ok", "new", "missing" or "failed" """
+    rows = []
+    base_results = baseline.get("results", {})
+    cur_results = current.get("results", {})
+    for name in list(base_results) + [n for n in cur_results if n not in base_results]:
+        base, cur = base_results.get(name, {}), cur_results.get(name, {})
+        row = {"case": name, "baseline": base.get("median"), "current": cur.get("median"), "ratio": None}
+        if cur.get("status") == "failed" and base.get("status") == "ok":
+            row["status"] = "failed"
+        elif row["baseline"] is None and row["current"] is None:
+            continue
+        elif row["baseline"] is None:
+            row["status"] = "new"
+        elif row["current"] is None:
+            row["status"] = "missing"
+        else:
+            row["ratio"] = row["current"] / row["baseline"] if row["baseline"] else None
+            delta = row["current"] - row["baseline"]
+            if delta > max(min_delta, row["baseline"] * threshold):
+                row["status"] = "regression"
+            elif -delta > max(min_delta, row["baseline"] * threshold):
+                row["status"] = "improvement"
+            else:
+                row["status"] = "ok"
+        rows.append(row)
+    return rows
+
+def comparison_warnings(baseline, current):
+    """Reasons the two result sets may not be comparable"""
+    warnings = []
+    if baseline.get("fingerprint") != current.get("fingerprint"):
+        warnings.append("different hardware fingerprint")
+    if baseline.get("config") != current.get("config"):
+        warnings.append(f"different settings ({baseline.get('config')} vs {current.get('config')})")
+    return warnings
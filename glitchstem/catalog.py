@@ -0,0 +1,214 @@
+"""Model catalog indexed from audio-separator's models_list.json.
+
+models_list.json (the output of ``audio-separator --list_models
+--list_format json``) lists every model audio-separator can download, with
+its stems and per-stem SDR/SIR/SAR/ISR scores. It is parsed once into an
+index pickled to ``~/.glitchstem/model_catalog.pickle``; the pickle is
+rebuilt whenever the JSON's mtime or size changes. The index answers
+lookups by name, filename, architecture and stem, and score rankings,
+without starting the separator.
+
+Catalog models that are not in MODEL_DATABASE can still be run:
+register_model() adds them to it under a filesystem-safe key.
+"""
+import json
+import os
+import pickle
+import re
+import threading
+import uuid
+
+from .models import MODEL_DATABASE
+from .paths import app_path
+
+DEFAULT_MODELS_LIST = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "models_list.json"))
+DEFAULT_INDEX_PATH = app_path("model_catalog.pickle")
+INDEX_VERSION = 1
+
+METRICS = ["SDR", "SIR", "SAR", "ISR"]
+SPEED_KEY = "seconds_per_minute_m3"
+# Characters Windows does not allow in the pass folder names model keys end up in
+_UNSAFE_RE = re.compile(r'\s*[<>:"/\\|?*]+\s*')
+
+
+def read_models_list(path=DEFAULT_MODELS_LIST):
+    """models_list.json as a dict; log lines the separator printed before the JSON are skipped"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    start = 0 if text.startswith("{") else text.find("\n{") + 1
+    if not text[start:].startswith("{"):
+        raise ValueError(f"No JSON object in {path}")
+    data, _ = json.JSONDecoder().raw_decode(text[start:])
+    return data
+
+def model_key(name):
+    """Catalog name -> MODEL_DATABASE-style key ("Roformer Model: Kim | Inst" -> "Kim - Inst")"""
+    short = name.split(": ", 1)[-1]
+    return _UNSAFE_RE.sub(" - ", short).strip(" -") or name
+
+def parse_entries(data):
+    """Flat entry dicts from the models_list.json tree ({arch: {name: info}})"""
+    entries = []
+    for arch, models in data.items():
+        for name, info in models.items():
+            raw = info.get("scores") or {}
+            # Besides per-stem dicts, scores may hold a speed benchmark (seconds per minute of audio, M3)
+            scores = {stem.lower(): {metric: float(value) for metric, value in values.items() if metric in METRICS}
+                      for stem, values in raw.items() if isinstance(values, dict)}
+            entries.append({
+                "key": model_key(name),
+                "name": name,
+                "arch": arch,
+                "file": info["filename"],
+                "stems": [stem.lower() for stem in info.get("stems") or []],
+                "target_stem": (info.get("target_stem") or "").lower() or None,
+                "scores": scores,
+                "seconds_per_minute": raw.get(SPEED_KEY),
+            })
+    return entries
+
+def best_score(entry, metric="SDR"):
+    """Highest score of any stem (None if unscored)"""
+    values = [scores[metric] for scores in entry["scores"].values() if metric in scores]
+    return max(values) if values else None
+
+def build_index(entries):
+    """Lookup tables over entries (positions into the entries list)"""
+    by_key, by_file, by_arch, by_stem = {}, {}, {}, {}
+    for i, entry in enumerate(entries):
+        # Two archs may use the same short name; the first keeps it
+        by_key.setdefault(entry["key"].lower(), i)
+        by_key.setdefault(entry["name"].lower(), i)
+        by_file.setdefault(entry["file"].lower(), i)
+        by_arch.setdefault(entry["arch"].lower(), []).append(i)
+        for stem in entry["stems"]:
+            by_stem.setdefault(stem, []).append(i)
+    for stem, positions in by_stem.items():
+        positions.sort(key=lambda i: -entries[i]["scores"].get(stem, {}).get("SDR", float("-inf")))
+    # Duplicate short names fall back to the full catalog name
+    for i, entry in enumerate(entries):
+        if by_key[entry["key"].lower()] != i:
+            entry["key"] = entry["name"]
+    return {"entries": entries, "by_key": by_key, "by_file": by_file, "by_arch": by_arch, "by_stem": by_stem}
+
+
+class ModelCatalog:
+    """Indexed view of models_list.json; load() reuses the pickled index while the JSON is unchanged"""
+
+    def __init__(self, index, source=None):
+        self.index = index
+        self.entries = index["entries"]
+        self.source = source
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODELS_LIST, index_path=DEFAULT_INDEX_PATH):
+        st = os.stat(path)
+        stamp = (INDEX_VERSION, os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        try:
+            with open(index_path, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("stamp") == stamp:
+                return cls(cached["index"], path)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            pass
+
+        index = build_index(parse_entries(read_models_list(path)))
+        try:
+            os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+            tmp = f"{index_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump({"stamp": stamp, "index": index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, index_path)
+        except OSError:
+            pass  # A read-only home still gets the in-memory index
+        return cls(index, path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, name):
+        """Entry by key, catalog name or model filename (case-insensitive), or None"""
+        lowered = name.lower()
+        i = self.index["by_key"].get(lowered)
+        if i is None:
+            i = self.index["by_file"].get(os.path.basename(lowered))
+        return None if i is None else self.entries[i]
+
+    def architectures(self):
+        """{arch: number of models}"""
+        return {self.entries[positions[0]]["arch"]: len(positions) for positions in self.index["by_arch"].values()}
+
+    def with_arch(self, arch):
+        return [self.entries[i] for i in self.index["by_arch"].get(arch.lower(), [])]
+
+    def with_stem(self, stem):
+        """Entries that output stem, best SDR on it first"""
+        return [self.entries[i] for i in self.index["by_stem"].get(stem.lower(), [])]
+
+    def ranked(self, stem=None, metric="SDR", arch=None, limit=None):
+        """[(score, entry)] best first: on stem, or on each model's best stem when None"""
+        entries = self.with_stem(stem) if stem else self.entries
+        if arch:
+            entries = [e for e in entries if e["arch"].lower() == arch.lower()]
+        if stem:
+            scored = [(e["scores"].get(stem.lower(), {}).get(metric), e) for e in entries]
+        else:
+            scored = [(best_score(e, metric), e) for e in entries]
+        scored = sorted([s for s in scored if s[0] is not None], key=lambda s: -s[0])
+        return scored[:limit] if limit else scored
+
+    def for_database_model(self, model_name):
+        """Catalog entry of a MODEL_DATABASE model (matched by filename), or None"""
+        model = MODEL_DATABASE.get(model_name)
+        return self.lookup(model["file"]) if model else None
+
+    def new_models(self):
+        """Entries whose file no MODEL_DATABASE model uses, best score first"""
+        known = {model["file"].lower() for model in MODEL_DATABASE.values()}
+        fresh = [e for e in self.entries if e["file"].lower() not in known]
+        return sorted(fresh, key=lambda e: -(best_score(e) or float("-inf")))
+
+def describe(entry):
+    """One-line description: architecture, stems and their SDR"""
+    parts = [f"{stem} SDR {entry['scores'][stem]['SDR']:.1f}" if "SDR" in entry["scores"].get(stem, {}) else stem
+             for stem in entry["stems"]]
+    speed = f", {entry['seconds_per_minute']:g}s/min" if entry.get("seconds_per_minute") else ""
+    return f"{entry['arch']}: {', '.join(parts)}{speed} ({entry['file']})"
+
+def category(entry):
+    """MODEL_DATABASE category for a catalog entry"""
+    stems = entry["stems"]
+    if len(stems) > 2:
+        return "multi-stem"
+    for stem in [entry["target_stem"]] + stems:
+        if stem in ("vocals", "instrumental", "drums"):
+            return stem
+    return "utility"
+
+_default_catalog = None
+_default_catalog_lock = threading.Lock()
+
+def get_catalog(reload=False):
+    """Process-wide ModelCatalog (loaded on first use; reload re-checks the JSON)"""
+    global _default_catalog
+    with _default_catalog_lock:
+        if _default_catalog is None or reload:
+            _default_catalog = ModelCatalog.load()
+        return _default_catalog
+
+def register_model(name):
+    """MODEL_DATABASE key for name, adding the catalog model it names if needed; None if unknown"""
+    if name in MODEL_DATABASE:
+        return name
+    try:
+        entry = get_catalog().lookup(name)
+    except (OSError, ValueError):
+        return None
+    if entry is None:
+        return None
+    for key, model in MODEL_DATABASE.items():
+        if model["file"].lower() == entry["file"].lower():
+            return key
+    MODEL_DATABASE[entry["key"]] = {"file": entry["file"], "desc": describe(entry),
+                                    "category": category(entry), "catalog": True}
+    return entry["key"]
@@ -0,0 +1,480 @@
+"""glitchstem command line interface - headless separation for render boxes"""
+import argparse
+import json
+import os
+import sys
+
+from .batch import collect_inputs, run_batch, threads_per_worker
+from .bench import DEFAULT_BASELINE, DEFAULT_REPEAT, DEFAULT_SECONDS, REGRESSION_THRESHOLD
+from .combine import METHODS as COMBINE_METHODS
+from .catalog import METRICS as CATALOG_METRICS
+from .delivery import DEFAULT_FORMAT, DELIVERY_FORMATS
+from .engine import BASE_DIR, find_separator, resolve_workflow
+from .gating import DEFAULT_GATE_DB
+from .hardware import cached_gpu_info, get_recommended_preset
+from .memory import GB, default_pass_budget
+from .models import MODEL_DATABASE, HARDWARE_PRESETS, ENSEMBLE_PRESETS
+from .oom import DEFAULT_OOM_RETRIES
+from .residency import inprocess_available
+from .service import DEFAULT_HOST, DEFAULT_MAX_UPLOAD_BYTES, DEFAULT_PORT, DEFAULT_UPLOAD_DIR
+from .stem_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, StemCache
+from .tracing import DEFAULT_TRACE_DIR, TRACE_ENV, enable_tracing
+from .tuning import CLIP_SECONDS, TUNING_GRID
+from .watch import DEFAULT_INTERVAL, DEFAULT_SETTLE_SECONDS, DEFAULT_STATE_PATH
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="glitchstem",
+                                     description="Tex's Glitch Stem Ultra - headless separation engine")
+    parser.add_argument("--trace", nargs="?", const=DEFAULT_TRACE_DIR, metavar="DIR",
+                        help="write a Chrome trace (Perfetto) per job to DIR (default: ~/.glitchstem/traces)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sep = sub.add_parser("separate", help="separate files, folders or manifests")
+    sep.add_argument("inputs", nargs="+", help="audio file, folder, or manifest (.txt / .json)")
+    sep.add_argument("-m", "--model", help="MODEL_DATABASE, ENSEMBLE_PRESETS or models_list.json model name")
+    sep.add_argument("-o", "--output", default=os.path.join(BASE_DIR, "Stems_Output"),
+                     help="output folder (default: ./Stems_Output)")
+    sep.add_argument("-j", "--workers", type=int, default=1, help="parallel jobs (default: 1)")
+    sep.add_argument("-r", "--recursive", action="store_true", help="scan input folders recursively")
+    sep.add_argument("--json", action="store_true", help="print per-job results as JSON")
+    add_separation_args(sep)
+
+    watch = sub.add_parser("watch", help="separate every new track dropped into watched folders")
+    watch.add_argument("folders", nargs="*", help="folders to watch (or use --config)")
+    watch.add_argument("-m", "--model", help="MODEL_DATABASE, ENSEMBLE_PRESETS or models_list.json model name")
+    watch.add_argument("-o", "--output", default=os.path.join(BASE_DIR, "Stems_Output"),
+                       help="output folder (default: ./Stems_Output)")
+    watch.add_argument("-j", "--workers", type=int, default=1, help="jobs running at once (default: 1)")
+    watch.add_argument("-r", "--recursive", action="store_true", help="watch subfolders too")
+    watch.add_argument("--config", help='JSON {"folders": [{"path", "model", "output_dir", "recursive"}]}')
+    watch.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="seconds between scans (default: 2)")
+    watch.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                       help="seconds a file must stay unchanged before it is picked up (default: 5)")
+    watch.add_argument("--state", default=DEFAULT_STATE_PATH, help="processed-file state (JSON)")
+    watch.add_argument("--skip-existing", action="store_true",
+                       help="mark files already in the folders as done instead of processing them")
+    watch.add_argument("--retry-failed", action="store_true", help="run files that failed before again")
+    watch.add_argument("--once", action="store_true",
+                       help="process what is there now, then exit (files unreadable for 30s are given up on)")
+    add_separation_args(watch)
+
+    serve = sub.add_parser("serve", help="run an HTTP job service other machines can submit separations to")
+    serve.add_argument("--host", default=DEFAULT_HOST,
+                       help="address to listen on (default: 127.0.0.1; 0.0.0.0 for the whole network)")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT})")
+    serve.add_argument("-o", "--output", default=os.path.join(BASE_DIR, "Stems_Output"),
+                       help="output folder, one subfolder per job (default: ./Stems_Output)")
+    serve.add_argument("-j", "--workers", type=int, default=1, help="jobs running at once (default: 1)")
+    serve.add_argument("--upload-dir", default=DEFAULT_UPLOAD_DIR, help="where uploaded inputs wait for their job")
+    serve.add_argument("--max-upload-gb", type=float, default=DEFAULT_MAX_UPLOAD_BYTES / GB,
+                       help="largest upload accepted (default: 4)")
+    serve.add_argument("--input-root", action="append", metavar="DIR",
+                       help="only accept input paths under DIR (repeatable; default: any path)")
+    serve.add_argument("--stub", action="store_true",
+                       help="use the stub separator (no models; for trying the service out)")
+    add_separation_args(serve)
+
+    lst = sub.add_parser("list", help="list models, ensemble presets and hardware presets")
+    lst.add_argument("--catalog", action="store_true",
+                     help="list audio-separator's full model catalog (models_list.json) instead, best first")
+    lst.add_argument("--stem", help="catalog: only models that output this stem, ranked by its score")
+    lst.add_argument("--arch", help="catalog: only this architecture (VR, MDX, MDXC, Demucs)")
+    lst.add_argument("--metric", choices=CATALOG_METRICS, default="SDR", help="catalog: score to rank by")
+    lst.add_argument("--top", type=int, help="catalog: show only the best N")
+
+    comb = sub.add_parser("combine", help="merge stem files from several models into one")
+    comb.add_argument("inputs", nargs="+", help="stem files to combine (same sample rate and channels)")
+    comb.add_argument("-o", "--output", required=True, help="output WAV")
+    comb.add_argument("--method", choices=COMBINE_METHODS, default="mean")
+    comb.add_argument("--weights", type=float, nargs="+", help="one weight per input (weighted method)")
+    comb.add_argument("--subtype", default="PCM_16", help="output WAV subtype: PCM_16, PCM_24, FLOAT")
+
+    midi = sub.add_parser("midi", help="transcribe a folder of stems to MIDI (drums and melodic)")
+    midi.add_argument("input", help="stem folder, audio file or manifest")
+    midi.add_argument("-o", "--output", help="MIDI output folder (default: next to each stem)")
+    midi.add_argument("-r", "--recursive", action="store_true", help="scan subfolders too")
+    midi.add_argument("--only", choices=["drums", "melodic"], help="transcribe only one kind of stem")
+    midi.add_argument("--workers", type=int, help="drum transcription processes (default: half the cores)")
+    midi.add_argument("--models", type=int, default=1, help="warm melodic models to share the work")
+    midi.add_argument("--json", action="store_true", help="print per-file results as JSON")
+    midi.add_argument("--metrics", metavar="PATH", help="append per-file job records to PATH as JSON lines (- for stdout)")
+
+    tune = sub.add_parser("tune", help="find the fastest seg/overlap/batch settings per model on this machine")
+    tune.add_argument("-m", "--model", nargs="+", help="models to tune (default: every tunable model)")
+    tune.add_argument("--clip", help="audio to benchmark on (default: a synthetic clip)")
+    tune.add_argument("--clip-seconds", type=float, default=CLIP_SECONDS, help="clip length (default: 20)")
+    tune.add_argument("--seg-sizes", type=int, nargs="+", default=TUNING_GRID["seg_size"])
+    tune.add_argument("--overlaps", type=int, nargs="+", default=TUNING_GRID["overlap"])
+    tune.add_argument("--batch-sizes", type=int, nargs="+", default=TUNING_GRID["batch_size"])
+    tune.add_argument("--threads", type=int, help="CPU threads for the separator (default: all)")
+    tune.add_argument("--separator", help="path to the audio-separator executable")
+    tune.add_argument("--memory-budget-gb", type=float,
+                      help="largest peak a setting may use (default: 90%% VRAM / 70%% RAM)")
+    tune.add_argument("--show", action="store_true", help="print the tuned settings for this machine and exit")
+
+    cache = sub.add_parser("cache", help="inspect and prune the stem cache")
+    cache.add_argument("action", choices=["stats", "list", "prune", "clear"])
+    cache.add_argument("--max-gb", type=float, help="prune down to this size (default: the cache limit)")
+    add_stem_cache_args(cache)
+
+    bench = sub.add_parser("bench", help="benchmark the pipelines on synthetic audio with a stub separator")
+    bench.add_argument("action", choices=["run", "compare"])
+    bench.add_argument("results", nargs="?",
+                       help="run: write results here (JSON); compare: results to check (default: run now)")
+    bench.add_argument("--cases", nargs="+", metavar="PATTERN", help="case names or globs, e.g. 'ensemble.*'")
+    bench.add_argument("--seconds", type=float, default=DEFAULT_SECONDS, help="synthetic audio length (default: 30)")
+    bench.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="runs per case (default: 3)")
+    bench.add_argument("--load-seconds", type=float, help="stub model load time (default: 0.5)")
+    bench.add_argument("--rtf", type=float, help="stub inference seconds per second of audio (default: 0.02)")
+    bench.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline results file")
+    bench.add_argument("--save-baseline", action="store_true", help="run: also store the results as the baseline")
+    bench.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                       help="compare: slowdown that counts as a regression (default: 0.10)")
+    return parser
+
+def add_separation_args(parser):
+    """Inference, backend and cache flags shared by separate, watch and serve"""
+    parser.add_argument("--threads", type=int, help="CPU threads per job (default: cores / workers)")
+    parser.add_argument("--hardware", help="HARDWARE_PRESETS name (default: auto-detect)")
+    parser.add_argument("--seg-size", type=int, help="override segment size")
+    parser.add_argument("--overlap", type=int, help="override overlap")
+    parser.add_argument("--batch-size", type=int, help="override batch size")
+    parser.add_argument("--separator", help="path to the audio-separator executable")
+    parser.add_argument("--backend", choices=["subprocess", "inprocess"], default="subprocess",
+                        help="inprocess keeps loaded models resident between passes and files")
+    parser.add_argument("--model-cache-gb", type=float,
+                        help="RAM/VRAM budget for resident models (inprocess backend)")
+    parser.add_argument("--parallel-passes", type=int,
+                        help="max ensemble passes running at once per job (default: as many as fit in memory)")
+    parser.add_argument("--memory-budget-gb", type=float,
+                        help="RAM/VRAM shared by all workers' concurrent passes (default: 90%% VRAM / 70%% RAM)")
+    parser.add_argument("--stream", type=float, nargs="?", const=30.0, metavar="SECONDS",
+                        help="pipeline pass 1 into its post-process in chunks of SECONDS (default 30)")
+    parser.add_argument("--gate", type=float, nargs="?", const=DEFAULT_GATE_DB, metavar="DB",
+                        help="run models only on regions louder than DB dBFS, skip silence (default -50)")
+    parser.add_argument("--output-format", choices=list(DELIVERY_FORMATS), default=DEFAULT_FORMAT,
+                        help="encoding of the final stems (default: 16-bit wav)")
+    parser.add_argument("--scratch-dir", help="folder for throwaway per-pass files, e.g. a RAM disk like /dev/shm")
+    parser.add_argument("--oom-retries", type=int, default=DEFAULT_OOM_RETRIES, metavar="N",
+                        help="retry a pass that runs out of memory up to N times with smaller settings "
+                             "(default 3, 0 to disable)")
+    parser.add_argument("--no-stem-cache", action="store_true", help="always run inference, never reuse cached stems")
+    parser.add_argument("--tuned", action="store_true",
+                        help="run each model with the settings `glitchstem tune` found for this machine")
+    parser.add_argument("--no-staging", action="store_true",
+                        help="let every ensemble pass decode a compressed input itself")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="append job, pass and progress records to PATH as JSON lines (- for stdout)")
+    add_stem_cache_args(parser)
+
+def add_stem_cache_args(parser):
+    parser.add_argument("--stem-cache-dir", default=DEFAULT_CACHE_DIR, help="stem cache folder")
+    parser.add_argument("--stem-cache-gb", type=float, default=DEFAULT_MAX_BYTES / GB,
+                        help="stem cache size limit in GB (LRU eviction)")
+
+def open_stem_cache(args):
+    return StemCache(args.stem_cache_dir, int(args.stem_cache_gb * GB))
+
+def resolve_settings(args, log=print):
+    """Hardware preset values, overridden by any explicit CLI flags"""
+    hardware = args.hardware
+    if not hardware:
+        gpu_info = cached_gpu_info()
+        hardware = get_recommended_preset(gpu_info["vram_gb"] if gpu_info["cuda_available"] else 0)
+        log(f">> Auto-detected hardware preset: {hardware}")
+    if hardware not in HARDWARE_PRESETS:
+        raise SystemExit(f"Unknown hardware preset: {hardware}")
+
+    preset = HARDWARE_PRESETS[hardware]
+    settings = {key: preset[key] for key in ("seg_size", "overlap", "batch_size")}
+    for key in ("seg_size", "overlap", "batch_size"):
+        value = getattr(args, key)
+        if value is not None:
+            settings[key] = value
+    return settings
+
+def metrics_path(path):
+    """Absolute --metrics path (workers may not share the cwd), "-" as is"""
+    return path if path in (None, "-") else os.path.abspath(path)
+
+def separation_options(args, concurrent_jobs):
+    """Job fields shared by every file of a separate / watch / serve run"""
+    settings = resolve_settings(args)
+    tuned = None
+    if args.tuned:
+        from .tuning import TuningStore
+        # Flags given explicitly still win over tuned values
+        explicit = {key for key in ("seg_size", "overlap", "batch_size") if getattr(args, key) is not None}
+        tuned = {name: {k: v for k, v in values.items() if k not in explicit}
+                 for name, values in TuningStore().tuned_settings().items()}
+        print(f">> Using tuned settings for {len(tuned)} model(s)")
+    if args.backend == "inprocess" and not inprocess_available():
+        raise SystemExit("--backend inprocess needs audio-separator installed in this Python")
+    # Each worker gets an equal slice of the pass memory budget
+    memory_budget_gb = args.memory_budget_gb or default_pass_budget() / GB
+    return {
+        "settings": settings,
+        "separator_path": args.separator or find_separator(),
+        "threads": args.threads or threads_per_worker(args.workers),
+        "backend": args.backend,
+        "model_cache_gb": args.model_cache_gb,
+        "memory_budget_gb": memory_budget_gb / max(1, concurrent_jobs),
+        "concurrent_jobs": concurrent_jobs,
+        "parallel_passes": args.parallel_passes,
+        "stream_chunk_seconds": args.stream,
+        "tuned_settings": tuned,
+        "staging": not args.no_staging,
+        "gate_db": args.gate,
+        "output_format": args.output_format,
+        "scratch_dir": args.scratch_dir and os.path.abspath(args.scratch_dir),
+        "oom_retries": args.oom_retries,
+        "stem_cache": not args.no_stem_cache,
+        "stem_cache_dir": args.stem_cache_dir,
+        "stem_cache_gb": args.stem_cache_gb,
+        "metrics_path": metrics_path(args.metrics),
+    }
+
+def check_workflow(name, source=None):
+    """resolve_workflow(name), or exit with a message naming what is wrong"""
+    if not name:
+        raise SystemExit(f"No model given for {source} (use --model)")
+    workflow = resolve_workflow(name)
+    if workflow is None:
+        raise SystemExit(f"Unknown model or preset: {name}")
+    if ENSEMBLE_PRESETS.get(workflow, {}).get("is_custom"):
+        raise SystemExit("The custom ensemble is only available in the GUI")
+    return workflow
+
+def cmd_separate(args):
+    jobs = []
+    for source in args.inputs:
+        if not os.path.exists(source):
+            raise SystemExit(f"Input not found: {source}")
+        jobs.extend(collect_inputs(source, recursive=args.recursive))
+
+    workflows = [check_workflow(job.get("model") or args.model, job["input"]) for job in jobs]
+    options = separation_options(args, min(args.workers, len(jobs)))
+    output_dir = os.path.abspath(args.output)
+    for job, workflow in zip(jobs, workflows):
+        job.update(dict(options,
+                        model=workflow,
+                        output_dir=os.path.abspath(job.get("output_dir", output_dir)),
+                        settings=dict(options["settings"], **job.get("settings", {}))))
+
+    results = run_batch(jobs, workers=args.workers)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 0 if all(r["success"] for r in results) else 1
+
+def cmd_watch(args):
+    from .watch import FolderWatcher, WatchState, load_watch_config
+
+    output_dir = os.path.abspath(args.output)
+    folders = [{"path": folder, "model": args.model, "output_dir": output_dir, "recursive": args.recursive}
+               for folder in args.folders]
+    if args.config:
+        folders += load_watch_config(args.config, args.model, output_dir, args.recursive)
+    if not folders:
+        raise SystemExit("Nothing to watch (give folders or --config)")
+    for folder in folders:
+        if not os.path.isdir(folder["path"]):
+            raise SystemExit(f"Not a folder: {folder['path']}")
+        folder["model"] = check_workflow(folder["model"], folder["path"])
+
+    watcher = FolderWatcher(folders, separation_options(args, args.workers), workers=args.workers,
+                            state=WatchState(args.state), interval=args.interval, settle_seconds=args.settle,
+                            retry_failed=args.retry_failed)
+    if args.skip_existing:
+        watcher.mark_existing()
+    watcher.run(once=args.once)
+    return 0
+
+def cmd_serve(args):
+    from .service import JobService, run_service
+
+    if args.stub:
+        from .bench import stub_command
+        folder = os.path.dirname(os.path.abspath(args.upload_dir))
+        os.makedirs(folder, exist_ok=True)
+        args.separator = stub_command(folder)
+        print(f">> Using the stub separator: {args.separator}")
+    service = JobService(separation_options(args, args.workers), args.output, workers=args.workers,
+                         upload_dir=args.upload_dir, input_roots=args.input_root,
+                         max_upload_bytes=int(args.max_upload_gb * GB))
+    run_service(service, args.host, args.port)
+    return 0
+
+def cmd_list(args):
+    if args.catalog:
+        return list_catalog(args)
+    print("ENSEMBLE PRESETS")
+    for name, preset in ENSEMBLE_PRESETS.items():
+        if not preset.get("is_custom"):
+            print(f"  {name}  -  {preset['desc']}")
+    print("\nMODELS")
+    for name, model in MODEL_DATABASE.items():
+        print(f"  {name:<30} {model['category']:<13} {model['desc']}")
+    print("\nHARDWARE PRESETS")
+    for name, preset in HARDWARE_PRESETS.items():
+        print(f"  {name:<28} seg {preset['seg_size']}, overlap {preset['overlap']}, batch {preset['batch_size']}")
+    return 0
+
+def list_catalog(args):
+    from .catalog import get_catalog
+
+    try:
+        catalog = get_catalog()
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Model catalog unavailable: {e}")
+    ranked = catalog.ranked(args.stem, args.metric, args.arch, args.top)
+    known = {model["file"].lower() for model in MODEL_DATABASE.values()}
+    label = f"{args.stem} {args.metric}" if args.stem else f"best {args.metric}"
+    print(f"{len(ranked)} of {len(catalog)} catalog models, by {label} (* = in MODEL_DATABASE)")
+    for score, entry in ranked:
+        mark = "*" if entry["file"].lower() in known else " "
+        print(f"  {score:6.2f} {mark} {entry['arch']:<7} {entry['key']:<52} {entry['file']}")
+    return 0
+
+def cmd_combine(args):
+    from .combine import combine_files
+
+    frames = combine_files(args.inputs, args.output, args.method, args.weights, subtype=args.subtype)
+    print(f">> Combined {len(args.inputs)} stems ({args.method}, {frames} frames) -> {args.output}")
+    return 0
+
+def cmd_midi(args):
+    from .metrics import MetricsWriter
+    from .midi_batch import plan_midi_batch, run_midi_batch
+
+    plan = plan_midi_batch(args.input, args.recursive, args.only)
+    output_dir = os.path.abspath(args.output) if args.output else None
+    metrics = MetricsWriter(args.metrics) if args.metrics else None
+    results = run_midi_batch(plan, output_dir, drum_workers=args.workers, melodic_models=args.models,
+                             metrics=metrics)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 0 if all(r["success"] for r in results) else 1
+
+def cmd_tune(args):
+    import tempfile
+    from .engine import SeparationEngine
+    from .hardware import hardware_fingerprint, hardware_profile
+    from .tuning import TuningStore, make_clip, tunable, tune_model
+
+    store = TuningStore()
+    profile = hardware_profile()
+    if args.show:
+        print(f"Hardware {hardware_fingerprint(profile)}: {profile}")
+        for name, values in sorted(store.tuned_settings().items()):
+            print(f"  {name:<30} seg {values['seg_size']}, overlap {values['overlap']}, batch {values['batch_size']}")
+        return 0
+
+    models = args.model or [name for name in MODEL_DATABASE if tunable(name)]
+    for name in models:
+        if name not in MODEL_DATABASE:
+            raise SystemExit(f"Unknown model: {name}")
+        if not tunable(name):
+            raise SystemExit(f"{name} does not use segment/overlap/batch settings")
+
+    grid = {"seg_size": args.seg_sizes, "overlap": args.overlaps, "batch_size": args.batch_sizes}
+    engine = SeparationEngine(separator_path=args.separator, threads=args.threads)
+    budget = int(args.memory_budget_gb * GB) if args.memory_budget_gb else None
+    print(f">> Tuning {len(models)} model(s) on {profile}")
+    with tempfile.TemporaryDirectory(prefix="glitchstem-clip-") as tmp:
+        clip = make_clip(os.path.join(tmp, "tune_clip.wav"), args.clip_seconds, source=args.clip)
+        for name in models:
+            record = tune_model(engine, name, clip, grid, budget_bytes=budget)
+            if record["best"]:
+                store.save(name, record, profile)
+    print(f">> Tuned settings saved to {store.path} (use them with `separate --tuned`)")
+    return 0
+
+def cmd_cache(args):
+    cache = open_stem_cache(args)
+    if args.action == "stats":
+        s = cache.stats()
+        print(f"Stem cache: {s['root']}")
+        print(f"  {s['entries']} entries, {s['bytes'] / GB:.2f} / {s['max_bytes'] / GB:.2f} GB, {s['hits']} hits")
+    elif args.action == "list":
+        for meta in reversed(cache.entries()):
+            info = meta.get("info", {})
+            print(f"{meta['key'][:12]}  {meta['bytes'] / (1024 ** 2):8.1f} MB  {meta.get('hits', 0):3d} hits  "
+                  f"{info.get('model', '?')}  <- {info.get('input', '?')}")
+    else:
+        evicted = cache.clear() if args.action == "clear" else cache.prune(
+            int(args.max_gb * GB) if args.max_gb is not None else None)
+        freed = sum(m.get("bytes", 0) for m in evicted)
+        print(f"Removed {len(evicted)} entries ({freed / GB:.2f} GB)")
+    return 0
+
+def cmd_bench(args):
+    from .bench import comparison_warnings, compare_results, run_benchmarks
+
+    def run():
+        stub = {k: v for k, v in (("load_seconds", args.load_seconds), ("rtf", args.rtf)) if v is not None}
+        print(f">> Benchmarking on {args.seconds:g}s of synthetic audio, {args.repeat} run(s) per case")
+        return run_benchmarks(args.cases, seconds=args.seconds, repeat=args.repeat, **stub)
+
+    def save(results, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f">> Results written to {path}")
+
+    if args.action == "run":
+        results = run()
+        if args.results:
+            save(results, args.results)
+        if args.save_baseline:
+            save(results, args.baseline)
+        return 0 if all(r["status"] != "failed" for r in results["results"].values()) else 1
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except OSError:
+        raise SystemExit(f"No baseline at {args.baseline} (create one with: bench run --save-baseline)")
+    if args.results:
+        with open(args.results, "r", encoding="utf-8") as f:
+            current = json.load(f)
+    else:
+        current = run()
+
+    for warning in comparison_warnings(baseline, current):
+        print(f">> WARNING: {warning}")
+    rows = compare_results(baseline, current, threshold=args.threshold)
+    print(f"\n{'CASE':<40} {'BASELINE':>10} {'CURRENT':>10} {'RATIO':>7}  STATUS")
+    for row in rows:
+        fmt = lambda v, spec: format(v, spec) if v is not None else "-"
+        print(f"{row['case']:<40} {fmt(row['baseline'], '10.3f'):>10} {fmt(row['current'], '10.3f'):>10} "
+              f"{fmt(row['ratio'], '7.2f'):>7}  {row['status'].upper()}")
+    bad = [row for row in rows if row["status"] in ("regression", "failed")]
+    print(f"\n>> {len(bad)} regression(s)" if bad else "\n>> No regressions")
+    return 1 if bad else 0
+
+COMMANDS = {
+    "separate": cmd_separate,
+    "watch": cmd_watch,
+    "serve": cmd_serve,
+    "list": cmd_list,
+    "combine": cmd_combine,
+    "midi": cmd_midi,
+    "tune": cmd_tune,
+    "cache": cmd_cache,
+    "bench": cmd_bench,
+}
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.trace:
+        trace_dir = os.path.abspath(args.trace)
+        # Pool workers and separator passes inherit it through the environment
+        os.environ[TRACE_ENV] = trace_dir
+        enable_tracing(trace_dir)
+        print(f">> Tracing to {trace_dir}")
+    return COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
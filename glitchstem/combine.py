@@ -0,0 +1,140 @@
+"""Streaming ensemble combiner - merges matching stems from several passes.
+
+Sources are read block by block through memory-mapped AudioReaders, so
+memory use is set by the block size rather than the track length, and every
+block is combined for all channels in one vectorized NumPy expression.
+
+Methods:
+    mean      plain average
+    weighted  weighted average (one weight per source)
+    median    per-sample median (robust against one bad model)
+    max_spec  per time-frequency bin, keep the source with the largest magnitude
+    min_spec  ... the smallest magnitude (less bleed, thinner sound)
+
+The spectral methods use a Hann STFT with 75% overlap on a frame grid that
+is fixed relative to sample 0. Each block pulls in the frames that overlap
+it, so the output does not depend on where the block boundaries fall.
+"""
+import os
+
+import numpy as np
+
+from .audio_io import DEFAULT_BLOCK_FRAMES, AudioReader, open_writer
+from .stems import group_stems
+
+METHODS = ["mean", "weighted", "median", "max_spec", "min_spec"]
+
+N_FFT = 2048
+HOP = N_FFT // 4
+# Periodic Hann: analysis x synthesis windows at 75% overlap sum to exactly 1.5
+WINDOW = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)).astype(np.float32)
+WINDOW_GAIN = 1.5
+
+
+def combine_block(stack, method, weights=None):
+    """Combine time-domain sources of shape (sources, frames, channels)"""
+    if method == "mean":
+        return stack.mean(axis=0)
+    if method == "weighted":
+        w = np.asarray(weights, dtype=np.float32)
+        return np.tensordot(w / w.sum(), stack, axes=1)
+    if method == "median":
+        return np.median(stack, axis=0)
+    raise ValueError(f"Unknown combine method: {method}")
+
+def _spectral_block(stack, pick):
+    """STFT -> per-bin source selection -> overlap-add, for a frame-aligned span.
+
+    ``stack`` is (sources, (n_frames - 1) * HOP + N_FFT, channels) and must
+    start on the frame grid; returns the overlap-added (unnormalized) span.
+    """
+    sources, length, channels = stack.shape
+    n_frames = (length - N_FFT) // HOP + 1
+
+    # (sources, n_frames, channels, N_FFT) view, no copy until the windowing
+    frames = np.lib.stride_tricks.sliding_window_view(stack, N_FFT, axis=1)[:, ::HOP]
+    spec = np.fft.rfft(frames * WINDOW, axis=-1)
+
+    choice = pick(np.abs(spec), axis=0)
+    merged = np.take_along_axis(spec, choice[None], axis=0)[0]
+    out_frames = np.fft.irfft(merged, n=N_FFT, axis=-1).astype(np.float32) * WINDOW
+
+    # Overlap-add: frame j lands at j * HOP; split frames into HOP-sized quarters
+    out = np.zeros((length, channels), dtype=np.float32)
+    quarters = N_FFT // HOP
+    for q in range(quarters):
+        part = out_frames[:, :, q * HOP:(q + 1) * HOP]               # (n_frames, channels, HOP)
+        part = part.transpose(0, 2, 1).reshape(n_frames * HOP, channels)
+        out[q * HOP:q * HOP + n_frames * HOP] += part
+    return out
+
+def combine_spectral(readers, start, stop, method):
+    """max_spec / min_spec for output samples [start, stop)"""
+    pick = np.argmax if method == "max_spec" else np.argmin
+
+    # Frame j covers [j*HOP - (N_FFT - HOP), j*HOP + HOP); take every frame touching the block
+    lead = N_FFT - HOP
+    first = start // HOP
+    last = (stop - 1 + lead) // HOP
+    span_start = first * HOP - lead
+    span_stop = last * HOP - lead + N_FFT
+
+    stack = np.stack([r.read(span_start, span_stop) for r in readers])
+    out = _spectral_block(stack, pick) / WINDOW_GAIN
+    return out[start - span_start:stop - span_start]
+
+def combine_files(inputs, output, method="mean", weights=None, block_frames=DEFAULT_BLOCK_FRAMES,
+                  subtype="PCM_16"):
+    """Combine several stem files into one, block by block.
+
+    Sources may differ in length by a few samples; shorter ones are zero
+    padded. Returns the number of frames written.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown combine method: {method} (choose from {', '.join(METHODS)})")
+    if method == "weighted" and (not weights or len(weights) != len(inputs)):
+        raise ValueError("weighted combine needs one weight per input")
+
+    readers = [AudioReader(path) for path in inputs]
+    try:
+        samplerate = readers[0].samplerate
+        channels = max(r.channels for r in readers)
+        if any(r.samplerate != samplerate for r in readers):
+            raise ValueError("Cannot combine stems with different sample rates")
+        if any(r.channels != channels for r in readers):
+            raise ValueError("Cannot combine stems with different channel counts")
+        frames = max(r.frames for r in readers)
+
+        with open_writer(output, samplerate, channels, subtype) as out:
+            for start in range(0, frames, block_frames):
+                stop = min(start + block_frames, frames)
+                if method in ("max_spec", "min_spec"):
+                    block = combine_spectral(readers, start, stop, method)
+                else:
+                    block = combine_block(np.stack([r.read(start, stop) for r in readers]), method, weights)
+                # Float intermediates keep their headroom; delivery normalizes them later
+                out.write(block if subtype == "FLOAT" else np.clip(block, -1.0, 1.0))
+        return frames
+    finally:
+        for r in readers:
+            r.close()
+
+def combine_passes(pass_dirs, output_dir, base_name, method="mean", weights=None, log=print):
+    """Combine every stem tag that at least two passes produced.
+
+    Writes ``<base>_(<Tag>)_ensemble_<method>.wav`` files to output_dir and
+    returns their paths.
+    """
+    written = []
+    for tag, paths in group_stems(pass_dirs).items():
+        if len(paths) < 2:
+            continue
+        tag_weights = None
+        if method == "weighted":
+            # Weights follow pass order; drop the ones for passes missing this stem
+            tag_weights = [weights[pass_dirs.index(os.path.dirname(p))] for p in paths]
+        output = os.path.join(output_dir, f"{base_name}_({tag.title()})_ensemble_{method}.wav")
+        log(f">> Combining {len(paths)} x {tag} ({method})...")
+        combine_files(paths, output, method, tag_weights)
+        written.append(output)
+    return written
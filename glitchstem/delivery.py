@@ -0,0 +1,107 @@
+"""Final-output encoding in a background writer pool.
+
+Files the engine writes itself between stages (combined stems, stitched
+stream chunks, gated passes) stay unnormalized float32 WAV, so the next
+stage reads them back without a 16-bit round trip or clipping. Only when a
+job is done are its outputs normalized to the separator's peak level and
+encoded to the delivery format: 16-bit WAV, 24-bit WAV or FLAC. That runs
+on a process-wide thread pool, so the next job's inference starts while
+the previous job's stems are still being written.
+
+Encoding reads the file block by block (peak scan, then the write) and
+replaces it atomically; a file already in the delivery format is left as
+it is.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .audio_io import AudioReader
+
+# name -> (soundfile container, subtype, extension)
+DELIVERY_FORMATS = {
+    "wav": ("WAV", "PCM_16", ".wav"),
+    "wav24": ("WAV", "PCM_24", ".wav"),
+    "flac": ("FLAC", "PCM_24", ".flac"),
+}
+DEFAULT_FORMAT = "wav"
+INTERMEDIATE_SUBTYPE = "FLOAT"
+# Same peak the separator normalizes its own outputs to
+OUTPUT_PEAK = 0.9
+DEFAULT_WRITERS = 2
+
+
+def encode_output(path, fmt=DEFAULT_FORMAT, peak=OUTPUT_PEAK):
+    """Write path in the delivery format, scaled down to peak if louder; returns the final path"""
+    import soundfile as sf
+
+    container, subtype, ext = DELIVERY_FORMATS[fmt]
+    dest = os.path.splitext(path)[0] + ext
+    if dest == path and sf.info(path).subtype == subtype:
+        return path
+    tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+    try:
+        with AudioReader(path) as reader:
+            top = max((float(np.abs(block).max()) for _, block in reader.blocks()), default=0.0)
+            gain = np.float32(peak / top if top > peak else 1.0)
+            with sf.SoundFile(tmp, "w", samplerate=reader.samplerate, channels=reader.channels,
+                              subtype=subtype, format=container) as out:
+                for _, block in reader.blocks():
+                    out.write(block * gain)
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if dest != path:
+        os.remove(path)
+    return dest
+
+def job_outputs(folder):
+    """Every stem WAV under a job's output folder (scratch folders excluded)"""
+    found = []
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("_"))
+        found += [os.path.join(root, name) for name in sorted(files) if name.lower().endswith(".wav")]
+    return found
+
+
+class OutputWriter:
+    """Thread pool encoding finished outputs; submit() returns at once"""
+
+    def __init__(self, workers=DEFAULT_WRITERS):
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="output")
+
+    def submit(self, paths, fmt=DEFAULT_FORMAT, log=print):
+        """Queue paths for encoding; the future's result is (written paths, failures)"""
+        return self.pool.submit(self._write, list(paths), fmt, log)
+
+    @staticmethod
+    def _write(paths, fmt, log):
+        start = time.perf_counter()
+        written, failed = [], 0
+        for path in paths:
+            try:
+                written.append(encode_output(path, fmt))
+            except Exception as e:
+                failed += 1
+                log(f"ERROR: Could not write {os.path.basename(path)} as {fmt}: {str(e)}")
+        log(f">> Wrote {len(written)} output(s) as {fmt} in {time.perf_counter() - start:.1f}s"
+            + (f" ({failed} failed)" if failed else ""))
+        return written, failed
+
+_default_writer = None
+_default_writer_lock = threading.Lock()
+
+def get_output_writer():
+    """Process-wide OutputWriter (created on first use)"""
+    global _default_writer
+    with _default_writer_lock:
+        if _default_writer is None:
+            _default_writer = OutputWriter()
+        return _default_writer
@@ -0,0 +1,680 @@
+"""Separation engine - runs audio-separator passes without any GUI dependency"""
+import collections
+import copy
+import os
+import shutil
+import subprocess
+import time
+import uuid
+
+from .hardware import CREATE_NO_WINDOW, cached_gpu_info
+from .catalog import register_model
+from .delivery import DEFAULT_FORMAT, get_output_writer, job_outputs
+from .hashing import audio_digest
+from .memory import MemoryBudget, PeakSampler, default_pass_budget, estimate_pass_bytes, peak_rss_bytes
+from .metrics import PassTimer, audio_seconds, realtime_factor
+from .models import MODEL_DATABASE, ENSEMBLE_PRESETS
+from .oom import DEFAULT_OOM_RETRIES, is_oom, smaller_settings
+from .residency import get_default_cache, separate_with
+from .stem_cache import detach_links
+from .tracing import complete, finish_run, span, start_run
+from .workflow import WorkflowError, WorkflowRunner, describe_node, graph_models, legacy_graph, preset_graph
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+# Same defaults as the GUI sliders
+DEFAULT_SETTINGS = {"seg_size": 256, "overlap": 8, "batch_size": 1}
+
+# Output written by every pass
+OUTPUT_FORMAT = "wav"
+NORMALIZATION = 0.9
+
+# Thread pools torch/onnxruntime/numpy size themselves from
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]
+
+
+def find_separator(base_dir=BASE_DIR):
+    """Locate the audio-separator executable (bundled venv first, then PATH)"""
+    candidates = [
+        os.path.join(base_dir, "venv_ultra", "Scripts", "audio-separator"),
+        os.path.join(base_dir, "venv_ultra", "Scripts", "audio-separator.exe"),
+        os.path.join(base_dir, "venv_ultra", "bin", "audio-separator"),
+    ]
+    for path in candidates:
+        if os.path.exists(path):
+            return os.path.abspath(path)
+    return shutil.which("audio-separator") or os.path.abspath(candidates[0])
+
+def resolve_workflow(name):
+    """Map a CLI name to a MODEL_DATABASE or ENSEMBLE_PRESETS key.
+
+    Exact keys win; otherwise a case-insensitive match on the preset name
+    without its "ENSEMBLE:" prefix and emoji is tried ("ultimate vocals"),
+    then the model catalog (a models_list.json name or model filename).
+    Returns None when nothing matches.
+    """
+    if name in MODEL_DATABASE or name in ENSEMBLE_PRESETS:
+        return name
+
+    wanted = _plain_name(name)
+    for key in list(MODEL_DATABASE) + list(ENSEMBLE_PRESETS):
+        if _plain_name(key) == wanted:
+            return key
+    return register_model(name)
+
+def _plain_name(name):
+    name = name.lower()
+    if name.startswith("ensemble:"):
+        name = name[len("ensemble:"):]
+    return "".join(c for c in name if c.isalnum() or c in " -+").strip()
+
+def _snapshot(folder):
+    """{filename: (mtime_ns, size)} for the files in a folder"""
+    if not os.path.isdir(folder):
+        return {}
+    snapshot = {}
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path):
+            st = os.stat(path)
+            snapshot[name] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+def _files_written(folder, before, base_name):
+    """Files named after base_name that are new or changed since ``before`` (a pass's outputs).
+
+    Several passes may write into one folder at once (fan-out post-processing),
+    so only this pass's "<base>_(<Stem>)..." names count.
+    """
+    after = _snapshot(folder)
+    return [os.path.join(folder, name) for name in sorted(after)
+            if before.get(name) != after[name] and name.startswith(base_name + "_(")]
+
+
+class SeparationEngine:
+    """Runs single-model and ensemble separations through audio-separator.
+
+    ``settings`` carries the seg_size / overlap / batch_size values the GUI
+    sliders used to provide, ``log`` receives every status line and
+    ``threads`` caps the CPU threads each separator subprocess may use.
+
+    ``backend`` is "subprocess" (a fresh audio-separator process per pass)
+    or "inprocess", which keeps loaded models in a ModelResidencyCache
+    (``model_cache``, default: the process-wide cache).
+
+    ``stem_cache`` is an optional StemCache consulted before every pass.
+
+    Ensembles are workflow graphs (see glitchstem.workflow). Stages whose
+    inputs are ready run concurrently, at most ``max_parallel_passes`` at a
+    time (None = one per core, at least one per model stage), and model
+    passes only while their estimated memory fits ``memory_budget`` (a
+    MemoryBudget; default sized from VRAM, or RAM on CPU).
+
+    ``stream_chunk_seconds`` turns on chunk pipelining between a separate
+    stage and the post-process reading it (see glitchstem.pipeline); None
+    runs them end to end.
+
+    ``staging`` is an optional InputStaging: ensembles then decode a
+    compressed input once and every pass reads the staged WAV.
+
+    ``tuned_settings`` maps model names to the seg_size / overlap /
+    batch_size glitchstem.tuning found fastest on this machine; those
+    models run with them instead of ``settings``.
+
+    ``metrics`` receives a dict per job, per pass and per progress update
+    (see glitchstem.metrics).
+
+    ``gate`` is an optional SilenceGate: passes then run only on the
+    regions of their input above its level (see glitchstem.gating).
+
+    Finished jobs' stems are encoded to ``output_format`` ("wav", "wav24"
+    or "flac") on a background writer pool (see glitchstem.delivery);
+    wait_outputs() waits for them. Throwaway files (gated passes, stream
+    chunks) go to ``scratch_dir``, e.g. a RAM disk, or else next to the
+    outputs.
+
+    A pass that runs out of memory is retried up to ``oom_retries`` times
+    with a smaller batch_size, then seg_size. ``memory_profile`` (a
+    glitchstem.oom.MemoryProfile) remembers what failed while running
+    alone (``concurrent_jobs`` is how many jobs share the device), what
+    worked and the peaks passes used. Settings that failed before are
+    replaced up front.
+    """
+
+    def __init__(self, separator_path=None, settings=None, log=None, threads=None,
+                 backend="subprocess", model_cache=None, stem_cache=None,
+                 memory_budget=None, max_parallel_passes=None, stream_chunk_seconds=None,
+                 staging=None, tuned_settings=None, metrics=None, gate=None,
+                 output_format=DEFAULT_FORMAT, scratch_dir=None,
+                 memory_profile=None, oom_retries=DEFAULT_OOM_RETRIES, concurrent_jobs=1):
+        self.separator_path = separator_path or find_separator()
+        self.settings = dict(DEFAULT_SETTINGS)
+        if settings:
+            self.settings.update(settings)
+        self.log = log or print
+        self.threads = threads
+        self.backend = backend
+        self.model_cache = model_cache
+        self.stem_cache = stem_cache
+        self.memory_budget = memory_budget
+        self.max_parallel_passes = max_parallel_passes
+        self.stream_chunk_seconds = stream_chunk_seconds
+        self.staging = staging
+        self.tuned_settings = tuned_settings
+        self.metrics = metrics
+        self.gate = gate
+        self.output_format = output_format
+        self.scratch_dir = scratch_dir
+        # Separator output peak limit; streamed chunk passes raise it (see glitchstem.pipeline)
+        self.normalization = NORMALIZATION
+        self.memory_profile = memory_profile
+        self.oom_retries = oom_retries
+        self.concurrent_jobs = concurrent_jobs
+        # model -> settings forced by admission or an OOM backoff; shared with for_pass() copies
+        self.settings_overrides = {}
+        # Sample separator VRAM too when there is a GPU (resolved on first pass)
+        self.sample_vram = None
+        # Encodes of finished jobs still running on the output writer
+        self.pending_outputs = []
+        # Current job's record; shared with for_pass() copies, which add their passes
+        self.job_metrics = None
+        self.last_job = None
+        self.trace_run = None
+        # staged path -> original input, so cache keys stay those of the original
+        self.staged_inputs = {}
+
+    def model_settings(self, model_name):
+        """settings with the model's tuned values (if any) on top, then any memory override"""
+        tuned = (self.tuned_settings or {}).get(model_name)
+        settings = dict(self.settings, **tuned) if tuned else self.settings
+        override = self.settings_overrides.get(model_name)
+        return dict(settings, **override) if override else settings
+
+    def admit_settings(self, model_name):
+        """Shrink model_name's settings if they already ran out of memory (alone) on this machine.
+
+        Estimates alone never shrink them: a pass that may not fit is run
+        alone instead (see WorkflowRunner.run_pass).
+        """
+        if self.memory_profile is None or model_name in self.settings_overrides:
+            return
+        model_filename = MODEL_DATABASE[model_name]["file"]
+        requested = settings = self.model_settings(model_name)
+        if not self.memory_profile.known_to_fail(model_filename, settings):
+            return
+        working = self.memory_profile.working(model_filename)
+        if working:
+            settings = dict(settings, seg_size=min(working["seg_size"], settings["seg_size"]),
+                            batch_size=min(working["batch_size"], settings["batch_size"]))
+        while self.memory_profile.known_to_fail(model_filename, settings):
+            smaller = smaller_settings(model_filename, settings)
+            if smaller is None:
+                break
+            settings = smaller
+        if settings != requested:
+            self.settings_overrides[model_name] = {k: settings[k] for k in ("seg_size", "batch_size")}
+            self.log(f">> {model_name}: seg {requested['seg_size']}, batch {requested['batch_size']} ran out of "
+                     f"memory here before, using seg {settings['seg_size']}, batch {settings['batch_size']}")
+
+    def pass_bytes(self, model_name):
+        """Estimated peak memory of model_name's next pass (after admission)"""
+        self.admit_settings(model_name)
+        model_filename = MODEL_DATABASE[model_name]["file"]
+        settings = self.model_settings(model_name)
+        if self.memory_profile is not None:
+            return self.memory_profile.estimate(model_filename, settings)
+        return estimate_pass_bytes(model_filename, settings)
+
+    def inference_params(self, model_name):
+        """Architecture-specific separator params, keyed by CLI flag name"""
+        model_filename = MODEL_DATABASE[model_name]["file"]
+        if "htdemucs" in model_filename:
+            return {"demucs_shifts": 4, "demucs_overlap": 0.25}
+        settings = self.model_settings(model_name)
+        return {
+            "mdxc_segment_size": int(settings["seg_size"]),
+            "mdxc_overlap": int(settings["overlap"]),
+            "mdxc_batch_size": int(settings["batch_size"]),
+        }
+
+    def build_command(self, model_name, input_file, output_dir):
+        """Build the audio-separator command line for one pass"""
+        model_filename = MODEL_DATABASE[model_name]["file"]
+
+        cmd = [
+            self.separator_path,
+            input_file,
+            "--model_filename", model_filename,
+            "--output_dir", output_dir,
+            "--output_format", OUTPUT_FORMAT,
+            "--normalization", str(self.normalization),
+            "--use_autocast"
+        ]
+
+        # Add architecture-specific params
+        for flag, value in self.inference_params(model_name).items():
+            cmd.extend([f"--{flag}", str(value)])
+        return cmd
+
+    def subprocess_env(self):
+        """Environment for separator subprocesses (None = inherit)"""
+        if not self.threads:
+            return None
+        env = dict(os.environ)
+        for var in THREAD_ENV_VARS:
+            env[var] = str(self.threads)
+        return env
+
+    def cache_params(self, model_name):
+        """Everything besides the input and model file that changes a pass's output"""
+        params = dict(self.inference_params(model_name), normalization=self.normalization,
+                      output_format=OUTPUT_FORMAT)
+        if self.gate is not None:
+            params.update(self.gate.cache_params())
+        return params
+
+    def run_model(self, model_name, input_file, output_dir, suffix=""):
+        """Run a single model, return True on success"""
+        # Catalog models are registered per process (batch workers start without them)
+        if register_model(model_name) is None:
+            self.log(f"ERROR: Unknown model {model_name}")
+            return None
+
+        self.admit_settings(model_name)
+        record = {"type": "pass", "model": model_name, "input": input_file, "output_dir": output_dir,
+                  "backend": self.backend, "params": self.inference_params(model_name),
+                  "input_seconds": audio_seconds(input_file)}
+        start = time.perf_counter()
+        cache_key = None
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        if self.stem_cache is not None:
+            try:
+                with span("stem_cache.lookup", model=model_name):
+                    source = self.staged_inputs.get(input_file, input_file)
+                    cache_key = self.stem_cache.make_key(audio_digest(source), MODEL_DATABASE[model_name]["file"],
+                                                         self.cache_params(model_name))
+                    outputs = self.stem_cache.materialize(cache_key, output_dir, base_name)
+            except OSError as e:
+                self.log(f">> Stem cache unavailable: {e}")
+                cache_key, outputs = None, None
+            if outputs:
+                self.log(f"Cached: {model_name} ({len(outputs)} stems, skipping inference)")
+                self.emit_pass(record, "cached", start)
+                return True
+            detach_links(output_dir)
+
+        if (self.tuned_settings or {}).get(model_name):
+            settings = self.model_settings(model_name)
+            self.log(f">> Tuned settings for {model_name}: seg {settings['seg_size']}, "
+                     f"overlap {settings['overlap']}, batch {settings['batch_size']}")
+
+        with span("scan_outputs", folder=output_dir):
+            before = _snapshot(output_dir)
+        success = self.run_with_backoff(model_name, input_file, output_dir, record)
+        self.emit_pass(record, "ok" if success else "failed", start)
+
+        if success and cache_key and record.get("oom_retries"):
+            # The settings changed, and with them the cache key
+            cache_key = self.stem_cache.make_key(audio_digest(self.staged_inputs.get(input_file, input_file)),
+                                                 MODEL_DATABASE[model_name]["file"], self.cache_params(model_name))
+        if success and cache_key:
+            with span("scan_outputs", folder=output_dir):
+                written = _files_written(output_dir, before, base_name)
+            if written:
+                try:
+                    with span("stem_cache.store", model=model_name, files=len(written)):
+                        self.stem_cache.store(cache_key, written, base_name,
+                                              {"model": model_name, "input": os.path.basename(input_file)})
+                except OSError as e:
+                    self.log(f">> Could not cache stems: {e}")
+        return success
+
+    def run_with_backoff(self, model_name, input_file, output_dir, record):
+        """Run a pass (gated if enabled); on out-of-memory, retry with smaller settings"""
+        model_filename = MODEL_DATABASE[model_name]["file"]
+        failed = []
+        while True:
+            record.pop("oom", None)
+            if self.gate is not None:
+                try:
+                    with span("gate", model=model_name):
+                        success = self.gate.run(self, model_name, input_file, output_dir, record)
+                except (OSError, RuntimeError) as e:
+                    self.log(f"ERROR: Silence gate failed: {str(e)}")
+                    record["error"] = str(e)
+                    success = False
+            else:
+                success = self.run_backend(model_name, input_file, output_dir, record)
+            settings = self.model_settings(model_name)
+            if success or not record.get("oom"):
+                break
+            # Out of memory next to other passes says little about this setting on its own
+            alone = self.concurrent_jobs <= 1 and (self.memory_budget is None or self.memory_budget.running <= 1)
+            failed.append((settings, alone))
+            smaller = smaller_settings(model_filename, settings)
+            if smaller is None or len(failed) > self.oom_retries:
+                self.log(f"ERROR: {model_name} ran out of memory at seg {settings['seg_size']}, "
+                         f"batch {settings['batch_size']}" + ("" if smaller else " (nothing smaller to try)"))
+                break
+            self.log(f">> {model_name} ran out of memory at seg {settings['seg_size']}, batch "
+                     f"{settings['batch_size']}; retrying with seg {smaller['seg_size']}, batch {smaller['batch_size']}")
+            self.settings_overrides[model_name] = {k: smaller[k] for k in ("seg_size", "batch_size")}
+            record.pop("error", None)
+
+        record["oom_retries"] = len(failed) if success else max(0, len(failed) - 1)
+        record["params"] = self.inference_params(model_name)
+        if self.memory_profile is not None:
+            alone_failures = [bad for bad, alone in failed if alone]
+            for bad in alone_failures:
+                self.memory_profile.record_oom(model_filename, bad)
+            if failed and not alone_failures:
+                self.log(f">> {model_name}: not remembering the out-of-memory failure, other passes were running")
+            if success and alone_failures:
+                self.memory_profile.remember_working(model_filename, settings)
+                self.log(f">> {model_name}: remembered seg {settings['seg_size']}, batch {settings['batch_size']} "
+                         f"for this machine")
+            peak = record.get("peak_vram_bytes") or record.get("peak_rss_bytes")
+            if success and self.backend == "subprocess" and peak:
+                self.memory_profile.observe(model_filename, settings, peak)
+        return success
+
+    def run_backend(self, model_name, input_file, output_dir, record=None):
+        """Run one pass on the configured backend (no cache, no gate)"""
+        if self.backend == "inprocess":
+            return self.run_model_inprocess(model_name, input_file, output_dir, record)
+        return self.run_model_subprocess(model_name, input_file, output_dir, record)
+
+    def run_model_subprocess(self, model_name, input_file, output_dir, record=None):
+        """Run a pass in a fresh audio-separator process"""
+        cmd = self.build_command(model_name, input_file, output_dir)
+        record = {} if record is None else record
+
+        self.log(f"Running: {model_name}")
+
+        timer = PassTimer()
+        # The last lines tell an out-of-memory failure from any other
+        tail = collections.deque(maxlen=20)
+        if self.sample_vram is None:
+            self.sample_vram = self.memory_profile is not None and bool(cached_gpu_info().get("cuda_available"))
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, bufsize=1, env=self.subprocess_env(),
+                                       creationflags=CREATE_NO_WINDOW)
+            with PeakSampler(process.pid, self.sample_vram) as sampler:
+                for line in process.stdout:
+                    line = line.strip()
+                    if line:
+                        self.log(line)
+                        tail.append(line)
+                        progress = timer.feed(line)
+                        if progress:
+                            self.emit(dict(progress, type="progress", model=model_name, input=input_file))
+                process.wait()
+            end = time.perf_counter()
+            record.update(timer.phases(end), exit_code=process.returncode, peak_rss_bytes=sampler.peak_ram)
+            if sampler.peak_vram:
+                record["peak_vram_bytes"] = sampler.peak_vram
+            if process.returncode != 0:
+                record["oom"] = is_oom(tail, process.returncode)
+            self.trace_phases(timer, end, model_name, sampler.peak_ram)
+            return process.returncode == 0
+        except Exception as e:
+            self.log(f"ERROR: {str(e)}")
+            record["error"] = str(e)
+            return False
+
+    def run_model_inprocess(self, model_name, input_file, output_dir, record=None):
+        """Run a pass on a resident model (loaded once, reused across passes)"""
+        if self.model_cache is None:
+            self.model_cache = get_default_cache()
+        self.model_cache.log = self.log
+        record = {} if record is None else record
+
+        model_filename = MODEL_DATABASE[model_name]["file"]
+        self.log(f"Running (in-process): {model_name}")
+
+        try:
+            start = time.perf_counter()
+            params = dict(self.inference_params(model_name), normalization=self.normalization)
+            with self.model_cache.acquire(model_filename, params) as separator:
+                # Decode, inference and writing all happen inside separate()
+                loaded = time.perf_counter()
+                complete("load_model", start, loaded, model=model_name)
+                with span("separate", model=model_name):
+                    for output in separate_with(separator, input_file, output_dir) or []:
+                        self.log(f"Wrote: {os.path.basename(output)}")
+                record.update(load_seconds=loaded - start, inference_seconds=time.perf_counter() - loaded)
+            record["peak_rss_bytes"] = peak_rss_bytes()
+            self.log(f">> {self.model_cache.describe()}")
+            return True
+        except Exception as e:
+            self.log(f"ERROR: {str(e)}")
+            record["error"] = str(e)
+            record["oom"] = is_oom([type(e).__name__, str(e)])
+        if record["oom"]:
+            # Out here the traceback no longer holds the failed separator; free it before a retry
+            self.model_cache.evict(model_filename)
+        return False
+
+    def trace_phases(self, timer, end, model_name, peak_rss):
+        """Separator phases as trace spans, from when its output lines arrived"""
+        load_start = timer.loaded_at - timer.load_seconds if timer.loaded_at and timer.load_seconds else None
+        # Each phase runs from its mark to the next one present
+        marks = [("startup", timer.start), ("load_model", load_start), ("decode", timer.loaded_at),
+                 ("inference", timer.first_progress), ("write", timer.last_progress), (None, end)]
+        marks = [(name, t) for name, t in marks if t is not None]
+        for (name, t0), (_, t1) in zip(marks, marks[1:]):
+            complete(f"separator.{name}", t0, t1, "separator", model=model_name)
+        complete("separator", timer.start, end, "separator", model=model_name, peak_rss_bytes=peak_rss)
+
+    def emit(self, record):
+        """Send a metrics record to the metrics callback, tagged with the current job"""
+        if self.metrics is None:
+            return
+        if self.job_metrics is not None:
+            record = dict(record, job=self.job_metrics["job"])
+        try:
+            self.metrics(dict(record, time=time.time()))
+        except Exception as e:
+            self.log(f">> Metrics callback failed: {str(e)}")
+
+    def emit_pass(self, record, status, start):
+        record.update(status=status, seconds=time.perf_counter() - start)
+        record["realtime"] = realtime_factor(record["input_seconds"], record["seconds"])
+        complete(f"pass {record['model']}", start, start + record["seconds"], "pass", status=status,
+                 input=os.path.basename(record["input"]))
+        if self.job_metrics is not None:
+            self.job_metrics["passes"].append(record)
+        self.emit(record)
+
+    def start_job(self, workflow, input_file):
+        """Open the job record that passes are collected into until finish_job()"""
+        self.job_metrics = {"type": "job", "job": uuid.uuid4().hex[:12], "workflow": workflow,
+                            "input": input_file, "input_seconds": audio_seconds(input_file),
+                            "decode_seconds": None, "passes": [], "_start": time.perf_counter()}
+        if self.trace_run is not None:
+            # The previous job ended in an exception
+            finish_run(self.trace_run, log=self.log, status="aborted")
+        self.trace_run = start_run(f"{workflow} {os.path.basename(input_file)}")
+
+    def finish_job(self, success):
+        """Close and emit the current job record; returns it"""
+        job, self.job_metrics = self.job_metrics, None
+        trace_run, self.trace_run = self.trace_run, None
+        finish_run(trace_run, log=self.log, status="ok" if success else "failed")
+        if job is None:
+            return None
+        passes = job.pop("passes")
+        job.update(status="ok" if success else "failed", seconds=time.perf_counter() - job.pop("_start"),
+                   passes=len(passes), cached_passes=sum(1 for p in passes if p.get("status") == "cached"),
+                   failed_passes=sum(1 for p in passes if p.get("status") == "failed"),
+                   peak_rss_bytes=max([p.get("peak_rss_bytes") or 0 for p in passes] + [peak_rss_bytes()]))
+        for phase in ("load_seconds", "inference_seconds", "write_seconds"):
+            values = [p[phase] for p in passes if p.get(phase) is not None]
+            job[phase] = sum(values) if values else None
+        gated = [p["gate"] for p in passes if p.get("gate")]
+        if gated:
+            job["gate_skipped_seconds"] = sum(g["skipped_seconds"] for g in gated)
+            saved = [g["saved_seconds"] for g in gated if g["saved_seconds"] is not None]
+            job["gate_saved_seconds"] = sum(saved) if saved else None
+            self.log(f">> Gate: skipped {job['gate_skipped_seconds']:.1f}s of audio across {len(gated)} pass(es)"
+                     + (f", ~{job['gate_saved_seconds']:.1f}s saved" if saved else ""))
+        job["realtime"] = realtime_factor(job["input_seconds"], job["seconds"])
+        self.last_job = job
+        self.emit(job)
+        return job
+
+    def stage_input(self, input_file):
+        """Decoded-once copy of input_file for every pass to share (see glitchstem.staging)"""
+        if self.staging is None:
+            return input_file
+        start = time.perf_counter()
+        with span("stage_input", input=os.path.basename(input_file)):
+            staged = self.staging.stage(input_file, log=self.log)
+        if staged != input_file:
+            self.staged_inputs[staged] = input_file
+            if self.job_metrics is not None:
+                self.job_metrics["decode_seconds"] = time.perf_counter() - start
+        return staged
+
+    def release_input(self, staged):
+        """Drop the job's link to a staged input once its passes are done"""
+        if self.staging is not None and self.staged_inputs.pop(staged, None) is not None:
+            self.staging.release(staged)
+
+    def process_single(self, model_name, input_file, output_dir):
+        """Process with a single model"""
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        self.log(f"\n{'='*50}")
+        self.log(f"Starting separation: {model_name}")
+        self.log(f"{'='*50}")
+
+        self.start_job(model_name, input_file)
+        before = _snapshot(output_dir)
+        success = self.run_model(model_name, input_file, output_dir)
+        self.finish_job(success)
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        self.deliver(_files_written(output_dir, before, base_name))
+
+        if success:
+            self.log(f"\n>> SEPARATION COMPLETE")
+            self.log(f">> Output: {output_dir}")
+        else:
+            self.log("\n>> ERROR: Separation failed")
+        return bool(success)
+
+    def process_ensemble(self, preset_name, input_file, output_dir):
+        """Process with ensemble (a workflow graph, see glitchstem.workflow)"""
+        preset = ENSEMBLE_PRESETS[preset_name]
+        graph = preset_graph(preset)
+
+        # Create temp directory for ensemble processing
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        ensemble_dir = os.path.join(output_dir, f"{base_name}_ensemble")
+
+        self.log(f"\n{'='*50}")
+        self.log(f"ENSEMBLE MODE: {preset_name}")
+        self.log(f"Models: {', '.join(graph_models(graph))}")
+        self.log(f"Stages: {' | '.join(describe_node(node) for node in graph)}")
+        self.log(f"{'='*50}\n")
+
+        self.start_job(preset_name, input_file)
+        input_file = self.stage_input(input_file)
+        all_success = self.run_workflow(graph, input_file, ensemble_dir)
+        self.release_input(input_file)
+        self.finish_job(all_success)
+        self.deliver(job_outputs(ensemble_dir))
+
+        if all_success:
+            self.log(f"\n{'='*50}")
+            self.log(f">> ENSEMBLE COMPLETE")
+            self.log(f">> Output directory: {ensemble_dir}")
+            if any(node["op"] == "combine" for node in graph):
+                self.log(f">> Combined stems: {os.path.join(ensemble_dir, 'combined')}")
+            else:
+                self.log(f">> Tip: Compare outputs from each pass, or average them in your DAW")
+            self.log(f"{'='*50}")
+        else:
+            self.log("\n>> ENSEMBLE COMPLETED WITH ERRORS")
+        return all_success
+
+    def process_custom_ensemble(self, config, input_file, output_dir):
+        """Process custom ensemble workflow ({"models", "post_process", "output_stem"})"""
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        ensemble_dir = os.path.join(output_dir, f"{base_name}_custom")
+
+        self.log(f"\n{'='*50}")
+        self.log(f"CUSTOM ENSEMBLE")
+        self.log(f"{'='*50}\n")
+
+        self.start_job("custom", input_file)
+        input_file = self.stage_input(input_file)
+        all_success = self.run_workflow(legacy_graph(config, first_target_only=True), input_file, ensemble_dir)
+        self.release_input(input_file)
+        self.finish_job(all_success)
+        self.deliver(job_outputs(ensemble_dir))
+
+        self.log(f"\n{'='*50}")
+        self.log(f">> CUSTOM ENSEMBLE COMPLETE")
+        self.log(f">> Output: {ensemble_dir}")
+        self.log(f"{'='*50}")
+        return all_success
+
+    def process(self, name, input_file, output_dir):
+        """Run a model or ensemble preset by name"""
+        if name in ENSEMBLE_PRESETS:
+            return self.process_ensemble(name, input_file, output_dir)
+        return self.process_single(name, input_file, output_dir)
+
+    def run_workflow(self, graph, input_file, work_dir):
+        """Run a workflow graph on input_file, outputs under work_dir; True if every stage succeeded"""
+        try:
+            runner = WorkflowRunner(self, graph, input_file, work_dir)
+        except WorkflowError as e:
+            self.log(f"ERROR: Invalid workflow: {str(e)}")
+            return False
+        return runner.run()
+
+    def deliver(self, paths):
+        """Hand a finished job's outputs to the background writer (normalize + encode)"""
+        if not paths:
+            return None
+        future = get_output_writer().submit(paths, self.output_format, self.log)
+        self.pending_outputs = [f for f in self.pending_outputs if not f.done()] + [future]
+        return future
+
+    def wait_outputs(self):
+        """Wait until every delivered output is written; returns the number that failed"""
+        pending, self.pending_outputs = self.pending_outputs, []
+        return sum(future.result()[1] for future in pending)
+
+    def scratch_folder(self, output_dir, name):
+        """New folder for a pass's throwaway files, under scratch_dir or else output_dir"""
+        folder = os.path.join(self.scratch_dir or output_dir, name, uuid.uuid4().hex[:12])
+        os.makedirs(folder)
+        return folder
+
+    def remove_scratch(self, folder):
+        shutil.rmtree(folder, ignore_errors=True)
+        try:
+            # The shared parent goes too once no other pass uses it
+            os.rmdir(os.path.dirname(folder))
+        except OSError:
+            pass
+
+    def get_memory_budget(self):
+        """Budget shared by concurrent passes (sized from the hardware on first use)"""
+        if self.memory_budget is None:
+            self.memory_budget = MemoryBudget(default_pass_budget())
+        return self.memory_budget
+
+    def for_pass(self, prefix, threads=None):
+        """Shallow copy of this engine that prefixes its log lines"""
+        child = copy.copy(self)
+        parent_log = self.log
+        child.log = lambda message: parent_log("\n".join(prefix + line if line else line
+                                                          for line in message.split("\n")))
+        child.threads = threads
+        return child
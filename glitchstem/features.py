@@ -0,0 +1,296 @@
+"""Per-stem audio feature store shared by the drum, tempo and melodic paths.
+
+Features are keyed by the stem's content hash and computed at most once:
+decoded mono PCM per sample rate, the STFT magnitude, the onset envelope,
+onset frames, beats and tempo, and the drum band energies. Each one is a
+plain ``.npy`` file, loaded memory-mapped, so re-running an extraction on
+the same stem starts from disk instead of decoding and analysing again.
+
+Layout: ``<root>/<key[:2]>/<key>/<feature>.npy`` plus ``meta.json`` with a
+``last_used`` stamp for LRU pruning (same scheme as the stem cache).
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from .hashing import file_digest, params_digest
+from .memory import GB
+from .paths import app_path
+from .staging import find_staged
+from .streaming import DEFAULT_BLOCK_SECONDS, FrameStream, NpyAppender, stream_mono
+
+DEFAULT_FEATURE_DIR = app_path("features")
+DEFAULT_MAX_BYTES = 5 * GB
+
+N_FFT = 2048
+HOP_LENGTH = 512
+SPECTRAL_BLOCK = 4096   # STFT frames per block when deriving the onset envelope
+
+
+class FeatureStore:
+    def __init__(self, root=DEFAULT_FEATURE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def features(self, path):
+        return StemFeatures(path, self)
+
+    def touch(self, key):
+        """Refresh an entry's last_used stamp and byte count"""
+        entry_dir = self.entry_dir(key)
+        meta = {"key": key, "last_used": time.time(),
+                "bytes": sum(os.path.getsize(os.path.join(entry_dir, n)) for n in os.listdir(entry_dir))}
+        tmp = os.path.join(entry_dir, f"meta.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, os.path.join(entry_dir, "meta.json"))
+        except OSError:
+            pass
+
+    def entries(self):
+        """All entry metas, least recently used first"""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for key in os.listdir(shard_dir):
+                try:
+                    with open(os.path.join(shard_dir, key, "meta.json"), "r", encoding="utf-8") as f:
+                        found.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        found.sort(key=lambda m: m.get("last_used", 0))
+        return found
+
+    def prune(self, max_bytes=None, keep=None):
+        """Evict least-recently-used entries until the store fits"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(m.get("bytes", 0) for m in entries)
+        evicted = []
+        for meta in entries:
+            if total <= max_bytes:
+                break
+            if meta["key"] == keep:
+                continue
+            shutil.rmtree(self.entry_dir(meta["key"]), ignore_errors=True)
+            total -= meta.get("bytes", 0)
+            evicted.append(meta)
+        return evicted
+
+    def clear(self):
+        return self.prune(0)
+
+class StemFeatures:
+    """Lazily computed, persisted features of one audio file.
+
+    Every accessor takes the sample rate it should work at; arrays come
+    back memory-mapped read-only. Audio is decoded and analysed in blocks
+    (see glitchstem.streaming), so memory use does not grow with the
+    length of the file.
+    """
+
+    def __init__(self, path, store=None):
+        self.path = path
+        self.store = store or FeatureStore()
+        self.key = params_digest("features-v2", file_digest(path))
+        self.entry_dir = self.store.entry_dir(self.key)
+        self.cached = os.path.isdir(self.entry_dir)
+        self._memo = {}
+        self._lock = threading.RLock()
+
+    def _path(self, name):
+        return os.path.join(self.entry_dir, f"{name}.npy")
+
+    def _tmp_path(self, name):
+        os.makedirs(self.entry_dir, exist_ok=True)
+        return os.path.join(self.entry_dir, f"{name}.{uuid.uuid4().hex}.tmp.npy")
+
+    def _load(self, name):
+        """Memoized memory-mapped feature, or None when it is not on disk yet"""
+        if name not in self._memo:
+            try:
+                self._memo[name] = np.load(self._path(name), mmap_mode="r")
+            except (OSError, ValueError):
+                return None
+        return self._memo[name]
+
+    def _commit(self, name, tmp):
+        """Move a finished feature file into place and account for it"""
+        os.replace(tmp, self._path(name))
+        self.store.touch(self.key)
+        self.store.prune(keep=self.key)
+
+    def _get(self, name, compute):
+        """Feature array by name: memo, then disk, then compute() and persist"""
+        with self._lock:
+            value = self._load(name)
+            if value is None:
+                tmp = self._tmp_path(name)
+                np.save(tmp, np.asarray(compute()))
+                self._commit(name, tmp)
+                value = self._load(name)
+            return value
+
+    def pcm_blocks(self, sr, block_seconds=DEFAULT_BLOCK_SECONDS):
+        """Yield mono float32 blocks at sr as soon as they are decoded.
+
+        The first full pass also writes them to the store, so later calls
+        (and pcm()) read the cached samples instead of decoding again. A
+        compressed file an ensemble already staged is read from its staged
+        WAV rather than decoded a second time.
+        """
+        name = f"pcm_{sr}"
+        cached = self._load(name)
+        if cached is not None:
+            block_frames = max(1, int(block_seconds * sr))
+            for start in range(0, len(cached), block_frames):
+                yield np.asarray(cached[start:start + block_frames])
+            return
+
+        tmp = self._tmp_path(name)
+        with NpyAppender(tmp) as out:
+            for block in stream_mono(find_staged(self.path) or self.path, sr, block_seconds):
+                out.append(block)
+                yield block
+        with self._lock:
+            self._commit(name, tmp)
+
+    def pcm(self, sr):
+        """Mono float32 samples at sr"""
+        with self._lock:
+            if self._load(f"pcm_{sr}") is None:
+                for _ in self.pcm_blocks(sr):
+                    pass
+            return self._load(f"pcm_{sr}")
+
+    def _spectrogram(self, sr, hop_length):
+        """(|STFT|, mel power), both (frames, bins), computed block by block"""
+        names = (f"stft_{sr}_{N_FFT}_{hop_length}", f"mel_{sr}_{hop_length}")
+        with self._lock:
+            if all(self._load(name) is not None for name in names):
+                return tuple(self._load(name) for name in names)
+
+            import librosa
+
+            tmps = [self._tmp_path(name) for name in names]
+            framer = FrameStream(N_FFT, hop_length)
+            with NpyAppender(tmps[0]) as stft, NpyAppender(tmps[1]) as mel:
+                def emit(segment):
+                    if segment is None:
+                        return
+                    magnitude = np.abs(librosa.stft(segment, n_fft=N_FFT, hop_length=hop_length, center=False))
+                    stft.append(magnitude.T)
+                    mel.append(librosa.feature.melspectrogram(S=magnitude ** 2, sr=sr).T)
+
+                for block in self.pcm_blocks(sr):
+                    emit(framer.push(block))
+                emit(framer.finish())
+            for name, tmp in zip(names, tmps):
+                self._commit(name, tmp)
+            return tuple(self._load(name) for name in names)
+
+    def stft_magnitude(self, sr, n_fft=N_FFT, hop_length=HOP_LENGTH):
+        """|STFT| of shape (1 + n_fft // 2, frames), float32"""
+        if n_fft != N_FFT:
+            raise ValueError(f"Only n_fft={N_FFT} is cached")
+        return self._spectrogram(sr, hop_length)[0].T
+
+    def onset_envelope(self, sr, hop_length=HOP_LENGTH):
+        """librosa onset strength (mean spectral flux of the dB mel spectrogram)"""
+        def compute():
+            mel = self._spectrogram(sr, hop_length)[1]
+            frames = len(mel)
+            # power_to_db(top_db=80) clips against the global peak
+            peak = max((float(mel[i:i + SPECTRAL_BLOCK].max()) for i in range(0, frames, SPECTRAL_BLOCK)),
+                       default=0.0)
+            floor = 10.0 * np.log10(max(1e-10, peak)) - 80.0
+
+            # onset_strength(center=True) shifts the flux by lag + n_fft // (2 * hop)
+            shift = 1 + N_FFT // (2 * hop_length)
+            envelope = np.zeros(frames, dtype=np.float32)
+            previous = None
+            for i in range(0, frames, SPECTRAL_BLOCK):
+                db = np.maximum(10.0 * np.log10(np.maximum(1e-10, mel[i:i + SPECTRAL_BLOCK].T)), floor)
+                block = db if previous is None else np.concatenate([previous, db], axis=1)
+                flux = np.maximum(0.0, block[:, 1:] - block[:, :-1]).mean(axis=0)
+                first = i if previous is None else i - 1   # frame index the flux starts from
+                dest = np.arange(first, first + len(flux)) + shift
+                keep = dest < frames
+                envelope[dest[keep]] = flux[keep]
+                previous = db[:, -1:]
+            return envelope
+        return self._get(f"onset_env_{sr}_{hop_length}", compute)
+
+    def onset_frames(self, sr, hop_length=HOP_LENGTH):
+        """Backtracked onset frames"""
+        def compute():
+            import librosa
+            return librosa.onset.onset_detect(onset_envelope=np.asarray(self.onset_envelope(sr, hop_length)),
+                                              sr=sr, hop_length=hop_length, backtrack=True)
+        return self._get(f"onsets_{sr}_{hop_length}", compute)
+
+    def _get_pair(self, names, compute):
+        """Two features produced by one computation, computed at most once"""
+        result = []
+        def part(i):
+            if not result:
+                result.extend(compute())
+            return result[i]
+        return tuple(self._get(name, lambda i=i: part(i)) for i, name in enumerate(names))
+
+    def _beats(self, sr, hop_length):
+        def compute():
+            import librosa
+            envelope = np.asarray(self.onset_envelope(sr, hop_length))
+            tempo = _tempo(envelope, sr, hop_length)
+            _, beats = librosa.beat.beat_track(onset_envelope=envelope, sr=sr, hop_length=hop_length, bpm=tempo)
+            return np.array([tempo]), np.asarray(beats)
+        return self._get_pair((f"tempo_{sr}_{hop_length}", f"beats_{sr}_{hop_length}"), compute)
+
+    def tempo(self, sr, hop_length=HOP_LENGTH):
+        """Estimated tempo in BPM"""
+        return float(self._beats(sr, hop_length)[0][0])
+
+    def beat_frames(self, sr, hop_length=HOP_LENGTH):
+        return self._beats(sr, hop_length)[1]
+
+    def band_energies(self, sr, hop_length=HOP_LENGTH):
+        """(kept, energies) of glitchstem.drums.band_energies at the onsets"""
+        from .drums import band_energies
+        return self._get_pair(
+            (f"band_kept_{sr}_{hop_length}", f"band_energies_{sr}_{hop_length}"),
+            lambda: band_energies(np.asarray(self.pcm(sr)), sr,
+                                  np.asarray(self.onset_frames(sr, hop_length)), hop_length))
+
+def _tempo(envelope, sr, hop_length, ac_size=8.0):
+    """librosa.feature.tempo(onset_envelope=...), averaging the tempogram block by block.
+
+    The full tempogram is (win_length x frames) and grows to gigabytes on
+    long files; its mean is all the static tempo estimate needs.
+    """
+    import librosa
+
+    win_length = librosa.time_to_frames(ac_size, sr=sr, hop_length=hop_length).item()
+    # Same centering as tempogram(center=True)
+    padded = np.pad(envelope, win_length // 2, mode="linear_ramp", end_values=[0, 0])
+    total = np.zeros(win_length)
+    for start in range(0, len(envelope), SPECTRAL_BLOCK):
+        stop = min(start + SPECTRAL_BLOCK, len(envelope))
+        tempogram = librosa.feature.tempogram(onset_envelope=padded[start:stop - 1 + win_length], sr=sr,
+                                              hop_length=hop_length, win_length=win_length, center=False)
+        total += tempogram.sum(axis=-1)
+    mean = (total / max(1, len(envelope)))[:, None]
+    return float(librosa.feature.tempo(tg=mean, sr=sr, hop_length=hop_length)[0])
@@ -0,0 +1,210 @@
+"""Silence gating: run a model only on the parts of its input that have signal.
+
+A de-reverb pass on a vocal stem, or a full separation of a sparse
+arrangement, spends much of its time on silence. Before such a pass, the
+input's frame RMS is computed block by block and thresholded into a map
+of active regions. Each region is padded by half the model's window, so
+the model sees the same context it would in a full run, and regions closer
+together than ``min_silence_seconds`` are merged.
+
+The padded regions are concatenated into one compact WAV and the model
+runs once on that. Its outputs are scattered back to the original sample
+offsets (as float32, see glitchstem.delivery) with silence in the gaps
+and a short fade at every region edge (the fades fall inside the padding,
+which is below the gate). Inputs with
+no active region skip the model entirely and get silent stems; inputs
+that are mostly active run unchanged, since splicing would save little.
+
+Only inputs at the model sample rate are gated (staged inputs and stems
+always are), so output offsets match input offsets exactly.
+"""
+import os
+
+import numpy as np
+
+from .audio_io import AudioReader, DEFAULT_BLOCK_FRAMES, open_writer
+from .delivery import INTERMEDIATE_SUBTYPE
+from .models import MODEL_DATABASE
+from .staging import MODEL_SAMPLE_RATE
+from .stems import model_stems, output_name
+
+DEFAULT_GATE_DB = -50.0
+FRAME_SECONDS = 0.05
+MIN_SILENCE_SECONDS = 4.0
+MIN_PAD_SECONDS = 0.5
+FADE_SECONDS = 0.05
+# Gating a mostly active input costs more in splicing than it saves
+MAX_ACTIVE_FRACTION = 0.9
+
+# Model window: MDXC/Roformer chunks are seg_size STFT hops, demucs uses fixed segments
+MDXC_HOP = 441
+DEMUCS_SEGMENT_SECONDS = 7.8
+
+SILENT_SUBTYPE = "PCM_16"
+GATE_FOLDER = "_gate"
+
+
+def frame_db(reader, frame_frames):
+    """RMS level per frame in dBFS (channels averaged), one value per frame_frames samples"""
+    frames_per_block = max(1, DEFAULT_BLOCK_FRAMES // frame_frames)
+    block_frames = frames_per_block * frame_frames
+    count = -(-reader.frames // frame_frames)
+    levels = []
+    for start in range(0, reader.frames, block_frames):
+        # read() zero-pads past the end, so the last frame is complete too
+        block = reader.read(start, start + block_frames)
+        power = np.square(block).mean(axis=1).reshape(-1, frame_frames).mean(axis=1)
+        levels.append(power)
+    if not levels:
+        return np.zeros(0, dtype=np.float32)
+    power = np.concatenate(levels)[:count]
+    return 10.0 * np.log10(np.maximum(power, 1e-12))
+
+def active_regions(levels, gate_db, pad_frames, min_gap_frames):
+    """[(start, stop)] frame ranges above gate_db, dilated by pad_frames, short gaps merged"""
+    active = levels > gate_db
+    if not active.any():
+        return []
+    # Dilate: a frame is kept when any frame within pad_frames of it is active
+    counts = np.cumsum(np.concatenate([[0], active.astype(np.int32)]))
+    index = np.arange(len(active))
+    lo = np.maximum(index - pad_frames, 0)
+    hi = np.minimum(index + pad_frames + 1, len(active))
+    kept = (counts[hi] - counts[lo]) > 0
+
+    edges = np.diff(np.concatenate([[0], kept.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    long_gaps = (starts[1:] - stops[:-1]) >= min_gap_frames
+    starts = np.concatenate([starts[:1], starts[1:][long_gaps]])
+    stops = np.concatenate([stops[:-1][long_gaps], stops[-1:]])
+    return list(zip(starts.tolist(), stops.tolist()))
+
+def model_window_seconds(model_filename, settings):
+    """Length of audio the model sees at once"""
+    if "htdemucs" in model_filename:
+        return DEMUCS_SEGMENT_SECONDS
+    return int(settings["seg_size"]) * MDXC_HOP / MODEL_SAMPLE_RATE
+
+
+class SilenceGate:
+    """Gates passes whose input has long stretches below ``gate_db`` dBFS.
+
+    ``rates`` remembers each model's load time and inference seconds per
+    second of audio from the passes it has seen, so skipped audio can be
+    reported as time saved.
+    """
+
+    def __init__(self, gate_db=DEFAULT_GATE_DB, min_silence_seconds=MIN_SILENCE_SECONDS):
+        self.gate_db = gate_db
+        self.min_silence_seconds = min_silence_seconds
+        self.rates = {}
+
+    def cache_params(self):
+        """Gated outputs differ slightly from full runs, so they are cached separately"""
+        return {"gate_db": self.gate_db, "gate_min_silence": self.min_silence_seconds}
+
+    def regions(self, reader, pad_seconds):
+        """[(start, stop)] sample ranges to run the model on"""
+        frame_frames = int(FRAME_SECONDS * reader.samplerate)
+        pad_frames = -(-int(pad_seconds * reader.samplerate) // frame_frames)
+        min_gap_frames = int(self.min_silence_seconds / FRAME_SECONDS)
+        levels = frame_db(reader, frame_frames)
+        return [(start * frame_frames, min(stop * frame_frames, reader.frames))
+                for start, stop in active_regions(levels, self.gate_db, pad_frames, min_gap_frames)]
+
+    def run(self, engine, model_name, input_file, output_dir, record):
+        """Run model_name on the active regions of input_file; True on success"""
+        model_filename = MODEL_DATABASE[model_name]["file"]
+        pad_seconds = max(MIN_PAD_SECONDS, model_window_seconds(model_filename, engine.model_settings(model_name)) / 2)
+        with AudioReader(input_file) as reader:
+            if reader.samplerate != MODEL_SAMPLE_RATE or not reader.frames:
+                return self.run_full(engine, model_name, input_file, output_dir, record)
+            regions = self.regions(reader, pad_seconds)
+            total = reader.frames
+            active = sum(stop - start for start, stop in regions)
+            if active > MAX_ACTIVE_FRACTION * total:
+                return self.run_full(engine, model_name, input_file, output_dir, record)
+
+            sr = reader.samplerate
+            gate = {"gate_db": self.gate_db, "regions": len(regions), "skipped_fraction": 1.0 - active / total,
+                    "skipped_seconds": (total - active) / sr}
+            record["gate"] = gate
+            base_name = os.path.splitext(os.path.basename(input_file))[0]
+            if not regions:
+                self.write_silence(output_dir, base_name, model_filename, total, reader.channels)
+                rate = self.rates.get(model_name)
+                gate["saved_seconds"] = rate[0] + rate[1] * total / sr if rate else None
+                saved = f", ~{gate['saved_seconds']:.1f}s saved" if rate else ""
+                engine.log(f">> Gate: {os.path.basename(input_file)} is silent below {self.gate_db:g} dBFS, "
+                           f"skipped {model_name}{saved}")
+                return True
+
+            scratch = engine.scratch_folder(output_dir, GATE_FOLDER)
+            try:
+                compact = os.path.join(scratch, base_name + ".wav")
+                with open_writer(compact, sr, reader.channels, "FLOAT") as writer:
+                    for start, stop in regions:
+                        for block_start in range(start, stop, DEFAULT_BLOCK_FRAMES):
+                            writer.write(reader.read(block_start, min(block_start + DEFAULT_BLOCK_FRAMES, stop)))
+
+                engine.log(f">> Gate: {model_name} on {len(regions)} active region(s), "
+                           f"{active / sr:.1f}s of {total / sr:.1f}s")
+                out_dir = os.path.join(scratch, "out")
+                success = engine.run_backend(model_name, compact, out_dir, record)
+                if success:
+                    for name in sorted(os.listdir(out_dir)):
+                        self.scatter(os.path.join(out_dir, name), os.path.join(output_dir, name), regions, total)
+            finally:
+                engine.remove_scratch(scratch)
+
+        inference = record.get("inference_seconds")
+        if success and inference:
+            self.rates[model_name] = (record.get("load_seconds") or 0.0, inference / (active / sr))
+            gate["saved_seconds"] = inference * (total - active) / active
+        else:
+            gate["saved_seconds"] = None
+        saved = f", ~{gate['saved_seconds']:.1f}s saved" if gate["saved_seconds"] is not None else ""
+        engine.log(f">> Gate: skipped {gate['skipped_fraction']:.0%} of {os.path.basename(input_file)} "
+                   f"({gate['skipped_seconds']:.1f}s){saved}")
+        return success
+
+    def run_full(self, engine, model_name, input_file, output_dir, record):
+        """Ungated pass; its timings still feed the time-saved estimates"""
+        success = engine.run_backend(model_name, input_file, output_dir, record)
+        seconds = record.get("input_seconds")
+        if success and record.get("inference_seconds") and seconds:
+            self.rates[model_name] = (record.get("load_seconds") or 0.0, record["inference_seconds"] / seconds)
+        return success
+
+    def scatter(self, compact_path, path, regions, total):
+        """Write a compact output back at the regions' original offsets, silence between them"""
+        with AudioReader(compact_path) as compact:
+            fade_frames = int(FADE_SECONDS * compact.samplerate)
+            ramp = np.linspace(0.0, 1.0, fade_frames + 2, dtype=np.float32)[1:-1, None]
+            with open_writer(path, compact.samplerate, compact.channels, INTERMEDIATE_SUBTYPE) as writer:
+                position = offset = 0
+                for start, stop in regions:
+                    self._write_silence(writer, start - position, compact.channels)
+                    audio = compact.read(offset, offset + stop - start)
+                    n = min(fade_frames, len(audio))
+                    if start > 0:
+                        audio[:n] *= ramp[:n]
+                    if stop < total:
+                        audio[len(audio) - n:] *= ramp[:n][::-1]
+                    writer.write(audio)
+                    position, offset = stop, offset + stop - start
+                self._write_silence(writer, total - position, compact.channels)
+
+    @staticmethod
+    def _write_silence(writer, frames, channels):
+        for start in range(0, frames, DEFAULT_BLOCK_FRAMES):
+            writer.write(np.zeros((min(DEFAULT_BLOCK_FRAMES, frames - start), channels), dtype=np.float32))
+
+    def write_silence(self, output_dir, base_name, model_filename, frames, channels):
+        """The stems the model would have written, all silent"""
+        os.makedirs(output_dir, exist_ok=True)
+        for stem in model_stems(model_filename):
+            path = os.path.join(output_dir, output_name(base_name, stem, model_filename))
+            with open_writer(path, MODEL_SAMPLE_RATE, max(2, channels), SILENT_SUBTYPE) as writer:
+                self._write_silence(writer, frames, max(2, channels))
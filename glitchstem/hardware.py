@@ -0,0 +1,106 @@
+"""GPU detection and hardware preset recommendation"""
+import json
+import os
+import platform
+import subprocess
+import time
+import uuid
+
+from .paths import app_path
+
+# CREATE_NO_WINDOW only exists on Windows; 0 is a no-op everywhere else
+CREATE_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+# Last probe result; importing torch / running nvidia-smi costs seconds at startup
+HARDWARE_CACHE = app_path("hardware.json")
+HARDWARE_CACHE_MAX_AGE = 7 * 24 * 3600
+
+
+def detect_gpu_info():
+    """Detect NVIDIA GPU and VRAM size"""
+    gpu_info = {"name": None, "vram_gb": 0, "cuda_available": False}
+
+    # Try PyTorch first (most reliable if available)
+    try:
+        import torch
+        if torch.cuda.is_available():
+            gpu_info["cuda_available"] = True
+            gpu_info["name"] = torch.cuda.get_device_name(0)
+            gpu_info["vram_gb"] = torch.cuda.get_device_properties(0).total_memory / (1024**3)
+            return gpu_info
+    except:
+        pass
+
+    # Fallback: nvidia-smi
+    try:
+        result = subprocess.run(
+            ["nvidia-smi", "--query-gpu=name,memory.total", "--format=csv,noheader,nounits"],
+            capture_output=True, text=True, creationflags=CREATE_NO_WINDOW
+        )
+        if result.returncode == 0:
+            parts = result.stdout.strip().split(", ")
+            if len(parts) >= 2:
+                gpu_info["name"] = parts[0]
+                gpu_info["vram_gb"] = float(parts[1]) / 1024  # MB to GB
+                gpu_info["cuda_available"] = True
+    except:
+        pass
+
+    return gpu_info
+
+def cached_gpu_info(refresh=False, path=HARDWARE_CACHE):
+    """detect_gpu_info(), reusing the result saved on this machine for up to a week"""
+    host = platform.node()
+    if not refresh:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved["host"] == host and time.time() - saved["detected_at"] < HARDWARE_CACHE_MAX_AGE:
+                return saved["gpu_info"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    gpu_info = detect_gpu_info()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"host": host, "detected_at": time.time(), "gpu_info": gpu_info}, f, indent=2)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return gpu_info
+
+def hardware_profile(gpu_info=None):
+    """What inference speed and memory limits depend on: GPU, VRAM, CPU cores, RAM"""
+    from .memory import GB, total_ram_bytes
+
+    gpu_info = gpu_info or cached_gpu_info()
+    cuda = bool(gpu_info.get("cuda_available"))
+    return {
+        "gpu": gpu_info.get("name") if cuda else None,
+        "vram_gb": round(gpu_info.get("vram_gb") or 0, 1) if cuda else 0,
+        "cpu_cores": os.cpu_count() or 1,
+        "ram_gb": round(total_ram_bytes() / GB),
+        "machine": platform.machine(),
+    }
+
+def hardware_fingerprint(profile=None):
+    """Short stable id of a hardware_profile()"""
+    from .hashing import params_digest
+    return params_digest("hardware-v1", profile or hardware_profile())[:16]
+
+def get_recommended_preset(vram_gb):
+    """Get recommended preset based on VRAM"""
+    if vram_gb <= 0:
+        return "CPU Only (No GPU)"
+    elif vram_gb < 5:
+        return "Laptop / Low VRAM (2-4GB)"
+    elif vram_gb < 9:
+        return "Mid-Range (6-8GB VRAM)"
+    elif vram_gb < 14:
+        return "High-End (10-12GB VRAM)"
+    elif vram_gb < 22:
+        return "Enthusiast (16-24GB VRAM)"
+    else:
+        return "🔥 GOD MODE (24GB+ VRAM)"
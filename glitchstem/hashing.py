@@ -0,0 +1,70 @@
+"""Content hashing for cache keys"""
+import hashlib
+import json
+import os
+import threading
+
+from .audio_io import _wav_layout
+
+CHUNK_SIZE = 1024 * 1024
+
+# (path, size, mtime_ns) -> digest, so every pass of an ensemble hashes the input once
+_digest_memo = {}
+_memo_lock = threading.Lock()
+
+
+def _hash_range(h, f, remaining=None):
+    while remaining is None or remaining > 0:
+        chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        h.update(chunk)
+        if remaining is not None:
+            remaining -= len(chunk)
+
+def _memoized(kind, path, compute):
+    """compute(path), memoized while the file's size and mtime are unchanged"""
+    st = os.stat(path)
+    memo_key = (kind, os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _memo_lock:
+        digest = _digest_memo.get(memo_key)
+    if digest:
+        return digest
+    digest = compute(path)
+    with _memo_lock:
+        _digest_memo[memo_key] = digest
+    return digest
+
+def _file_bytes_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        _hash_range(h, f)
+    return h.hexdigest()
+
+def _audio_content_digest(path):
+    layout = _wav_layout(path) if path.lower().endswith(".wav") else None
+    if layout is None:
+        return _file_bytes_digest(path)
+    *fmt, offset, data_bytes = layout
+    h = hashlib.sha256(f"wav-data:{':'.join(map(str, fmt))}".encode("ascii"))
+    with open(path, "rb") as f:
+        f.seek(offset)
+        _hash_range(h, f, data_bytes)
+    return h.hexdigest()
+
+def file_digest(path):
+    """SHA-256 of a file's bytes (memoized while size and mtime are unchanged)"""
+    return _memoized("file", path, _file_bytes_digest)
+
+def audio_digest(path):
+    """Digest of a WAV's format and sample data only, else file_digest.
+
+    libsndfile stamps float WAVs with a PEAK chunk holding the write time,
+    so the same audio written twice differs in its header bytes.
+    """
+    return _memoized("audio", path, _audio_content_digest)
+
+def params_digest(*parts):
+    """Stable SHA-256 of JSON-serializable key parts"""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
@@ -0,0 +1,64 @@
+"""Log queue between worker threads and a UI loop.
+
+Workers call ``push``, a bare deque append: no lock, no UI calls. The UI
+calls ``drain`` a few dozen times a second and gets the pending lines back
+with progress-bar redraws (tqdm) collapsed to the latest state of each bar.
+The queue is bounded, so a stalled UI drops the oldest lines instead of
+growing without limit.
+"""
+import collections
+import re
+
+# tqdm bars, e.g. " 50%|#####     | 5/10 [00:01<00:01,  4.00it/s]"
+PROGRESS_RE = re.compile(r"(\d{1,3})%\|")
+
+MAX_PENDING = 10000
+
+
+def progress_key(line):
+    """What identifies a progress bar line (the text in front of the bar), or None"""
+    match = PROGRESS_RE.search(line)
+    return line[:match.start()].rstrip() if match else None
+
+class LogPump:
+    def __init__(self, max_pending=MAX_PENDING):
+        self._pending = collections.deque(maxlen=max_pending)
+        self.dropped = 0
+
+    def push(self, message):
+        """Queue a message (may hold several lines); safe from any thread"""
+        for line in message.split("\n"):
+            # A carriage return redraws the line: only its last state matters
+            if "\r" in line:
+                line = next((part for part in reversed(line.split("\r")) if part.strip()), "")
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(line)
+
+    def drain(self, limit=None):
+        """[(line, progress_key)] queued so far (at most limit), progress updates collapsed.
+
+        A progress line replaces the earlier line of the same bar as long as
+        only other progress lines came in between (parallel passes interleave
+        their bars).
+        """
+        lines = []
+        tail = {}   # bar key -> index, for the trailing run of progress lines
+        if self.dropped:
+            lines.append((f"... {self.dropped} log lines dropped ...", None))
+            self.dropped = 0
+        while self._pending and (limit is None or len(lines) < limit):
+            try:
+                line = self._pending.popleft()
+            except IndexError:
+                break
+            key = progress_key(line)
+            if key is None:
+                tail.clear()
+                lines.append((line, None))
+            elif key in tail:
+                lines[tail[key]] = (line, key)
+            else:
+                tail[key] = len(lines)
+                lines.append((line, key))
+        return lines
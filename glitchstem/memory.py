@@ -0,0 +1,269 @@
+"""Host / device memory probes, per-pass estimates and the admission budget"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+GB = 1024 ** 3
+MB = 1024 ** 2
+
+# audio-separator's own default download folder
+DEFAULT_MODEL_DIR = "/tmp/audio-separator-models/"
+
+# Used when a checkpoint has not been downloaded yet
+UNKNOWN_CHECKPOINT_BYTES = 500 * MB
+
+
+def total_ram_bytes():
+    """Physical RAM in bytes (0 if it cannot be determined)"""
+    try:
+        import psutil
+        return psutil.virtual_memory().total
+    except ImportError:
+        pass
+
+    if sys.platform == "win32":
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys
+        return 0
+
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+def process_rss_bytes(pid=None):
+    """Resident set size of a process (default: this one) in bytes (0 if unknown)"""
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        # Process already gone
+        return 0
+
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def process_tree(pid):
+    """pid plus all of its descendants (just pid if they cannot be listed)"""
+    try:
+        import psutil
+        return [pid] + [child.pid for child in psutil.Process(pid).children(recursive=True)]
+    except ImportError:
+        pass
+    except Exception:
+        # Process already gone
+        return [pid]
+
+    # No psutil: walk /proc's parent links (Linux only)
+    try:
+        parents = {}
+        for name in os.listdir("/proc"):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{name}/stat") as f:
+                    # The command name may contain spaces; fields resume after its ")"
+                    parents.setdefault(int(f.read().rsplit(")", 1)[1].split()[1]), []).append(int(name))
+            except (OSError, ValueError, IndexError):
+                continue
+    except OSError:
+        return [pid]
+    tree, queue = [], [pid]
+    while queue:
+        current = queue.pop()
+        tree.append(current)
+        queue.extend(parents.get(current, []))
+    return tree
+
+def process_tree_rss_bytes(pid):
+    """Resident set size of pid and its descendants in bytes (0 if unknown).
+
+    Console-script launchers (Windows ``audio-separator.exe``) do the work
+    in a child process, so the launcher's own RSS alone is meaningless.
+    """
+    return sum(process_rss_bytes(p) for p in process_tree(pid))
+
+def peak_rss_bytes():
+    """Highest resident set size this process has reached (0 if unknown)"""
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        # Windows reports the peak working set directly
+        if hasattr(info, "peak_wset"):
+            return info.peak_wset
+    except ImportError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return 0
+
+def process_vram_bytes(pids):
+    """GPU memory nvidia-smi reports for a pid or list of pids (0 without NVIDIA or if unknown,
+    e.g. "[N/A]" under Windows WDDM)"""
+    import subprocess
+    from .hardware import CREATE_NO_WINDOW
+
+    try:
+        result = subprocess.run(
+            ["nvidia-smi", "--query-compute-apps=pid,used_memory", "--format=csv,noheader,nounits"],
+            capture_output=True, text=True, timeout=5, creationflags=CREATE_NO_WINDOW
+        )
+    except (OSError, subprocess.SubprocessError):
+        return 0
+    wanted = {str(p) for p in (pids if isinstance(pids, (list, tuple, set)) else [pids])}
+    total = 0
+    for line in result.stdout.splitlines():
+        parts = [p.strip() for p in line.split(",")]
+        if len(parts) >= 2 and parts[0] in wanted:
+            try:
+                total += int(float(parts[1]) * MB)
+            except ValueError:
+                pass
+    return total
+
+def cuda_allocated_bytes():
+    """Bytes currently held by the torch CUDA allocator (0 without CUDA)"""
+    torch = sys.modules.get("torch")
+    try:
+        if torch is not None and torch.cuda.is_available():
+            return torch.cuda.memory_allocated()
+    except Exception:
+        pass
+    return 0
+
+def checkpoint_bytes(model_filename, model_dir=DEFAULT_MODEL_DIR):
+    """On-disk size of a model checkpoint, or a conservative guess"""
+    path = os.path.join(model_dir, model_filename)
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return UNKNOWN_CHECKPOINT_BYTES
+
+def default_model_budget(gpu_info=None):
+    """Default budget for resident models: VRAM minus headroom, else half the RAM"""
+    if gpu_info is None:
+        from .hardware import cached_gpu_info
+        gpu_info = cached_gpu_info()
+    if gpu_info and gpu_info.get("cuda_available") and gpu_info.get("vram_gb"):
+        return int(gpu_info["vram_gb"] * GB * 0.6)
+    return int(total_ram_bytes() * 0.5) or 4 * GB
+
+class PeakSampler:
+    """Polls another process's RSS (and optionally its VRAM) until stopped, keeping the peaks.
+
+    Both are summed over the process and its descendants. A peak of 0 means
+    it could not be measured, not that nothing was used. Use as
+    ``with PeakSampler(pid) as sampler:`` around the process's run.
+    """
+
+    RAM_INTERVAL = 0.2
+    VRAM_INTERVAL = 1.0
+
+    def __init__(self, pid, vram=False):
+        self.pid = pid
+        self.vram = vram
+        self.peak_ram = 0
+        self.peak_vram = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        next_vram = 0.0
+        while not self._stop.is_set():
+            self.peak_ram = max(self.peak_ram, process_tree_rss_bytes(self.pid))
+            if self.vram and time.perf_counter() >= next_vram:
+                self.peak_vram = max(self.peak_vram, process_vram_bytes(process_tree(self.pid)))
+                next_vram = time.perf_counter() + self.VRAM_INTERVAL
+            self._stop.wait(self.RAM_INTERVAL)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+# Per-pass peak estimate: weights + runtime copies + activations that grow with
+# seg_size x batch_size (1 MB per unit puts God Mode's 2048 x 8 at ~16 GB)
+WEIGHT_OVERHEAD = 2.0
+ACTIVATION_BYTES_PER_UNIT = 1 * MB
+PASS_BASE_BYTES = 512 * MB
+DEMUCS_PASS_BYTES = 3 * GB
+
+
+def estimate_pass_bytes(model_filename, settings, model_dir=DEFAULT_MODEL_DIR):
+    """Rough peak memory of one separation pass"""
+    if "htdemucs" in model_filename:
+        return DEMUCS_PASS_BYTES
+    weights = checkpoint_bytes(model_filename, model_dir) * WEIGHT_OVERHEAD
+    activations = int(settings["seg_size"]) * int(settings["batch_size"]) * ACTIVATION_BYTES_PER_UNIT
+    return int(PASS_BASE_BYTES + weights + activations)
+
+def default_pass_budget(gpu_info=None):
+    """Memory concurrent passes may share: most of the VRAM, else most of the RAM"""
+    if gpu_info is None:
+        from .hardware import cached_gpu_info
+        gpu_info = cached_gpu_info()
+    if gpu_info and gpu_info.get("cuda_available") and gpu_info.get("vram_gb"):
+        return int(gpu_info["vram_gb"] * GB * 0.9)
+    return int(total_ram_bytes() * 0.7) or 8 * GB
+
+
+class MemoryBudget:
+    """Admission gate for concurrent work sharing one memory pool.
+
+    ``reserve(nbytes)`` blocks until the reservation fits next to what is
+    already running. A job bigger than the whole budget is still admitted
+    once nothing else is running, so oversized passes run alone rather than
+    never.
+    """
+
+    def __init__(self, total_bytes):
+        self.total_bytes = total_bytes
+        self.in_use = 0
+        self.running = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, nbytes):
+        with self._cond:
+            while self.running and self.in_use + nbytes > self.total_bytes:
+                self._cond.wait()
+            self.in_use += nbytes
+            self.running += 1
+
+    def release(self, nbytes):
+        with self._cond:
+            self.in_use -= nbytes
+            self.running -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, nbytes):
+        self.acquire(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
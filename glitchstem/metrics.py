@@ -0,0 +1,140 @@
+"""Structured run metrics and separator progress parsing.
+
+Engines and extractors hand plain dict records to a ``metrics`` callback:
+
+- ``{"type": "progress"}``: percent and ETA of a running pass, parsed from
+  the separator's tqdm output (sent whenever the percentage changes)
+- ``{"type": "pass"}``: one per separator run: timings, peak RSS, status
+- ``{"type": "job"}``: one per separation workflow or MIDI extraction
+
+``MetricsWriter`` appends them to a file as JSON lines, one object per line.
+Every record has a ``time`` stamp; pass and progress records carry their
+job's ``job`` id.
+
+Pass timings for the subprocess backend come from when the separator's
+output lines arrive. Model loading ends at its "Load model duration" line,
+inference runs from the first progress bar update to the last one,
+everything between the two is decoding and preparing the mix, and the time
+after the last update is writing the stems.
+"""
+import json
+import re
+import sys
+import threading
+import time
+
+# " 45%|####5     | 9/20 [00:12<00:15,  1.38s/it]"
+TQDM_RE = re.compile(r"(\d{1,3})%\|[^|]*\|\s*(\d+)/(\d+)\s*\[([\d:]+)<([\d:?]+)")
+PERCENT_RE = re.compile(r"(\d{1,3})%\|")
+LOAD_RE = re.compile(r"Load model duration:\s*([\d:]+)")
+
+
+def parse_clock(text):
+    """Seconds in a tqdm/strftime clock ("02:15", "1:02:15"), or None for "?" """
+    try:
+        seconds = 0
+        for part in text.split(":"):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    except ValueError:
+        return None
+
+def parse_progress(line):
+    """{"percent", "done", "total", "elapsed_seconds", "eta_seconds"} from a tqdm line, or None"""
+    match = TQDM_RE.search(line)
+    if match:
+        percent, done, total, elapsed, eta = match.groups()
+        return {"percent": int(percent), "done": int(done), "total": int(total),
+                "elapsed_seconds": parse_clock(elapsed), "eta_seconds": parse_clock(eta)}
+    match = PERCENT_RE.search(line)
+    if match:
+        return {"percent": int(match.group(1)), "done": None, "total": None,
+                "elapsed_seconds": None, "eta_seconds": None}
+    return None
+
+def audio_seconds(path):
+    """Duration of an audio file, or None if soundfile cannot read its header"""
+    try:
+        import soundfile as sf
+        info = sf.info(path)
+        return info.frames / info.samplerate
+    except Exception:
+        return None
+
+def realtime_factor(audio_secs, seconds):
+    """Seconds of audio processed per second of wall time"""
+    if not audio_secs or not seconds:
+        return None
+    return audio_secs / seconds
+
+class PassTimer:
+    """Phase timings of one separator run, from its output lines"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.loaded_at = None
+        self.load_seconds = None
+        self.first_progress = None
+        self.last_progress = None
+        self.percent = None
+
+    def feed(self, line):
+        """Note one output line; returns parse_progress() when the percentage moved, else None"""
+        now = time.perf_counter()
+        match = LOAD_RE.search(line)
+        if match:
+            self.loaded_at = now
+            self.load_seconds = parse_clock(match.group(1))
+            return None
+        progress = parse_progress(line)
+        if progress is None:
+            return None
+        if self.first_progress is None:
+            self.first_progress = now
+        self.last_progress = now
+        if progress["percent"] == self.percent:
+            return None
+        self.percent = progress["percent"]
+        if progress["eta_seconds"] is None and progress["elapsed_seconds"] and progress["percent"]:
+            progress["eta_seconds"] = progress["elapsed_seconds"] * (100 - progress["percent"]) / progress["percent"]
+        return progress
+
+    def phases(self, end=None):
+        """{"startup_seconds", "load_seconds", "decode_seconds", "inference_seconds", "write_seconds"}"""
+        end = end or time.perf_counter()
+        phases = {"startup_seconds": None, "load_seconds": self.load_seconds, "decode_seconds": None,
+                  "inference_seconds": None, "write_seconds": None}
+        if self.loaded_at is not None:
+            phases["startup_seconds"] = max(0.0, self.loaded_at - self.start - (self.load_seconds or 0))
+        if self.first_progress is not None:
+            phases["inference_seconds"] = self.last_progress - self.first_progress
+            phases["write_seconds"] = end - self.last_progress
+            phases["decode_seconds"] = self.first_progress - (self.loaded_at or self.start)
+        return phases
+
+class MetricsWriter:
+    """Metrics callback appending records to a JSON-lines file ("-" for stdout).
+
+    Each record is one write() on a file opened for appending, so several
+    batch worker processes can share one file.
+    """
+
+    def __init__(self, path, progress=True):
+        self.path = path
+        self.progress = progress
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        if record.get("type") == "progress" and not self.progress:
+            return
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self.path == "-":
+                sys.stdout.write(line)
+                sys.stdout.flush()
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError:
+                pass
@@ -0,0 +1,158 @@
+"""Folder-level MIDI extraction: route every stem to the drum or melodic transcriber.
+
+Drum stems (by stem tag, or "drum" in the filename when there is no tag)
+go to a process pool, since onset analysis is CPU-bound librosa work.
+Everything else is decoded on a few threads and fed to a small pool of
+warm piano transcription models. Residual mixes such as "(No Vocals)" are
+skipped.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from .batch import collect_inputs
+from .memory import peak_rss_bytes
+from .metrics import audio_seconds, realtime_factor
+from .stems import stem_tag
+from .tracing import span, trace_run
+
+DRUM_TAGS = {"drums", "drum", "kick", "snare", "toms", "tom", "hh", "hihat", "hi-hat",
+             "cymbals", "ride", "crash", "percussion"}
+
+# Suffixes the single-file extractors already use
+DRUM_SUFFIX = "_drums.mid"
+MELODIC_SUFFIX = "_transcribed.mid"
+
+
+def route_stem(path):
+    """"drums", "melodic" or None (skip) for one stem file"""
+    tag = stem_tag(path)
+    if tag is None:
+        return "drums" if "drum" in os.path.basename(path).lower() else "melodic"
+    if tag.startswith("no "):
+        return None
+    return "drums" if tag in DRUM_TAGS else "melodic"
+
+def midi_output_path(path, kind, output_dir=None):
+    """MIDI file next to the stem (or in output_dir), named like the single-file tools"""
+    name = os.path.splitext(os.path.basename(path))[0]
+    suffix = DRUM_SUFFIX if kind == "drums" else MELODIC_SUFFIX
+    return os.path.join(output_dir or os.path.dirname(path), name + suffix)
+
+def job_record(path, kind, output, start, **fields):
+    """Metrics job record (see glitchstem.metrics) for one finished extraction"""
+    seconds = time.perf_counter() - start
+    input_seconds = audio_seconds(path)
+    record = {"type": "job", "workflow": f"midi-{kind}", "input": path, "kind": kind, "output": output,
+              "status": "ok", "success": True, "error": None, "seconds": seconds,
+              "input_seconds": input_seconds, "realtime": realtime_factor(input_seconds, seconds),
+              "peak_rss_bytes": peak_rss_bytes()}
+    record.update(fields)
+    return record
+
+def drum_job(path, midi_output, feature_dir=None):
+    """Process-pool worker: one drum stem to MIDI"""
+    from .drums import DRUM_SAMPLE_RATE, count_hits, transcribe_drums, write_drum_midi
+    from .features import FeatureStore
+
+    start = time.perf_counter()
+    with trace_run(f"midi-drums {os.path.basename(path)}"):
+        store = FeatureStore(feature_dir) if feature_dir else FeatureStore()
+        features = store.features(path)
+        with span("drums.decode"):
+            features.pcm(DRUM_SAMPLE_RATE)
+        decoded = time.perf_counter()
+        drum_hits, tempo = transcribe_drums(features)
+        analysed = time.perf_counter()
+        with span("drums.write_midi", hits=len(drum_hits)):
+            write_drum_midi(drum_hits, midi_output, bpm=tempo)
+    return job_record(path, "drums", midi_output, start, hits=len(drum_hits), counts=count_hits(drum_hits),
+                      tempo=tempo, cached=features.cached, decode_seconds=decoded - start,
+                      inference_seconds=analysed - decoded, write_seconds=time.perf_counter() - analysed)
+
+def melodic_job(path, midi_output, pool, store):
+    """Thread worker: stream 16 kHz chunks from here to the least busy warm models"""
+    from .transcription import PIANO_SAMPLE_RATE, transcribe_stream
+
+    start = time.perf_counter()
+    with trace_run(f"midi-melodic {os.path.basename(path)}"):
+        result = transcribe_stream(pool, store.features(path).pcm_blocks(PIANO_SAMPLE_RATE), midi_output)
+    load_seconds = [s["load_seconds"] for s in pool.stats()] if hasattr(pool, "engines") else [pool.load_seconds]
+    return job_record(path, "melodic", midi_output, start, notes=result["notes"], chunks=result["chunks"],
+                      load_seconds=max([s for s in load_seconds if s is not None], default=None),
+                      decode_seconds=result["decode_seconds"], inference_seconds=result["seconds"],
+                      write_seconds=result["write_seconds"])
+
+def plan_midi_batch(source, recursive=False, only=None):
+    """[(path, kind)] for the stems under source, skipping ones that get no MIDI"""
+    plan = []
+    for job in collect_inputs(source, recursive):
+        kind = route_stem(job["input"])
+        if kind and (only is None or kind == only):
+            plan.append((job["input"], kind))
+    return plan
+
+def run_midi_batch(plan, output_dir=None, drum_workers=None, melodic_models=1, log=print, metrics=None):
+    """Transcribe every (path, kind) in plan; returns per-file job records in plan order.
+
+    ``metrics`` (optional) receives each record as it finishes.
+    """
+    from .features import FeatureStore
+    from .transcription import TranscriptionPool, transcription_available
+
+    if not plan:
+        log(">> No stems to transcribe")
+        return []
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    drums = [i for i, (_, kind) in enumerate(plan) if kind == "drums"]
+    melodic = [i for i, (_, kind) in enumerate(plan) if kind == "melodic"]
+    drum_workers = max(1, min(drum_workers or max(1, (os.cpu_count() or 2) // 2), len(drums) or 1))
+    log(f">> MIDI batch: {len(drums)} drum stem(s) on {drum_workers} process(es), "
+        f"{len(melodic)} melodic stem(s) on {melodic_models} warm model(s)")
+
+    results = [None] * len(plan)
+    if melodic and not transcription_available():
+        log(f">> WARNING: piano_transcription_inference not available, skipping {len(melodic)} melodic stem(s)")
+        for i in melodic:
+            results[i] = {"type": "job", "workflow": "midi-melodic", "input": plan[i][0], "kind": "melodic",
+                          "output": None, "status": "skipped", "success": False,
+                          "error": "piano_transcription_inference not available", "seconds": 0.0}
+        melodic = []
+
+    start = time.perf_counter()
+    futures = {}
+    with ProcessPoolExecutor(max_workers=drum_workers) as procs, \
+            ThreadPoolExecutor(max_workers=max(1, melodic_models) + 1) as threads:
+        for i in drums:
+            path = plan[i][0]
+            futures[procs.submit(drum_job, path, midi_output_path(path, "drums", output_dir))] = i
+        if melodic:
+            pool = TranscriptionPool(melodic_models, log=log)
+            store = FeatureStore()
+            for i in melodic:
+                path = plan[i][0]
+                futures[threads.submit(melodic_job, path, midi_output_path(path, "melodic", output_dir),
+                                       pool, store)] = i
+
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            path, kind = plan[i]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = {"type": "job", "workflow": f"midi-{kind}", "input": path, "kind": kind,
+                              "output": None, "status": "failed", "success": False, "error": str(e),
+                              "seconds": 0.0}
+            status = "OK" if results[i]["success"] else f"FAILED ({results[i]['error']})"
+            log(f">> [{done}/{len(futures)}] {kind}: {os.path.basename(path)} {status}")
+            if metrics is not None:
+                metrics(dict(results[i], time=time.time()))
+
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for r in results if r["success"])
+    rate = ok / elapsed * 60 if elapsed > 0 else 0.0
+    log(f"\n>> MIDI BATCH COMPLETE: {ok} ok, {len(plan) - ok} failed in {elapsed:.1f}s "
+        f"({rate:.1f} files/min)")
+    return results
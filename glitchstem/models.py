@@ -0,0 +1,316 @@
+"""Model, hardware and ensemble tables shared by the GUI and the headless engine"""
+
+# Model database with descriptions and filenames
+MODEL_DATABASE = {
+    # === 🆕 CUTTING EDGE (2025) ===
+    "BS-Roformer-SW-6stem": {
+        "file": "BS-Roformer-SW.ckpt",
+        "desc": "🆕 6-stem (vocals/bass/drums/guitar/piano/other) - jarredou",
+        "category": "multi-stem"
+    },
+    "BS-Roformer-MaleFemale": {
+        "file": "model_chorus_bs_roformer_ep_267_sdr_24.1275.ckpt",
+        "desc": "🆕 Split vocals into Male/Female (SDR 24.1) - Sucial",
+        "category": "vocals"
+    },
+    "BS-Roformer-VocalsRevive-V3": {
+        "file": "bs_roformer_vocals_revive_v3e_unwa.ckpt",
+        "desc": "🆕 Enhance/restore degraded vocals - Unwa",
+        "category": "utility"
+    },
+    "BS-Roformer-InstResurrection": {
+        "file": "bs_roformer_instrumental_resurrection_unwa.ckpt",
+        "desc": "🆕 Restore/enhance instrumentals - Unwa",
+        "category": "utility"
+    },
+    # === VOCALS - TOP TIER ===
+    "MelBand-Kim-Vocals": {
+        "file": "vocals_mel_band_roformer.ckpt",
+        "desc": "Best vocal extraction (SDR 12.6) - Kimberley Jensen",
+        "category": "vocals"
+    },
+    "MelBand-BigBeta4": {
+        "file": "melband_roformer_big_beta4.ckpt",
+        "desc": "Top-tier vocals (SDR 12.5) - unwa fine-tune",
+        "category": "vocals"
+    },
+    "MelBand-BigBeta5e": {
+        "file": "melband_roformer_big_beta5e.ckpt",
+        "desc": "Excellent vocals (SDR 12.4) - unwa",
+        "category": "vocals"
+    },
+    "MelBand-Kim-FT-Unwa": {
+        "file": "mel_band_roformer_kim_ft_unwa.ckpt",
+        "desc": "Kim model fine-tuned (SDR 12.4) - unwa",
+        "category": "vocals"
+    },
+    "MelBand-BigSYHFT-V1": {
+        "file": "MelBandRoformerBigSYHFTV1.ckpt",
+        "desc": "Big SYHFT vocals (SDR 12.3) - SYH99999",
+        "category": "vocals"
+    },
+    "BS-Roformer-ViperX-1296": {
+        "file": "model_bs_roformer_ep_368_sdr_12.9628.ckpt",
+        "desc": "BS-Roformer vocals (SDR 12.1) - ViperX",
+        "category": "vocals"
+    },
+    "BS-Roformer-ViperX-1297": {
+        "file": "model_bs_roformer_ep_317_sdr_12.9755.ckpt",
+        "desc": "Classic BS-Roformer (SDR 11.8) - ViperX",
+        "category": "vocals"
+    },
+    # === INSTRUMENTAL - TOP TIER ===
+    "MelBand-Inst-V2": {
+        "file": "melband_roformer_inst_v2.ckpt",
+        "desc": "Best instrumental (SDR 16.1) - Unwa",
+        "category": "instrumental"
+    },
+    "MelBand-InstVoc-Duality-V2": {
+        "file": "melband_roformer_instvox_duality_v2.ckpt",
+        "desc": "Balanced vocal/inst (SDR 16.1/11.0) - Unwa",
+        "category": "instrumental"
+    },
+    "MelBand-Inst-Bleedless-V3": {
+        "file": "mel_band_roformer_instrumental_bleedless_v3_gabox.ckpt",
+        "desc": "Minimal vocal bleed instrumental - Gabox",
+        "category": "instrumental"
+    },
+    # === DRUMS - SEPARATION ===
+    "DrumSep-6way": {
+        "file": "MDX23C-DrumSep-aufr33-jarredou.ckpt",
+        "desc": "🥁 Splits drums: kick/snare/toms/hh/ride/crash - aufr33",
+        "category": "drums"
+    },
+    "BS-Roformer-DrumBass": {
+        "file": "model_bs_roformer_ep_937_sdr_10.5309.ckpt",
+        "desc": "Isolate drum+bass from mix (SDR 10.5) - ViperX",
+        "category": "drums"
+    },
+    "Kuielab-Drums-A": {
+        "file": "kuielab_a_drums.onnx",
+        "desc": "Extract drums from mix (SDR 7.0) - Kuielab",
+        "category": "drums"
+    },
+    "Kuielab-Drums-B": {
+        "file": "kuielab_b_drums.onnx",
+        "desc": "Extract drums from mix (SDR 7.1) - Kuielab",
+        "category": "drums"
+    },
+    # === MULTI-STEM ===
+    "HTDemucs-ft": {
+        "file": "htdemucs_ft.yaml",
+        "desc": "4-stem (vocals/drums/bass/other) - Meta",
+        "category": "multi-stem"
+    },
+    "HTDemucs-6s": {
+        "file": "htdemucs_6s.yaml",
+        "desc": "6-stem (+guitar/piano) - Meta",
+        "category": "multi-stem"
+    },
+    # === UTILITY / POST-PROCESSING ===
+    # De-Reverb models
+    "DeReverb-MelBand-Anvuew": {
+        "file": "dereverb_mel_band_roformer_anvuew_sdr_19.1729.ckpt",
+        "desc": "Remove reverb (SDR 19.2) - anvuew - BEST",
+        "category": "utility"
+    },
+    "DeReverb-SuperBig": {
+        "file": "dereverb_super_big_mbr_ep_346.ckpt",
+        "desc": "Heavy de-reverb (large model) - Sucial",
+        "category": "utility"
+    },
+    "DeReverb-Echo-V2": {
+        "file": "dereverb-echo_mel_band_roformer_sdr_13.4843_v2.ckpt",
+        "desc": "Remove reverb + echo combined - Sucial",
+        "category": "utility"
+    },
+    "DeReverb-BS-Roformer": {
+        "file": "deverb_bs_roformer_8_384dim_10depth.ckpt",
+        "desc": "BS-Roformer de-reverb variant",
+        "category": "utility"
+    },
+    # De-Noise models
+    "Denoise-MelBand": {
+        "file": "denoise_mel_band_roformer_aufr33_sdr_27.9959.ckpt",
+        "desc": "Noise removal (SDR 28.0) - aufr33 - BEST",
+        "category": "utility"
+    },
+    "Denoise-Aggressive": {
+        "file": "denoise_mel_band_roformer_aufr33_aggr_sdr_27.9768.ckpt",
+        "desc": "Aggressive noise removal - aufr33",
+        "category": "utility"
+    },
+    "Denoise-Debleed": {
+        "file": "mel_band_roformer_denoise_debleed_gabox.ckpt",
+        "desc": "Denoise + remove stem bleed - Gabox",
+        "category": "utility"
+    },
+    # Bleed suppression (removes vocal remnants from instrumentals)
+    "Bleed-Suppressor": {
+        "file": "mel_band_roformer_bleed_suppressor_v1.ckpt",
+        "desc": "Remove vocal bleed from instrumentals - unwa",
+        "category": "utility"
+    },
+    # Instrumental enhancement
+    "Inst-Fullness-V3": {
+        "file": "mel_band_roformer_instrumental_fullness_v3_gabox.ckpt",
+        "desc": "Enhance instrumental fullness/body - Gabox",
+        "category": "utility"
+    },
+}
+
+# Hardware presets for different PC configurations
+HARDWARE_PRESETS = {
+    "CPU Only (No GPU)": {
+        "desc": "For systems without NVIDIA GPU or CUDA support",
+        "requirements": "Any CPU, 8GB+ RAM, No GPU required",
+        "seg_size": 128,
+        "overlap": 4,
+        "batch_size": 1,
+        "notes": "Slowest but works on any system. Expect 5-10x longer processing times.",
+        "recommended_models": ["HTDemucs-ft", "Kuielab-Drums-A"]
+    },
+    "Laptop / Low VRAM (2-4GB)": {
+        "desc": "Entry-level NVIDIA GPUs (GTX 1050, 1650, MX series)",
+        "requirements": "NVIDIA GPU with 2-4GB VRAM, CUDA support",
+        "seg_size": 128,
+        "overlap": 4,
+        "batch_size": 1,
+        "notes": "Safe settings to avoid VRAM crashes. Avoid large models.",
+        "recommended_models": ["HTDemucs-ft", "Kuielab-Drums-A", "Kuielab-Drums-B"]
+    },
+    "Mid-Range (6-8GB VRAM)": {
+        "desc": "GTX 1060/1070/1080, RTX 2060/2070, RTX 3060",
+        "requirements": "NVIDIA GPU with 6-8GB VRAM",
+        "seg_size": 256,
+        "overlap": 8,
+        "batch_size": 2,
+        "notes": "Good balance of speed and quality. Most models work well.",
+        "recommended_models": ["MelBand-Kim-Vocals", "MelBand-Inst-V2", "HTDemucs-ft"]
+    },
+    "High-End (10-12GB VRAM)": {
+        "desc": "RTX 2080, RTX 3060 Ti/3070/3080, RTX 4070",
+        "requirements": "NVIDIA GPU with 10-12GB VRAM",
+        "seg_size": 512,
+        "overlap": 10,
+        "batch_size": 4,
+        "notes": "Fast processing with high quality. All models supported.",
+        "recommended_models": ["MelBand-BigBeta4", "BS-Roformer-SW-6stem", "DrumSep-6way"]
+    },
+    "Enthusiast (16-24GB VRAM)": {
+        "desc": "RTX 3090/3090 Ti, RTX 4080/4090, A5000/A6000",
+        "requirements": "NVIDIA GPU with 16-24GB VRAM",
+        "seg_size": 1024,
+        "overlap": 12,
+        "batch_size": 6,
+        "notes": "High quality settings. Can run multiple models in ensemble.",
+        "recommended_models": ["All models supported", "Ensemble workflows recommended"]
+    },
+    "🔥 GOD MODE (24GB+ VRAM)": {
+        "desc": "Maximum quality - RTX 3090 Ti, RTX 4090, Pro cards",
+        "requirements": "NVIDIA GPU with 24GB+ VRAM (3090 Ti, 4090, A6000)",
+        "seg_size": 2048,
+        "overlap": 12,
+        "batch_size": 8,
+        "notes": "Maximum segment size for best quality. No compromises.",
+        "recommended_models": ["All models at max settings", "Complex ensembles"]
+    },
+}
+
+# Ensemble presets - workflow graphs of separate / post_process / combine / transcribe
+# stages, with stems routed between them by tag (see glitchstem.workflow)
+ENSEMBLE_PRESETS = {
+    "ENSEMBLE: 🥁 Drum Isolation + Split": {
+        "desc": "Extract drums from mix → split into kick/snare/hh/toms/cymbals",
+        "graph": [
+            {"id": "pass_1", "op": "separate", "model": "HTDemucs-ft"},
+            {"id": "post", "op": "post_process", "model": "DrumSep-6way", "input": "pass_1:drums"},
+        ],
+    },
+    "ENSEMBLE: 🥁 Drums to MIDI": {
+        "desc": "Extract drums → split into 6 pieces → one MIDI file per piece",
+        "graph": [
+            {"id": "pass_1", "op": "separate", "model": "HTDemucs-ft"},
+            {"id": "post", "op": "post_process", "model": "DrumSep-6way", "input": "pass_1:drums"},
+            {"id": "midi", "op": "transcribe", "input": "post:*", "kind": "drums"},
+        ],
+    },
+    "ENSEMBLE: 🎸 Clean Instrumental": {
+        "desc": "Best instrumental + de-reverb + bleed removal",
+        "graph": [
+            {"id": "pass_1", "op": "separate", "model": "MelBand-Inst-V2"},
+            {"id": "post", "op": "post_process", "model": "Bleed-Suppressor", "input": "pass_1:instrumental"},
+        ],
+    },
+    "ENSEMBLE: 🎸 Studio Instrumental": {
+        "desc": "Instrumental → denoise → de-reverb (cleanest output)",
+        "graph": [
+            {"id": "pass_1", "op": "separate", "model": "MelBand-Inst-Bleedless-V3"},
+            {"id": "post", "op": "post_process", "model": "Denoise-MelBand", "input": "pass_1:instrumental"},
+        ],
+    },
+    "ENSEMBLE: Ultimate Instrumental": {
+        "desc": "Two top models averaged into one instrumental",
+        "graph": [
+            {"id": "pass_1", "op": "separate", "model": "MelBand-Inst-V2"},
+            {"id": "pass_2", "op": "separate", "model": "MelBand-Inst-Bleedless-V3"},
+            {"id": "combined", "op": "combine", "input": ["pass_1", "pass_2"], "method": "mean"},
+        ],
+    },
+    "ENSEMBLE: 🎛️ Full Mix Breakdown": {
+        "desc": "HTDemucs 4-stem (drums/bass/vocals/other) + denoise",
+        "graph": [
+            {"id": "pass_1", "op": "separate", "model": "HTDemucs-ft"},
+            {"id": "post", "op": "post_process", "model": "Denoise-MelBand", "input": "pass_1:other"},
+        ],
+    },
+    "ENSEMBLE: Studio Master": {
+        "desc": "Vocals + instrumental separation with de-reverb",
+        "graph": [
+            {"id": "pass_1", "op": "separate", "model": "MelBand-Kim-Vocals"},
+            {"id": "pass_2", "op": "separate", "model": "MelBand-Inst-V2"},
+            {"id": "post", "op": "post_process", "model": "DeReverb-MelBand-Anvuew", "input": "pass_1:vocals"},
+        ],
+    },
+    "ENSEMBLE: Ultimate Vocals": {
+        "desc": "Best vocal quality - 2 top models + de-reverb",
+        "graph": [
+            {"id": "pass_1", "op": "separate", "model": "MelBand-Kim-Vocals"},
+            {"id": "pass_2", "op": "separate", "model": "MelBand-BigBeta4"},
+            {"id": "combined", "op": "combine", "input": ["pass_1", "pass_2"], "method": "mean"},
+            {"id": "post", "op": "post_process", "model": "DeReverb-MelBand-Anvuew", "input": "pass_1:vocals"},
+        ],
+    },
+    "ENSEMBLE: Ultimate Vocals (Averaged De-reverb)": {
+        "desc": "2 top vocal models averaged, then de-reverb on the averaged vocals",
+        "graph": [
+            {"id": "pass_1", "op": "separate", "model": "MelBand-Kim-Vocals"},
+            {"id": "pass_2", "op": "separate", "model": "MelBand-BigBeta4"},
+            {"id": "combined", "op": "combine", "input": ["pass_1", "pass_2"], "method": "mean"},
+            {"id": "post", "op": "post_process", "model": "DeReverb-MelBand-Anvuew", "input": "combined:vocals"},
+        ],
+    },
+    "⚙️ CUSTOM ENSEMBLE...": {
+        "desc": "Build your own workflow - click to configure",
+        "models": [],
+        "post_process": None,
+        "output_stem": "custom",
+        "is_custom": True
+    },
+}
+
+# Stems each model writes, by model filename keyword (first match wins; see stems.model_stems)
+MODEL_STEMS = [
+    ("htdemucs_6s", ["Vocals", "Drums", "Bass", "Guitar", "Piano", "Other"]),
+    ("BS-Roformer-SW", ["Vocals", "Drums", "Bass", "Guitar", "Piano", "Other"]),
+    ("htdemucs", ["Vocals", "Drums", "Bass", "Other"]),
+    ("DrumSep", ["Kick", "Snare", "Toms", "HH", "Ride", "Crash"]),
+    ("kuielab", ["Drums", "No Drums"]),
+    ("ep_937", ["Drums", "Bass"]),
+    ("dereverb", ["No Reverb", "Reverb"]),
+    ("deverb", ["No Reverb", "Reverb"]),
+    ("denoise", ["No Noise", "Noise"]),
+    ("bleed_suppressor", ["Instrumental", "Bleed"]),
+    ("chorus", ["Male", "Female"]),
+]
+DEFAULT_MODEL_STEMS = ["Vocals", "Instrumental"]
@@ -0,0 +1,143 @@
+"""Out-of-memory handling: detection, settings backoff and a per-machine memory profile.
+
+A pass that runs out of CUDA or host memory is recognised from the
+separator's output (or the in-process exception) and retried with a
+smaller batch_size, then a smaller seg_size. The settings that failed and
+the one that finally worked are stored in ``~/.glitchstem/memory_profile.json``
+under this machine's hardware fingerprint, together with the peak memory
+every successful pass was seen to use. The engine consults it before the
+next pass of that model: a setting known to fail is replaced up front, and
+memory estimates for admission are scaled by what was actually observed.
+"""
+import json
+import os
+import re
+import threading
+import uuid
+
+from .hardware import hardware_fingerprint
+from .memory import estimate_pass_bytes
+from .paths import app_path
+
+DEFAULT_PROFILE_PATH = app_path("memory_profile.json")
+
+OOM_RE = re.compile(r"out of memory|OutOfMemoryError|MemoryError|bad_alloc|can't allocate memory|"
+                    r"failed to allocate memory|not enough memory|CUBLAS_STATUS_ALLOC_FAILED|"
+                    r"CUDNN_STATUS_ALLOC_FAILED", re.IGNORECASE)
+# SIGKILL from the Linux OOM killer (as Popen and as a shell report it)
+OOM_EXIT_CODES = (-9, 137)
+
+DEFAULT_OOM_RETRIES = 3
+MIN_SEG_SIZE = 64
+# Observed peaks vary a little between runs and inputs
+PEAK_MARGIN = 1.1
+
+
+def is_oom(lines, exit_code=None):
+    """True if a failed pass's output (or exit code) says it ran out of memory"""
+    return exit_code in OOM_EXIT_CODES or any(OOM_RE.search(line) for line in lines)
+
+def smaller_settings(model_filename, settings):
+    """Next setting to try after an OOM: halve batch_size, then seg_size; None when nothing is left"""
+    # Demucs runs without the mdxc_* flags, so there is nothing to shrink
+    if "htdemucs" in model_filename:
+        return None
+    batch, seg = int(settings["batch_size"]), int(settings["seg_size"])
+    if batch > 1:
+        return dict(settings, batch_size=batch // 2)
+    if seg > MIN_SEG_SIZE:
+        return dict(settings, seg_size=max(MIN_SEG_SIZE, seg // 2))
+    return None
+
+def _size_key(settings):
+    return f"{int(settings['seg_size'])}x{int(settings['batch_size'])}"
+
+
+class MemoryProfile:
+    """memory_profile.json: {fingerprint: {"models": {model file: {"peaks", "failed", "working"}}}}
+
+    ``peaks`` maps "<seg_size>x<batch_size>" to the highest peak seen,
+    ``failed`` lists [seg_size, batch_size] pairs that ran out of memory and
+    ``working`` is the setting that succeeded after the last backoff.
+    """
+
+    def __init__(self, path=DEFAULT_PROFILE_PATH, fingerprint=None):
+        self.path = path
+        self.fingerprint = fingerprint or hardware_fingerprint()
+        self._lock = threading.Lock()
+        self._models = None
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def models(self):
+        if self._models is None:
+            self._models = self._load().get(self.fingerprint, {}).get("models", {})
+        return self._models
+
+    def _update(self, model_filename, change):
+        """Apply change(entry) to the stored entry (re-read first: other workers write too)"""
+        with self._lock:
+            data = self._load()
+            models = data.setdefault(self.fingerprint, {}).setdefault("models", {})
+            change(models.setdefault(model_filename, {"peaks": {}, "failed": [], "working": None}))
+            self._models = models
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp = f"{self.path}.{uuid.uuid4().hex}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=1)
+                os.replace(tmp, self.path)
+            except OSError:
+                pass
+
+    def observe(self, model_filename, settings, peak_bytes):
+        """Record the peak memory a successful pass used"""
+        if not peak_bytes:
+            return
+        key = _size_key(settings)
+
+        def change(entry):
+            entry["peaks"][key] = max(entry["peaks"].get(key, 0), int(peak_bytes))
+        self._update(model_filename, change)
+
+    def record_oom(self, model_filename, settings):
+        pair = [int(settings["seg_size"]), int(settings["batch_size"])]
+
+        def change(entry):
+            if pair not in entry["failed"]:
+                entry["failed"].append(pair)
+        self._update(model_filename, change)
+
+    def remember_working(self, model_filename, settings):
+        working = {key: int(settings[key]) for key in ("seg_size", "overlap", "batch_size")}
+
+        def change(entry):
+            entry["working"] = working
+        self._update(model_filename, change)
+
+    def known_to_fail(self, model_filename, settings):
+        """True if a setting no larger than this one already ran out of memory"""
+        entry = self.models().get(model_filename, {})
+        seg, batch = int(settings["seg_size"]), int(settings["batch_size"])
+        return any(seg >= s and batch >= b for s, b in entry.get("failed", []))
+
+    def working(self, model_filename):
+        return self.models().get(model_filename, {}).get("working")
+
+    def estimate(self, model_filename, settings):
+        """Peak memory of a pass: observed for this size if seen, else the model's
+        analytic estimate scaled by how far off it was for the sizes that were seen"""
+        analytic = estimate_pass_bytes(model_filename, settings)
+        peaks = self.models().get(model_filename, {}).get("peaks", {})
+        if _size_key(settings) in peaks:
+            return int(peaks[_size_key(settings)] * PEAK_MARGIN)
+        ratios = []
+        for key, peak in peaks.items():
+            seg, batch = (int(v) for v in key.split("x"))
+            ratios.append(peak / estimate_pass_bytes(model_filename, {"seg_size": seg, "batch_size": batch}))
+        return int(analytic * max(ratios) * PEAK_MARGIN) if ratios else analytic
@@ -0,0 +1,10 @@
+"""Where glitchstem keeps its caches and state"""
+import os
+
+# Override with GLITCHSTEM_HOME (e.g. a fast local disk on render boxes)
+APP_DIR = os.environ.get("GLITCHSTEM_HOME") or os.path.join(os.path.expanduser("~"), ".glitchstem")
+
+
+def app_path(*parts):
+    """Path inside the glitchstem home folder"""
+    return os.path.join(APP_DIR, *parts)
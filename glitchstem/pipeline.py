@@ -0,0 +1,277 @@
+"""Chunk-level pipelining of a primary pass into its post-process pass.
+
+Instead of waiting for pass 1 to write a full stem and rescanning its
+folder, the input is cut into overlapping chunks. A producer thread runs
+the primary model chunk by chunk and pushes each finished chunk's target
+stem(s) onto a bounded queue. The post-process model consumes them right
+away, so both stages work at the same time and at most ``queue_depth``
+intermediate chunks exist on disk at once.
+
+Chunk overlaps give both models context at the cut points. They are
+resolved with a linear crossfade when the final outputs are stitched
+together, which happens block by block so nothing full-length is held in
+memory.
+
+The separator normalizes each output it writes on its own, which would
+give loud and quiet chunks different gains. Chunk passes therefore run
+with a 1.0 limit (clipping protection only) on input scaled by one gain
+for the whole track, leaving headroom. The stitched outputs undo that gain
+and are then normalized once, as the separator would have normalized the
+whole-track output. The post-process outputs are first scaled by what
+that normalization would have done to their input stem, since an
+end-to-end post pass reads the normalized stem.
+
+Every chunk is a separate pass, so this pays off most with the in-process
+backend, where both models stay loaded.
+"""
+import os
+import queue
+import shutil
+import threading
+import uuid
+
+import numpy as np
+
+from .audio_io import AudioReader, open_writer
+from .delivery import INTERMEDIATE_SUBTYPE
+from .stems import list_stems
+
+DEFAULT_CHUNK_SECONDS = 30.0
+DEFAULT_OVERLAP_SECONDS = 2.0
+DEFAULT_QUEUE_DEPTH = 2
+# Chunk inputs are scaled to this peak, so no chunk output reaches the separator's limit
+STREAM_HEADROOM = 0.5
+STREAM_NORMALIZATION = 1.0
+
+
+def chunk_spans(total_frames, chunk_frames, overlap_frames):
+    """[(start, stop)] covering total_frames with overlapping chunks.
+
+    Every chunk after the first is longer than the overlap, so each
+    crossfade has a full overlap region to work with.
+    """
+    step = chunk_frames - overlap_frames
+    spans = []
+    start = 0
+    while True:
+        stop = min(start + chunk_frames, total_frames)
+        spans.append((start, stop))
+        if stop >= total_frames:
+            return spans
+        start += step
+
+
+class ChunkStitcher:
+    """Writes overlapping chunks in order, crossfading each overlap"""
+
+    def __init__(self, path, samplerate, channels, overlap_frames, subtype="PCM_16"):
+        self.path = path
+        self.overlap = overlap_frames
+        self.writer = open_writer(path, samplerate, channels, subtype)
+        self.tail = None
+        self.fade_in = np.linspace(0.0, 1.0, overlap_frames + 2, dtype=np.float32)[1:-1, None]
+
+    def add(self, audio, last=False):
+        if self.tail is not None:
+            n = min(len(self.tail), len(audio))
+            audio = audio.copy()
+            audio[:n] = self.tail[:n] * (1.0 - self.fade_in[:n]) + audio[:n] * self.fade_in[:n]
+        if last or len(audio) <= self.overlap:
+            self.writer.write(audio)
+            self.tail = None
+        else:
+            self.writer.write(audio[:-self.overlap])
+            self.tail = audio[-self.overlap:]
+        if last:
+            self.close()
+
+    def close(self):
+        if self.tail is not None:
+            self.writer.write(self.tail)
+            self.tail = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+def _read_fitted(path, frames):
+    """Whole chunk output, trimmed or zero-padded to the input chunk length"""
+    with AudioReader(path) as reader:
+        return reader.read(0, frames)
+
+
+class _Stitchers:
+    """One ChunkStitcher per output filename, opened on first use"""
+
+    def __init__(self, output_dir, samplerate, overlap_frames, gain=1.0):
+        self.output_dir = output_dir
+        self.samplerate = samplerate
+        self.overlap = overlap_frames
+        self.gain = np.float32(gain)
+        self.by_name = {}
+
+    def add(self, path, frames, last):
+        name = os.path.basename(path)
+        audio = _read_fitted(path, frames) * self.gain
+        stitcher = self.by_name.get(name)
+        if stitcher is None:
+            stitcher = ChunkStitcher(os.path.join(self.output_dir, name), self.samplerate,
+                                     audio.shape[1], self.overlap, INTERMEDIATE_SUBTYPE)
+            self.by_name[name] = stitcher
+        stitcher.add(audio, last)
+        return stitcher.path
+
+    def close(self):
+        for stitcher in self.by_name.values():
+            stitcher.close()
+        return [s.path for s in self.by_name.values()]
+
+def _rescale(path, gain, limit):
+    """Scale a stitched output by gain, then down to limit if it is louder (in place)"""
+    import soundfile as sf
+
+    with AudioReader(path) as reader:
+        top = max((float(np.abs(block).max()) for _, block in reader.blocks()), default=0.0) * gain
+        if top > limit:
+            gain *= limit / top
+        if gain == 1.0:
+            return
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with sf.SoundFile(tmp, "w", samplerate=reader.samplerate, channels=reader.channels,
+                          subtype=INTERMEDIATE_SUBTYPE, format="WAV") as out:
+            for _, block in reader.blocks():
+                out.write(block * np.float32(gain))
+    os.replace(tmp, path)
+
+_DONE = object()
+
+def run_pipelined(engine, model_name, post_process, input_file, pass_dir, post_dir, target_tags,
+                  chunk_seconds=DEFAULT_CHUNK_SECONDS, overlap_seconds=DEFAULT_OVERLAP_SECONDS,
+                  queue_depth=DEFAULT_QUEUE_DEPTH, keep_intermediate=False, first_target_only=False):
+    """Run model_name on input_file and post_process on its target_tags stems, chunk by chunk.
+
+    Non-target stems of the primary pass are stitched into pass_dir as
+    usual. The target stem is only stitched there too when
+    ``keep_intermediate`` is set (e.g. a combine step needs it). Returns
+    (primary_ok, post_ok).
+    """
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    for folder in (pass_dir, post_dir):
+        os.makedirs(folder, exist_ok=True)
+    scratch = engine.scratch_folder(pass_dir, "_stream")
+
+    reader = AudioReader(input_file)
+    samplerate = reader.samplerate
+    chunk_frames = int(chunk_seconds * samplerate)
+    overlap_frames = min(int(overlap_seconds * samplerate), chunk_frames // 2)
+    spans = chunk_spans(reader.frames, chunk_frames, overlap_frames)
+    # One gain for the whole track instead of the separator normalizing each chunk on its own
+    peak = max((float(np.abs(block).max()) for _, block in reader.blocks()), default=0.0)
+    gain = np.float32(min(1.0, STREAM_HEADROOM / peak) if peak else 1.0)
+
+    # Chunk passes are throwaway work: never cache them
+    chunk_engine = engine.for_pass("", engine.threads)
+    chunk_engine.stem_cache = None
+    chunk_engine.normalization = STREAM_NORMALIZATION
+    # Per-chunk separator chatter would drown the log; keep only errors
+    chunk_engine.log = lambda message: engine.log(message) if "ERROR" in message else None
+
+    handoff = queue.Queue(maxsize=max(1, queue_depth))
+    stop = threading.Event()
+    primary = {"ok": True}
+    # Target stem name -> its whole-track peak (without the chunk gain)
+    target_peaks = {}
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                handoff.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        stitchers = _Stitchers(pass_dir, samplerate, overlap_frames, 1.0 / gain)
+        try:
+            for i, (start, end) in enumerate(spans):
+                if stop.is_set():
+                    break
+                chunk_dir = os.path.join(scratch, f"chunk_{i:04d}")
+                out_dir = os.path.join(chunk_dir, "out")
+                os.makedirs(out_dir, exist_ok=True)
+                chunk_file = os.path.join(chunk_dir, f"{base_name}.wav")
+                with open_writer(chunk_file, samplerate, reader.channels, "FLOAT") as w:
+                    w.write(reader.read(start, end) * gain)
+
+                engine.log(f">> [stream] {model_name}: chunk {i + 1}/{len(spans)}")
+                if not chunk_engine.run_model(model_name, chunk_file, out_dir):
+                    primary["ok"] = False
+                    break
+                os.remove(chunk_file)
+
+                stems = list_stems(out_dir)
+                targets = [stems[tag] for tag in target_tags if tag in stems][:1 if first_target_only else None]
+                for target in targets:
+                    name = os.path.splitext(os.path.basename(target))[0]
+                    top = float(np.abs(_read_fitted(target, end - start)).max()) / gain
+                    target_peaks[name] = max(target_peaks.get(name, 0.0), top)
+                last = i == len(spans) - 1
+                for name in sorted(os.listdir(out_dir)):
+                    path = os.path.join(out_dir, name)
+                    if path not in targets or keep_intermediate:
+                        stitchers.add(path, end - start, last)
+                    if path not in targets:
+                        os.remove(path)
+                if not put((i, end - start, targets, chunk_dir)):
+                    break
+        except Exception as e:
+            engine.log(f">> ERROR (stream, {model_name}): {str(e)}")
+            primary["ok"] = False
+        finally:
+            try:
+                for path in stitchers.close():
+                    _rescale(path, 1.0, engine.normalization)
+            except Exception as e:
+                engine.log(f">> ERROR (stream, {model_name}): {str(e)}")
+                primary["ok"] = False
+            put(_DONE)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    post_ok = True
+    post_stitchers = _Stitchers(post_dir, samplerate, overlap_frames, 1.0 / gain)
+    try:
+        while True:
+            item = handoff.get()
+            if item is _DONE:
+                break
+            i, frames, targets, chunk_dir = item
+            if not targets:
+                # A gap would desync the stitched output, so stop here
+                engine.log(f">> WARNING: Could not find {'/'.join(target_tags)} stem in chunk {i + 1}")
+                post_ok = False
+                break
+            post_out = os.path.join(chunk_dir, "post")
+            os.makedirs(post_out, exist_ok=True)
+            engine.log(f">> [stream] {post_process}: chunk {i + 1}/{len(spans)}")
+            for target in targets:
+                if not chunk_engine.run_model(post_process, target, post_out):
+                    post_ok = False
+            for name in sorted(os.listdir(post_out)):
+                post_stitchers.add(os.path.join(post_out, name), frames, i == len(spans) - 1)
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+            if not post_ok:
+                break
+    finally:
+        stop.set()
+        producer.join()
+        for path in post_stitchers.close():
+            name = os.path.basename(path)
+            source = max((t for t in target_peaks if name.startswith(t)), key=len, default=None)
+            top = target_peaks.get(source, 0.0)
+            _rescale(path, min(1.0, engine.normalization / top) if top else 1.0, engine.normalization)
+        reader.close()
+        engine.remove_scratch(scratch)
+
+    return primary["ok"], post_ok
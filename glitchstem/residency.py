@@ -0,0 +1,226 @@
+"""In-process model residency - keeps loaded separator models between passes.
+
+The subprocess backend pays checkpoint load + device transfer on every pass.
+ModelResidencyCache keeps ``audio_separator.Separator`` instances loaded,
+keyed by model file plus the inference params that are baked in at load
+time, and evicts least-recently-used models once the estimated footprint
+goes over the RAM/VRAM budget.
+"""
+import gc
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .memory import (DEFAULT_MODEL_DIR, GB, checkpoint_bytes, cuda_allocated_bytes,
+                     default_model_budget, process_rss_bytes)
+
+
+def inprocess_available():
+    """True when audio_separator can be imported in this interpreter"""
+    import importlib.util
+    return importlib.util.find_spec("audio_separator") is not None
+
+def load_separator(model_filename, params, model_dir=DEFAULT_MODEL_DIR,
+                   output_format="WAV", normalization=0.9):
+    """Create a Separator and load one model into it.
+
+    ``params`` uses the CLI flag names SeparationEngine.inference_params
+    produces (mdxc_segment_size, demucs_shifts, ...), plus an optional
+    ``normalization`` that overrides the argument.
+    """
+    from audio_separator.separator import Separator
+
+    kwargs = {
+        "log_level": logging.WARNING,
+        "model_file_dir": model_dir,
+        "output_format": output_format,
+        "normalization_threshold": params.get("normalization", normalization),
+        "use_autocast": True,
+    }
+    if "demucs_shifts" in params:
+        kwargs["demucs_params"] = {
+            "segment_size": "Default",
+            "shifts": params["demucs_shifts"],
+            "overlap": params["demucs_overlap"],
+            "segments_enabled": True,
+        }
+    else:
+        kwargs["mdxc_params"] = {
+            "segment_size": params["mdxc_segment_size"],
+            "override_model_segment_size": False,
+            "batch_size": params["mdxc_batch_size"],
+            "overlap": params["mdxc_overlap"],
+            "pitch_shift": 0,
+        }
+
+    separator = Separator(**kwargs)
+    separator.load_model(model_filename=model_filename)
+    return separator
+
+def separate_with(separator, input_file, output_dir):
+    """Run an already-loaded Separator, writing stems to output_dir"""
+    separator.output_dir = output_dir
+    if getattr(separator, "model_instance", None) is not None:
+        separator.model_instance.output_dir = output_dir
+    return separator.separate(input_file)
+
+
+class _Resident:
+    def __init__(self, key, model_filename, params, size):
+        self.key = key
+        self.model_filename = model_filename
+        self.params = params
+        self.size = size
+        self.separator = None
+        self.users = 0
+        self.lock = threading.Lock()
+
+
+class ModelResidencyCache:
+    """LRU cache of loaded separator models under a memory budget.
+
+    Use ``with cache.acquire(model_filename, params) as separator:``; an
+    entry is never evicted while it is checked out, and one entry is only
+    used by one thread at a time.
+    """
+
+    def __init__(self, budget_bytes=None, model_dir=DEFAULT_MODEL_DIR, log=None):
+        self.budget_bytes = budget_bytes or default_model_budget()
+        self.model_dir = model_dir
+        self.log = log or (lambda message: None)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_filename, params):
+        return (model_filename,) + tuple(sorted(params.items()))
+
+    @contextmanager
+    def acquire(self, model_filename, params):
+        key = self.make_key(model_filename, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            else:
+                self.misses += 1
+                entry = _Resident(key, model_filename, dict(params),
+                                  checkpoint_bytes(model_filename, self.model_dir))
+                self._entries[key] = entry
+            entry.users += 1
+            self._evict_over_budget()
+
+        try:
+            with entry.lock:
+                if entry.separator is None:
+                    self._load(entry)
+                yield entry.separator
+        finally:
+            with self._lock:
+                entry.users -= 1
+                self._evict_over_budget()
+
+    def _load(self, entry):
+        self.log(f">> Loading {entry.model_filename} into memory...")
+        rss_before = process_rss_bytes()
+        cuda_before = cuda_allocated_bytes()
+        start = time.perf_counter()
+        try:
+            entry.separator = load_separator(entry.model_filename, entry.params, self.model_dir)
+        except Exception:
+            with self._lock:
+                self._entries.pop(entry.key, None)
+            raise
+        elapsed = time.perf_counter() - start
+        self.load_seconds += elapsed
+
+        # Measured growth beats the checkpoint-size guess when we can get it
+        measured = max(process_rss_bytes() - rss_before, cuda_allocated_bytes() - cuda_before)
+        with self._lock:
+            entry.size = max(entry.size, measured)
+        self.log(f">> Loaded in {elapsed:.1f}s ({entry.size / GB:.2f} GB resident)")
+
+    def _evict_over_budget(self):
+        # Caller holds self._lock
+        total = sum(e.size for e in self._entries.values())
+        evicted = False
+        for key in list(self._entries):
+            if total <= self.budget_bytes:
+                break
+            entry = self._entries[key]
+            if entry.users:
+                continue
+            del self._entries[key]
+            total -= entry.size
+            self.evictions += 1
+            evicted = True
+            self.log(f">> Evicted {entry.model_filename} from model cache")
+            entry.separator = None
+        if evicted:
+            _release_memory()
+
+    def evict(self, model_filename):
+        """Drop every entry of model_filename not checked out (e.g. the settings that ran out of memory)"""
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if e.model_filename == model_filename and not e.users]
+            for key in keys:
+                self._entries.pop(key).separator = None
+                self.evictions += 1
+        if keys:
+            self.log(f">> Evicted {model_filename} from model cache" + (f" ({len(keys)} settings)" if len(keys) > 1 else ""))
+        _release_memory()
+
+    def clear(self):
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if not e.users]:
+                del self._entries[key]
+        _release_memory()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "resident": [e.model_filename for e in self._entries.values()],
+                "resident_bytes": sum(e.size for e in self._entries.values()),
+                "budget_bytes": self.budget_bytes,
+                "load_seconds": round(self.load_seconds, 3),
+            }
+
+    def describe(self):
+        s = self.stats()
+        return (f"Model cache: {s['hits']} hits, {s['misses']} misses, {s['evictions']} evictions, "
+                f"{len(s['resident'])} resident ({s['resident_bytes'] / GB:.1f}/{s['budget_bytes'] / GB:.1f} GB)")
+
+def _release_memory():
+    gc.collect()
+    torch = sys.modules.get("torch")
+    try:
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:
+        pass
+
+
+# One cache per process so pool workers keep models between jobs
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache(budget_bytes=None, model_dir=DEFAULT_MODEL_DIR):
+    """Process-wide ModelResidencyCache (created on first use)"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ModelResidencyCache(budget_bytes, model_dir)
+        elif budget_bytes:
+            _default_cache.budget_bytes = budget_bytes
+        return _default_cache
@@ -0,0 +1,524 @@
+"""Local HTTP job service: other machines submit separations to one strong box.
+
+An asyncio server (standard library only, no web framework) in front of a
+job queue. ``workers`` jobs run at once, each on an executor thread driving
+a SeparationEngine (``batch.build_engine``, the same engine batch and watch
+jobs use), so the audio-separator subprocesses or in-process passes never
+block the event loop. Engine log lines and metrics records are handed back
+to the loop with ``call_soon_threadsafe`` and become the job's events.
+
+    POST   /jobs                 JSON {"input": path, "model": name, "settings": {...}}
+    POST   /jobs?model=..&filename=song.wav   raw audio body (upload)
+    GET    /jobs                 every job, newest first
+    GET    /jobs/<id>            one job
+    DELETE /jobs/<id>            cancel a queued job
+    GET    /jobs/<id>/events     server-sent events: queued, started, log, progress, pass, job, finished
+    GET    /jobs/<id>/files      output files of a finished job
+    GET    /jobs/<id>/files/<f>  download one output file
+    GET    /stats                queue depth, running jobs, throughput
+    GET    /models               models and ensemble presets
+
+Outputs go to ``<output_dir>/<job id>``. Input paths are read on the
+service's machine; ``input_roots`` limits which folders they may come from.
+"""
+import asyncio
+import collections
+import http
+import json
+import os
+import re
+import shutil
+import time
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .batch import AUDIO_EXTENSIONS, build_engine
+from .engine import resolve_workflow
+from .logpump import progress_key
+from .memory import GB
+from .metrics import MetricsWriter, audio_seconds
+from .models import ENSEMBLE_PRESETS, MODEL_DATABASE
+from .paths import app_path
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_UPLOAD_DIR = app_path("service", "uploads")
+DEFAULT_MAX_UPLOAD_BYTES = 4 * GB
+
+MAX_JSON_BODY = 1 << 20
+CHUNK_BYTES = 1 << 20
+# Events kept per job for late subscribers; finished jobs kept in memory (their files stay on disk)
+MAX_JOB_EVENTS = 2000
+MAX_FINISHED_JOBS = 1000
+# Seconds of finished jobs /stats computes throughput over
+THROUGHPUT_WINDOW = 3600.0
+KEEPALIVE_SECONDS = 15.0
+
+SETTING_KEYS = ("seg_size", "overlap", "batch_size")
+FINISHED = ("done", "failed", "cancelled")
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ServiceJob:
+    """One submitted job and its event history; only touched from the event loop"""
+
+    def __init__(self, input_file, model, output_dir, settings, upload_dir=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.input = input_file
+        self.model = model
+        self.output_dir = os.path.join(output_dir, self.id)
+        self.settings = settings
+        self.upload_dir = upload_dir
+        self.status = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.progress = None
+        self.metrics = None
+        self.files = []
+        self.events = collections.deque(maxlen=MAX_JOB_EVENTS)
+        self.subscribers = set()
+        self._seq = 0
+
+    def publish(self, kind, data=None):
+        self._seq += 1
+        event = {"id": self._seq, "type": kind, "time": time.time(), "data": data or {}}
+        self.events.append(event)
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    def summary(self):
+        return {"id": self.id, "status": self.status, "input": os.path.basename(self.input), "model": self.model,
+                "settings": self.settings, "created": self.created, "started": self.started,
+                "finished": self.finished, "error": self.error, "progress": self.progress,
+                "metrics": self.metrics, "files": len(self.files)}
+
+class JobService:
+    """Job queue and workers; ``job_options`` holds the batch.run_job fields every job shares"""
+
+    def __init__(self, job_options, output_dir, workers=1, upload_dir=DEFAULT_UPLOAD_DIR,
+                 input_roots=None, max_upload_bytes=DEFAULT_MAX_UPLOAD_BYTES, log=print):
+        self.job_options = job_options
+        self.output_dir = os.path.abspath(output_dir)
+        self.workers = max(1, workers)
+        self.upload_dir = os.path.abspath(upload_dir)
+        self.input_roots = [os.path.abspath(root) + os.sep for root in input_roots or []]
+        self.max_upload_bytes = max_upload_bytes
+        self.log = log
+        self.jobs = collections.OrderedDict()
+        self.queue = None
+        self.running = set()
+        self.completed = collections.deque()    # (finished, seconds, input_seconds) inside the window
+        self.totals = collections.Counter()
+        self.started = time.time()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self.loop = None
+        self._tasks = []
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def check_model(self, name):
+        workflow = resolve_workflow(name) if name else None
+        if workflow is None:
+            raise HttpError(400, f"Unknown model or preset: {name}")
+        if ENSEMBLE_PRESETS.get(workflow, {}).get("is_custom"):
+            raise HttpError(400, "The custom ensemble is only available in the GUI")
+        return workflow
+
+    def check_settings(self, settings):
+        if not isinstance(settings, dict):
+            raise HttpError(400, "settings must be an object")
+        unknown = set(settings) - set(SETTING_KEYS)
+        if unknown:
+            raise HttpError(400, f"Unknown settings: {', '.join(sorted(unknown))}")
+        try:
+            return {key: int(value) for key, value in settings.items()}
+        except (TypeError, ValueError):
+            raise HttpError(400, "settings values must be integers")
+
+    def check_input(self, path):
+        path = os.path.abspath(os.path.expanduser(path))
+        if self.input_roots and not any(path.startswith(root) for root in self.input_roots):
+            raise HttpError(403, f"Input is outside the allowed folders: {path}")
+        if not os.path.isfile(path):
+            raise HttpError(400, f"Input not found: {path}")
+        return path
+
+    def submit(self, input_file, model, settings=None, upload_dir=None):
+        """Queue a job (input already checked); returns it"""
+        job = ServiceJob(input_file, self.check_model(model), self.output_dir,
+                         self.check_settings(settings or {}), upload_dir)
+        self.jobs[job.id] = job
+        self.totals["submitted"] += 1
+        self._prune()
+        job.publish("queued", {"position": self.queue.qsize() + 1})
+        self.queue.put_nowait(job)
+        self.log(f">> Queued {job.id}: {os.path.basename(input_file)} -> {job.model}")
+        return job
+
+    def cancel(self, job):
+        if job.status != "queued":
+            raise HttpError(409, f"Job is {job.status}, only queued jobs can be cancelled")
+        self._finish(job, "cancelled")
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            if job.status != "queued":
+                continue
+            job.status = "running"
+            job.started = time.time()
+            self.running.add(job)
+            job.publish("started")
+            self.log(f">> Started {job.id}: {os.path.basename(job.input)}")
+            try:
+                result = await self.loop.run_in_executor(self.executor, self._run, job)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            self.running.discard(job)
+            job.metrics = result.get("metrics")
+            job.files = result.get("files", [])
+            job.error = result.get("error")
+            self._finish(job, "done" if result["success"] else "failed")
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time.time()
+        self.totals[status] += 1
+        if status != "cancelled":
+            input_seconds = (job.metrics or {}).get("input_seconds")
+            self.completed.append((job.finished, job.finished - job.started, input_seconds))
+        job.publish("finished", {"status": status, "error": job.error, "files": job.files})
+        if job.upload_dir:
+            shutil.rmtree(job.upload_dir, ignore_errors=True)
+        self.log(f">> {status.upper()} {job.id}: {os.path.basename(job.input)}"
+                 + (f" ({job.error})" if job.error else ""))
+
+    def _run(self, job):
+        """Executor thread: run the engine, forwarding its log and metrics to the loop"""
+        def post(kind, data):
+            self.loop.call_soon_threadsafe(self._on_event, job, kind, data)
+
+        def log(message):
+            for line in message.split("\n"):
+                # Progress bars arrive as "progress" events instead
+                if line.strip() and progress_key(line) is None:
+                    post("log", {"line": line})
+
+        writer = MetricsWriter(self.job_options["metrics_path"]) if self.job_options.get("metrics_path") else None
+
+        def metrics(record):
+            post(record.get("type", "metrics"), record)
+            if writer is not None:
+                writer(record)
+
+        options = dict(self.job_options, input=job.input, model=job.model, output_dir=job.output_dir,
+                       settings=dict(self.job_options.get("settings") or {}, **job.settings))
+        engine = build_engine(options, log, metrics)
+        try:
+            success = engine.process(job.model, job.input, job.output_dir)
+            error = None if success else "separation failed (see the job's log events)"
+        except Exception as e:
+            success, error = False, str(e)
+        # The job's file list is its final, encoded outputs
+        if engine.wait_outputs() and success:
+            success, error = False, "some outputs could not be written (see the job's log events)"
+        metrics_record = engine.last_job
+        if metrics_record is not None and metrics_record.get("input_seconds") is None:
+            metrics_record["input_seconds"] = audio_seconds(job.input)
+        return {"success": bool(success), "error": error, "metrics": metrics_record,
+                "files": output_files(job.output_dir)}
+
+    def _on_event(self, job, kind, data):
+        if kind == "progress":
+            job.progress = {key: data.get(key) for key in ("model", "percent", "eta_seconds")}
+        job.publish(kind, data)
+
+    def stats(self):
+        now = time.time()
+        while self.completed and now - self.completed[0][0] > THROUGHPUT_WINDOW:
+            self.completed.popleft()
+        window = min(THROUGHPUT_WINDOW, max(1e-6, now - self.started))
+        audio = sum(entry[2] or 0 for entry in self.completed)
+        busy = sum(entry[1] for entry in self.completed)
+        return {
+            "queued": sum(1 for job in self.jobs.values() if job.status == "queued"),
+            "running": len(self.running),
+            "workers": self.workers,
+            "totals": dict(self.totals),
+            "uptime_seconds": now - self.started,
+            "throughput": {
+                "window_seconds": window,
+                "jobs": len(self.completed),
+                "jobs_per_hour": len(self.completed) * 3600.0 / window,
+                "audio_seconds": audio,
+                # Seconds of audio per second of job wall time (per worker)
+                "realtime": audio / busy if busy else None,
+            },
+        }
+
+def output_files(folder):
+    """[{"name", "bytes"}] of every file under folder, names relative to it"""
+    files = []
+    for root, _, names in os.walk(folder):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            files.append({"name": os.path.relpath(path, folder).replace(os.sep, "/"),
+                          "bytes": os.path.getsize(path)})
+    return files
+
+class Request:
+    def __init__(self, method, target, headers, reader, writer):
+        url = urllib.parse.urlsplit(target)
+        self.method = method
+        self.path = urllib.parse.unquote(url.path).rstrip("/") or "/"
+        self.query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        self.headers = headers
+        self.reader = reader
+        self.writer = writer
+
+    def content_length(self, limit):
+        try:
+            length = int(self.headers["content-length"])
+        except (KeyError, ValueError):
+            raise HttpError(411, "Content-Length required")
+        if length > limit:
+            raise HttpError(413, f"Body larger than {limit} bytes")
+        if self.headers.get("expect", "").lower() == "100-continue":
+            self.writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        return length
+
+    async def json(self):
+        body = await self.reader.readexactly(self.content_length(MAX_JSON_BODY))
+        try:
+            return json.loads(body or b"{}")
+        except ValueError:
+            raise HttpError(400, "Body is not valid JSON")
+
+    async def save_body(self, path, limit):
+        """Stream the body to path"""
+        remaining = self.content_length(limit)
+        with open(path, "wb") as f:
+            while remaining:
+                chunk = await self.reader.read(min(CHUNK_BYTES, remaining))
+                if not chunk:
+                    raise HttpError(400, "Upload ended early")
+                f.write(chunk)
+                remaining -= len(chunk)
+
+def head(status, content_type, length=None, extra=None):
+    lines = [f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}", f"Content-Type: {content_type}",
+             "Connection: close"]
+    if length is not None:
+        lines.append(f"Content-Length: {length}")
+    lines += [f"{key}: {value}" for key, value in (extra or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+async def send_json(writer, status, data):
+    body = (json.dumps(data, default=str) + "\n").encode("utf-8")
+    writer.write(head(status, "application/json", len(body)) + body)
+    await writer.drain()
+
+class ServiceHandlers:
+    """Route handlers; each takes (request, *url groups)"""
+
+    ROUTES = [
+        ("POST", r"/jobs", "submit"),
+        ("GET", r"/jobs", "list_jobs"),
+        ("GET", r"/jobs/(\w+)", "get_job"),
+        ("DELETE", r"/jobs/(\w+)", "cancel_job"),
+        ("GET", r"/jobs/(\w+)/events", "events"),
+        ("GET", r"/jobs/(\w+)/files", "files"),
+        ("GET", r"/jobs/(\w+)/files/(.+)", "download"),
+        ("GET", r"/stats", "stats"),
+        ("GET", r"/models", "models"),
+    ]
+
+    def __init__(self, service):
+        self.service = service
+        self.routes = [(method, re.compile(pattern + "$"), getattr(self, name))
+                       for method, pattern, name in self.ROUTES]
+
+    async def __call__(self, reader, writer):
+        try:
+            try:
+                request_line = (await reader.readline()).decode("latin-1").split()
+                if len(request_line) != 3:
+                    raise HttpError(400, "Bad request line")
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                request = Request(request_line[0].upper(), request_line[1], headers, reader, writer)
+                await self.dispatch(request)
+            except HttpError as e:
+                await send_json(writer, e.status, {"error": str(e)})
+            except asyncio.IncompleteReadError:
+                pass
+            except Exception as e:
+                self.service.log(f">> Request failed: {e}")
+                await send_json(writer, 500, {"error": str(e)})
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, request):
+        methods = set()
+        for method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if match:
+                if method == request.method:
+                    return await handler(request, *match.groups())
+                methods.add(method)
+        if methods:
+            raise HttpError(405, f"Use {', '.join(sorted(methods))}")
+        raise HttpError(404, f"No such endpoint: {request.path}")
+
+    def job(self, job_id):
+        job = self.service.jobs.get(job_id)
+        if job is None:
+            raise HttpError(404, f"No such job: {job_id}")
+        return job
+
+    async def submit(self, request):
+        service = self.service
+        if request.headers.get("content-type", "").split(";")[0].strip() == "application/json":
+            body = await request.json()
+            if not isinstance(body, dict) or not body.get("input"):
+                raise HttpError(400, 'Expected {"input": path, "model": name}')
+            job = service.submit(service.check_input(body["input"]), body.get("model"), body.get("settings"))
+            return await send_json(request.writer, 202, job.summary())
+
+        # Upload: the body is the audio file itself
+        filename = os.path.basename(request.query.get("filename", "").replace("\\", "/"))
+        if not filename.lower().endswith(AUDIO_EXTENSIONS):
+            raise HttpError(400, f"filename= must be an audio file ({', '.join(AUDIO_EXTENSIONS)})")
+        model = service.check_model(request.query.get("model"))
+        settings = service.check_settings({key: request.query[key] for key in SETTING_KEYS if key in request.query})
+        upload_dir = os.path.join(service.upload_dir, uuid.uuid4().hex)
+        os.makedirs(upload_dir)
+        path = os.path.join(upload_dir, filename)
+        try:
+            await request.save_body(path, service.max_upload_bytes)
+        except BaseException:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            raise
+        job = service.submit(path, model, settings, upload_dir)
+        await send_json(request.writer, 202, job.summary())
+
+    async def list_jobs(self, request):
+        jobs = [job.summary() for job in reversed(self.service.jobs.values())]
+        status = request.query.get("status")
+        await send_json(request.writer, 200, [job for job in jobs if not status or job["status"] == status])
+
+    async def get_job(self, request, job_id):
+        await send_json(request.writer, 200, self.job(job_id).summary())
+
+    async def cancel_job(self, request, job_id):
+        job = self.job(job_id)
+        self.service.cancel(job)
+        await send_json(request.writer, 200, job.summary())
+
+    async def events(self, request, job_id):
+        """Server-sent events: the job's history after Last-Event-ID, then live until it finishes"""
+        job = self.job(job_id)
+        writer = request.writer
+        try:
+            last_id = int(request.headers.get("last-event-id") or request.query.get("since") or 0)
+        except ValueError:
+            last_id = 0
+        queue = asyncio.Queue()
+        for event in job.events:
+            queue.put_nowait(event)
+        job.subscribers.add(queue)
+        writer.write(head(200, "text/event-stream", extra={"Cache-Control": "no-cache"}))
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+                    continue
+                if event["id"] <= last_id:
+                    continue
+                last_id = event["id"]
+                data = json.dumps(dict(event["data"], time=event["time"]), default=str)
+                writer.write(f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n".encode("utf-8"))
+                await writer.drain()
+                if event["type"] == "finished":
+                    break
+        finally:
+            job.subscribers.discard(queue)
+
+    async def files(self, request, job_id):
+        job = self.job(job_id)
+        await send_json(request.writer, 200, {"id": job.id, "status": job.status, "files": job.files})
+
+    async def download(self, request, job_id, name):
+        job = self.job(job_id)
+        # Only names the job reported, so no path can reach outside its folder
+        if name not in {f["name"] for f in job.files}:
+            raise HttpError(404, f"No such file: {name}")
+        path = os.path.join(job.output_dir, *name.split("/"))
+        writer = request.writer
+        writer.write(head(200, "application/octet-stream", os.path.getsize(path),
+                          {"Content-Disposition": f'attachment; filename="{os.path.basename(path)}"'}))
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+
+    async def stats(self, request):
+        await send_json(request.writer, 200, self.service.stats())
+
+    async def models(self, request):
+        await send_json(request.writer, 200, {
+            "models": {name: {"category": m["category"], "desc": m["desc"]} for name, m in MODEL_DATABASE.items()},
+            "presets": {name: p["desc"] for name, p in ENSEMBLE_PRESETS.items() if not p.get("is_custom")},
+        })
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Run the service until cancelled"""
+    await service.start()
+    server = await asyncio.start_server(ServiceHandlers(service), host, port)
+    addresses = ", ".join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    service.log(f">> Job service listening on {addresses} ({service.workers} worker(s), "
+                f"outputs in {service.output_dir})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.shutdown()
+
+def run_service(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    try:
+        asyncio.run(serve(service, host, port))
+    except KeyboardInterrupt:
+        service.log(">> Job service stopped")
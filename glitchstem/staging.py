@@ -0,0 +1,215 @@
+"""Decode-once input staging for multi-pass workflows.
+
+audio-separator decodes and resamples its input on every run, so a
+three-model preset on an .mp3 decodes the same file three times. Inputs
+that are not already WAV at the model sample rate are decoded once, block
+by block, to a float32 WAV at that rate (channels kept) and stored by
+content hash; every pass, the chunk pipeline and later MIDI extraction
+read that file instead, and re-running on the same audio skips the decode.
+
+Layout: ``<root>/<key[:2]>/<key>/<key>.wav`` plus ``meta.json`` with a
+``last_used`` stamp for LRU pruning, so the same audio under any name
+shares one entry. Each job reads a hard link (a copy where links are not
+supported) at ``<root>/jobs/<id>/<base name>.wav``: pass outputs are named
+after the input as before, and pruning an entry in another worker never
+removes a file a running job still reads.
+"""
+import json
+import os
+import shutil
+import time
+import uuid
+
+from .hashing import file_digest, params_digest
+from .memory import GB
+from .paths import app_path
+from .streaming import stream_frames
+
+DEFAULT_STAGING_DIR = app_path("staging")
+DEFAULT_MAX_BYTES = 10 * GB
+JOBS_DIR = "jobs"
+# Job links left behind by a crashed worker
+STALE_JOB_SECONDS = 24 * 3600
+
+# audio-separator resamples everything to 44.1 kHz before inference
+MODEL_SAMPLE_RATE = 44100
+STAGED_SUBTYPE = "FLOAT"
+
+
+def needs_staging(path, sr=MODEL_SAMPLE_RATE):
+    """True unless path is already a WAV at sr (nothing to save on those)"""
+    if os.path.splitext(path)[1].lower() != ".wav":
+        return True
+    try:
+        import soundfile as sf
+        return sf.info(path).samplerate != sr
+    except Exception:
+        return True
+
+class InputStaging:
+    def __init__(self, root=DEFAULT_STAGING_DIR, max_bytes=DEFAULT_MAX_BYTES, sr=MODEL_SAMPLE_RATE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.sr = sr
+
+    def make_key(self, path):
+        return params_digest("staging-v2", file_digest(path), self.sr, STAGED_SUBTYPE)
+
+    def entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def staged_path(self, path):
+        """Where path's staged copy lives (whether or not it exists yet)"""
+        key = self.make_key(path)
+        return os.path.join(self.entry_dir(key), key + ".wav")
+
+    def lookup(self, path):
+        """Existing staged copy of path (and mark it used), or None"""
+        staged = self.staged_path(path)
+        if not os.path.exists(staged):
+            return None
+        self._write_meta(os.path.dirname(staged), path)
+        return staged
+
+    def stage(self, path, log=None):
+        """Path every pass should read: a job link to the staged copy, named
+        like path, or path itself when it needs no staging or cannot be
+        decoded here. Pass the result to release() when the job is done."""
+        log = log or (lambda message: None)
+        if not needs_staging(path, self.sr):
+            return path
+        try:
+            staged = self.lookup(path)
+            if staged:
+                log(f">> Using staged input: {os.path.basename(path)} ({self.sr} Hz float32)")
+                return self._link_for_job(staged, path)
+            start = time.perf_counter()
+            staged = self._decode(path)
+            linked = self._link_for_job(staged, path)
+        except Exception as e:
+            log(f">> Input staging skipped ({str(e)}), every pass decodes the original")
+            return path
+        log(f">> Staged input: decoded {os.path.basename(path)} once to {self.sr} Hz float32 "
+            f"in {time.perf_counter() - start:.1f}s")
+        self.prune(keep=os.path.basename(os.path.dirname(staged)))
+        return linked
+
+    def _link_for_job(self, staged, path):
+        job_dir = os.path.join(self.root, JOBS_DIR, uuid.uuid4().hex[:12])
+        os.makedirs(job_dir)
+        linked = os.path.join(job_dir, os.path.splitext(os.path.basename(path))[0] + ".wav")
+        try:
+            os.link(staged, linked)
+        except OSError:
+            shutil.copyfile(staged, linked)
+        return linked
+
+    def release(self, linked):
+        """Remove a job link stage() returned (the staged entry stays)"""
+        job_dir = os.path.dirname(linked)
+        if os.path.dirname(job_dir) == os.path.join(self.root, JOBS_DIR):
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def _decode(self, path):
+        import soundfile as sf
+
+        staged = self.staged_path(path)
+        entry_dir = os.path.dirname(staged)
+        os.makedirs(self.root, exist_ok=True)
+        tmp_dir = os.path.join(self.root, f"tmp.{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            out = None
+            try:
+                for block in stream_frames(path, self.sr):
+                    if out is None:
+                        out = sf.SoundFile(os.path.join(tmp_dir, os.path.basename(staged)), "w",
+                                           samplerate=self.sr, channels=block.shape[1],
+                                           subtype=STAGED_SUBTYPE, format="WAV")
+                    out.write(block)
+            finally:
+                if out is not None:
+                    out.close()
+            if out is None:
+                raise RuntimeError("no audio decoded")
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # Another worker staged the same audio first
+                if not os.path.exists(staged):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._write_meta(entry_dir, path)
+        return staged
+
+    def _write_meta(self, entry_dir, path):
+        meta = {"key": os.path.basename(entry_dir), "input": os.path.basename(path), "last_used": time.time(),
+                "bytes": sum(os.path.getsize(os.path.join(entry_dir, n)) for n in os.listdir(entry_dir)
+                             if n.endswith(".wav"))}
+        tmp = os.path.join(entry_dir, f"meta.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, os.path.join(entry_dir, "meta.json"))
+        except OSError:
+            pass
+
+    def entries(self):
+        """All entry metas, least recently used first"""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if len(shard) != 2 or not os.path.isdir(shard_dir):
+                continue
+            for key in os.listdir(shard_dir):
+                try:
+                    with open(os.path.join(shard_dir, key, "meta.json"), "r", encoding="utf-8") as f:
+                        found.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        found.sort(key=lambda m: m.get("last_used", 0))
+        return found
+
+    def prune(self, max_bytes=None, keep=None):
+        """Evict least-recently-used staged inputs until the folder fits.
+
+        Jobs reading an evicted entry keep their own link to it.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        jobs_dir = os.path.join(self.root, JOBS_DIR)
+        if os.path.isdir(jobs_dir):
+            for name in os.listdir(jobs_dir):
+                job_dir = os.path.join(jobs_dir, name)
+                try:
+                    if time.time() - os.path.getmtime(job_dir) > STALE_JOB_SECONDS:
+                        shutil.rmtree(job_dir, ignore_errors=True)
+                except OSError:
+                    continue
+        entries = self.entries()
+        total = sum(m.get("bytes", 0) for m in entries)
+        evicted = []
+        for meta in entries:
+            if total <= max_bytes:
+                break
+            if meta["key"] == keep:
+                continue
+            shutil.rmtree(self.entry_dir(meta["key"]), ignore_errors=True)
+            total -= meta.get("bytes", 0)
+            evicted.append(meta)
+        return evicted
+
+    def clear(self):
+        return self.prune(0)
+
+def find_staged(path, root=DEFAULT_STAGING_DIR):
+    """Staged copy of path if an earlier separation made one, else None"""
+    if not needs_staging(path):
+        return None
+    try:
+        return InputStaging(root).lookup(path)
+    except OSError:
+        return None
@@ -0,0 +1,195 @@
+"""Content-addressed cache of separated stems.
+
+A pass is identified by the input's content hash, the model file and every
+inference value that changes the output (seg_size, overlap, batch size,
+demucs shifts, normalization, output format). A hit hardlinks (or copies)
+the cached stems into the output folder instead of running the model.
+
+Layout: ``<root>/<key[:2]>/<key>/`` holds the stems as ``0.wav, 1.wav, ...``
+plus ``meta.json`` with their original names and a ``last_used`` stamp the
+LRU eviction works from. The cache keeps its own copies and hands out
+hardlinks. Entries are written to a temp folder and renamed into place, so
+concurrent batch workers never see half-written entries.
+"""
+import json
+import os
+import shutil
+import time
+import uuid
+
+from .hashing import params_digest
+from .memory import GB
+from .paths import app_path
+
+DEFAULT_CACHE_DIR = app_path("stem_cache")
+DEFAULT_MAX_BYTES = 20 * GB
+
+# Output name stand-in for the input's base name, so hits on a renamed copy
+# of the same audio still get correctly named stems
+BASE_NAME_TOKEN = "{base}"
+
+
+class StemCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(input_digest, model_filename, params):
+        return params_digest("stems-v1", input_digest, model_filename, params)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _read_meta(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, "meta.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, entry_dir, meta):
+        tmp = os.path.join(entry_dir, f"meta.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, os.path.join(entry_dir, "meta.json"))
+
+    def lookup(self, key):
+        """Entry metadata for key (and mark it used), or None"""
+        entry_dir = self._entry_dir(key)
+        meta = self._read_meta(entry_dir)
+        if meta is None:
+            return None
+        if not all(os.path.exists(os.path.join(entry_dir, f["stored"])) for f in meta["files"]):
+            return None
+        meta["last_used"] = time.time()
+        meta["hits"] = meta.get("hits", 0) + 1
+        try:
+            self._write_meta(entry_dir, meta)
+        except OSError:
+            pass
+        return meta
+
+    def materialize(self, key, output_dir, base_name):
+        """Link cached stems into output_dir, return their paths (None on miss)"""
+        meta = self.lookup(key)
+        if meta is None:
+            return None
+
+        entry_dir = self._entry_dir(key)
+        os.makedirs(output_dir, exist_ok=True)
+        outputs = []
+        for f in meta["files"]:
+            target = os.path.join(output_dir, f["name"].replace(BASE_NAME_TOKEN, base_name))
+            _link_or_copy(os.path.join(entry_dir, f["stored"]), target)
+            outputs.append(target)
+        return outputs
+
+    def store(self, key, files, base_name, info=None):
+        """Add a finished pass's stems to the cache, then evict down to max_bytes"""
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(os.path.join(entry_dir, "meta.json")):
+            return
+
+        tmp_dir = os.path.join(self.root, "tmp", uuid.uuid4().hex)
+        os.makedirs(tmp_dir)
+        try:
+            meta = {"key": key, "created": time.time(), "last_used": time.time(),
+                    "hits": 0, "info": info or {}, "files": []}
+            for i, path in enumerate(files):
+                name = os.path.basename(path)
+                if name.startswith(base_name):
+                    name = BASE_NAME_TOKEN + name[len(base_name):]
+                stored = f"{i}{os.path.splitext(path)[1]}"
+                # Copy, not link: the cache must own its inodes (see detach_links)
+                shutil.copy2(path, os.path.join(tmp_dir, stored))
+                meta["files"].append({"name": name, "stored": stored, "bytes": os.path.getsize(path)})
+            meta["bytes"] = sum(f["bytes"] for f in meta["files"])
+            self._write_meta(tmp_dir, meta)
+
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # Another worker stored the same pass first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self.prune()
+
+    def entries(self):
+        """All entry metas, least recently used first"""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if shard == "tmp" or not os.path.isdir(shard_dir):
+                continue
+            for key in os.listdir(shard_dir):
+                meta = self._read_meta(os.path.join(shard_dir, key))
+                if meta is not None:
+                    found.append(meta)
+        found.sort(key=lambda m: m.get("last_used", 0))
+        return found
+
+    def total_bytes(self):
+        return sum(m.get("bytes", 0) for m in self.entries())
+
+    def prune(self, max_bytes=None):
+        """Evict least-recently-used entries until the cache fits, return evicted metas"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(m.get("bytes", 0) for m in entries)
+        evicted = []
+        for meta in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(meta["key"]), ignore_errors=True)
+            total -= meta.get("bytes", 0)
+            evicted.append(meta)
+        return evicted
+
+    def clear(self):
+        return self.prune(0)
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            "root": self.root,
+            "entries": len(entries),
+            "bytes": sum(m.get("bytes", 0) for m in entries),
+            "max_bytes": self.max_bytes,
+            "hits": sum(m.get("hits", 0) for m in entries),
+        }
+
+def detach_links(output_dir):
+    """Replace hardlinked files in output_dir with private copies.
+
+    Called before a real run writes into a folder that may hold stems
+    materialized from the cache; the separator truncates existing files in
+    place, which would otherwise rewrite the cached copy too.
+    """
+    if not os.path.isdir(output_dir):
+        return
+    for name in os.listdir(output_dir):
+        path = os.path.join(output_dir, name)
+        try:
+            if not os.path.isfile(path) or os.stat(path).st_nlink < 2:
+                continue
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            shutil.copy2(path, tmp)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+def _link_or_copy(src, dst):
+    """Hardlink src to dst, falling back to a copy across filesystems"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
@@ -0,0 +1,54 @@
+"""Stem naming helpers for audio-separator outputs ("<base>_(Vocals)_<model>.wav")"""
+import os
+import re
+
+from .models import DEFAULT_MODEL_STEMS, MODEL_STEMS
+
+_TAG_RE = re.compile(r"\(([^()]+)\)")
+
+
+def stem_tag(filename):
+    """Lower-case stem tag of an output file ("vocals"), or None.
+
+    Post-processed files carry one tag per pass ("x_(Vocals)_a_(No Reverb)_b");
+    the last one names what the file actually holds.
+    """
+    tags = stem_tags(filename)
+    return tags[-1] if tags else None
+
+def stem_tags(filename):
+    """Every stem tag in an output filename, first pass first ("vocals", "no reverb")"""
+    return [tag.strip().lower() for tag in _TAG_RE.findall(os.path.basename(filename))]
+
+def list_stems(folder, extensions=(".wav",)):
+    """{tag: path} for the stems in one pass folder"""
+    stems = {}
+    if not os.path.isdir(folder):
+        return stems
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(extensions):
+            continue
+        tag = stem_tag(name)
+        if tag and tag not in stems:
+            stems[tag] = os.path.join(folder, name)
+    return stems
+
+def group_stems(folders):
+    """{tag: [path per folder that has it]} across several pass folders"""
+    groups = {}
+    for folder in folders:
+        for tag, path in list_stems(folder).items():
+            groups.setdefault(tag, []).append(path)
+    return groups
+
+def model_stems(model_filename):
+    """Stem names a model file writes (MODEL_STEMS keyword table)"""
+    lowered = model_filename.lower()
+    for keyword, stems in MODEL_STEMS:
+        if keyword.lower() in lowered:
+            return stems
+    return DEFAULT_MODEL_STEMS
+
+def output_name(base_name, stem, model_filename, ext="wav"):
+    """audio-separator's output filename, "<base>_(<Stem>)_<model file stem>.<ext>"."""
+    return f"{base_name}_({stem})_{os.path.splitext(model_filename)[0]}.{ext}"
@@ -0,0 +1,223 @@
+"""Bounded-memory audio input for analysis and transcription.
+
+``stream_mono`` decodes a file block by block (soundfile, or an ffmpeg pipe
+for formats libsndfile cannot read), downmixes and resamples each block
+incrementally with soxr, so nothing full-length is ever held in memory and
+consumers can start before decoding finishes. Its output matches
+``librosa.load(path, sr=sr, mono=True)`` (same decoder, soxr_hq resampler,
+same length); ``stream_frames`` is the same without the downmix.
+
+``FrameStream`` cuts that stream into STFT-ready segments with the
+``n_fft - hop`` sample overlap carried across block boundaries, so per-block
+STFTs reproduce ``librosa.stft(y, center=True)`` frame for frame.
+``chunk_stream`` does the same for long overlapping transcription chunks,
+and ``NpyAppender`` writes growing arrays straight to ``.npy`` files.
+"""
+import math
+import os
+import struct
+import subprocess
+
+import numpy as np
+
+from .hardware import CREATE_NO_WINDOW
+
+DEFAULT_BLOCK_SECONDS = 10.0
+
+
+def stream_length(path, sr):
+    """Number of samples stream_mono(path, sr) yields, or None if unknown up front"""
+    try:
+        import soundfile as sf
+        info = sf.info(path)
+    except Exception:
+        return None
+    if info.samplerate == sr:
+        return info.frames
+    # librosa.resample's fix_length size
+    return int(math.ceil(info.frames * sr / info.samplerate))
+
+def stream_mono(path, sr, block_seconds=DEFAULT_BLOCK_SECONDS):
+    """Yield mono float32 blocks of path at sr"""
+    return _stream(path, sr, block_seconds, mono=True)
+
+def stream_frames(path, sr, block_seconds=DEFAULT_BLOCK_SECONDS):
+    """Yield float32 (frames, channels) blocks of path at sr, keeping every channel"""
+    return _stream(path, sr, block_seconds, mono=False)
+
+def _stream(path, sr, block_seconds, mono):
+    try:
+        import soundfile as sf
+        f = sf.SoundFile(path)
+    except Exception:
+        f = None
+
+    if f is None:
+        yield from _stream_ffmpeg(path, sr, block_seconds, mono)
+        return
+
+    with f:
+        expected = stream_length(path, sr)
+        channels = 1 if mono else f.channels
+        resampler = None
+        if f.samplerate != sr:
+            import soxr
+            resampler = soxr.ResampleStream(f.samplerate, sr, channels, dtype="float32", quality="HQ")
+
+        def silence(frames):
+            return np.zeros(frames if mono else (frames, channels), dtype=np.float32)
+
+        written = 0
+        block_frames = max(1, int(block_seconds * f.samplerate))
+        for block in f.blocks(blocksize=block_frames, dtype="float32", always_2d=True):
+            if mono:
+                block = np.mean(block, axis=1) if block.shape[1] > 1 else block[:, 0]
+            if resampler is not None:
+                block = resampler.resample_chunk(block, last=False)
+            block = block[:max(0, expected - written)]
+            written += len(block)
+            if len(block):
+                yield block
+        if resampler is not None:
+            tail = resampler.resample_chunk(silence(0), last=True)[:max(0, expected - written)]
+            written += len(tail)
+            if len(tail):
+                yield tail
+        if written < expected:
+            yield silence(expected - written)
+
+def _stream_ffmpeg(path, sr, block_seconds, mono=True):
+    """Decode through ffmpeg (mp3/m4a/... that libsndfile cannot open)"""
+    channels = 1 if mono else 2
+    cmd = ["ffmpeg", "-v", "error", "-nostdin", "-i", path, "-f", "f32le", "-ac", str(channels),
+           "-ar", str(sr), "-"]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                creationflags=CREATE_NO_WINDOW)
+    except OSError:
+        # No ffmpeg on PATH: let librosa (audioread) decode the whole file
+        import librosa
+        y = librosa.load(path, sr=sr, mono=mono)[0].astype(np.float32)
+        yield y if mono else np.atleast_2d(y).T
+        return
+
+    frame_bytes = 4 * channels
+    block_bytes = max(1, int(block_seconds * sr)) * frame_bytes
+    try:
+        pending = b""
+        while True:
+            data = proc.stdout.read(block_bytes)
+            if not data:
+                break
+            data = pending + data
+            usable = len(data) - len(data) % frame_bytes
+            pending = data[usable:]
+            if usable:
+                block = np.frombuffer(data[:usable], dtype="<f4").astype(np.float32)
+                yield block if mono else block.reshape(-1, channels)
+    finally:
+        proc.stdout.close()
+        error = proc.stderr.read().decode("utf-8", "replace").strip()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg could not decode {os.path.basename(path)}: {error}")
+
+class FrameStream:
+    """Turns sample blocks into segments holding whole STFT frames.
+
+    Mirrors librosa's center=True framing (n_fft // 2 zeros on both ends):
+    ``librosa.stft(segment, center=False)`` on every yielded segment, in
+    order, gives exactly the frames of ``librosa.stft(y)``.
+    """
+
+    def __init__(self, n_fft, hop_length):
+        self.n_fft = n_fft
+        self.hop = hop_length
+        self.buffer = np.zeros(n_fft // 2, dtype=np.float32)
+
+    def push(self, block):
+        self.buffer = np.concatenate([self.buffer, block])
+        if len(self.buffer) < self.n_fft:
+            return None
+        frames = 1 + (len(self.buffer) - self.n_fft) // self.hop
+        segment = self.buffer[:(frames - 1) * self.hop + self.n_fft]
+        self.buffer = self.buffer[frames * self.hop:]
+        return segment
+
+    def finish(self):
+        """Last segment, after padding the end; None if no frame is left"""
+        segment = self.push(np.zeros(self.n_fft // 2, dtype=np.float32))
+        self.buffer = np.zeros(0, dtype=np.float32)
+        return segment
+
+def chunk_stream(blocks, chunk_frames, overlap_frames):
+    """Yield (start, chunk, last) overlapping chunks from a block stream.
+
+    Consecutive chunks share overlap_frames samples; only chunk + block
+    samples are buffered at a time.
+    """
+    step = chunk_frames - overlap_frames
+    buffer = np.zeros(0, dtype=np.float32)
+    start = 0
+    for block in blocks:
+        buffer = np.concatenate([buffer, block])
+        # Strictly longer: the next chunk is guaranteed to hold new samples
+        while len(buffer) > chunk_frames:
+            yield start, buffer[:chunk_frames], False
+            buffer = buffer[step:]
+            start += step
+    if len(buffer) or start == 0:
+        yield start, buffer, True
+
+class NpyAppender:
+    """Append rows to a .npy file without knowing the final length.
+
+    A fixed-size header is written first and patched with the real shape
+    on close(), so np.load(mmap_mode="r") can map the result directly.
+    """
+
+    HEADER_BYTES = 128
+
+    def __init__(self, path, dtype=np.float32):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self.row_shape = ()
+        self.file = open(path, "wb")
+        self.file.write(b"\0" * self.HEADER_BYTES)
+
+    def append(self, rows):
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        if self.rows and rows.shape[1:] != self.row_shape:
+            raise ValueError(f"row shape {rows.shape[1:]} does not match {self.row_shape}")
+        self.row_shape = rows.shape[1:]
+        self.file.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def close(self):
+        if self.file is None:
+            return
+        shape = (self.rows,) + tuple(self.row_shape)
+        header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (self.dtype.str, shape)
+        header = header.ljust(self.HEADER_BYTES - 10 - 1) + "\n"
+        self.file.seek(0)
+        self.file.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1"))
+        self.file.close()
+        self.file = None
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
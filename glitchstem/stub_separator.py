@@ -0,0 +1,85 @@
+"""Stand-in for the audio-separator executable, for benchmarks and dry runs.
+
+Takes the same command line the engine builds, waits a modelled load and
+inference time, prints the load line and tqdm-style progress the real
+separator prints, and writes one WAV per stem the model would produce
+(the input scaled down, then normalized like the separator does) under
+audio-separator's naming. No model is downloaded or run.
+
+    python -m glitchstem.stub_separator song.wav --model_filename x.ckpt --output_dir out
+
+Timing comes from the environment, so runs are reproducible:
+GLITCHSTEM_STUB_LOAD_SECONDS (default 0.5) and GLITCHSTEM_STUB_RTF, the
+seconds of inference per second of audio (default 0.02).
+"""
+import argparse
+import os
+import sys
+import time
+
+from .stems import model_stems, output_name
+
+LOAD_SECONDS_ENV = "GLITCHSTEM_STUB_LOAD_SECONDS"
+RTF_ENV = "GLITCHSTEM_STUB_RTF"
+DEFAULT_LOAD_SECONDS = 0.5
+DEFAULT_RTF = 0.02
+
+PROGRESS_STEPS = 20
+OUTPUT_SAMPLE_RATE = 44100
+
+
+def clock(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="stub-separator")
+    parser.add_argument("input")
+    parser.add_argument("--model_filename", required=True)
+    parser.add_argument("--output_dir", default=".")
+    parser.add_argument("--normalization", type=float, default=0.9)
+    args, _ = parser.parse_known_args(argv)
+
+    import numpy as np
+    import soundfile as sf
+    from .streaming import stream_frames
+
+    load_seconds = float(os.environ.get(LOAD_SECONDS_ENV, DEFAULT_LOAD_SECONDS))
+    rtf = float(os.environ.get(RTF_ENV, DEFAULT_RTF))
+
+    time.sleep(load_seconds)
+    print(f"Load model duration: {clock(load_seconds)}", flush=True)
+
+    # Decoding is real, so input staging shows up in the timings
+    audio = np.concatenate(list(stream_frames(args.input, OUTPUT_SAMPLE_RATE)))
+    if audio.shape[1] == 1:
+        audio = np.repeat(audio, 2, axis=1)
+
+    inference = len(audio) / OUTPUT_SAMPLE_RATE * rtf
+    start = time.perf_counter()
+    for step in range(PROGRESS_STEPS + 1):
+        if step:
+            time.sleep(inference / PROGRESS_STEPS)
+        elapsed = time.perf_counter() - start
+        eta = inference - elapsed
+        bar = "#" * (step * 10 // PROGRESS_STEPS)
+        print(f"{step * 100 // PROGRESS_STEPS:3d}%|{bar:<10}| {step}/{PROGRESS_STEPS} "
+              f"[{clock(elapsed)[3:]}<{clock(max(0, eta))[3:]}, {step / max(elapsed, 1e-6):.2f}it/s]", flush=True)
+
+    base_name = os.path.splitext(os.path.basename(args.input))[0]
+    stems = model_stems(args.model_filename)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for stem in stems:
+        path = os.path.join(args.output_dir, output_name(base_name, stem, args.model_filename))
+        stem_audio = audio / len(stems)
+        # Like audio-separator: an output louder than the threshold is scaled down to it
+        peak = float(np.abs(stem_audio).max()) if len(stem_audio) else 0.0
+        if peak > args.normalization:
+            stem_audio *= args.normalization / peak
+        sf.write(path, stem_audio, OUTPUT_SAMPLE_RATE, subtype="PCM_16")
+        print(f"Saved {stem} stem: {os.path.basename(path)}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""Opt-in stage tracing with Chrome trace-event export.
+
+Off unless enabled (``GLITCHSTEM_TRACE=1`` or ``=<folder>`` in the
+environment, ``glitchstem --trace``, or ``enable_tracing()``). While off,
+``span()`` returns one shared no-op context manager, so instrumented code
+pays a global lookup and a call.
+
+While on, every span records its wall time, thread and the process RSS
+(plus the torch CUDA allocator's allocated / reserved / peak bytes, when
+torch is already imported and CUDA initialised) at entry and exit. Spans
+are collected while a run is open (``start_run`` / ``finish_run``); each run
+writes the spans that overlap it to
+``~/.glitchstem/traces/<time>-<label>-<pid>-<id>.json``, which opens in Perfetto
+(ui.perfetto.dev) or chrome://tracing.
+"""
+import contextlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+from .memory import process_rss_bytes
+from .paths import app_path
+
+TRACE_ENV = "GLITCHSTEM_TRACE"
+DEFAULT_TRACE_DIR = app_path("traces")
+
+# Spans kept in memory at most (a run that never finishes cannot grow without limit)
+MAX_EVENTS = 200000
+
+NULL_SPAN = contextlib.nullcontext()
+
+_tracer = None
+
+
+def memory_sample():
+    """{"rss_bytes", and "cuda_*_bytes" when torch has CUDA initialised}"""
+    sample = {"rss_bytes": process_rss_bytes()}
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        try:
+            if torch.cuda.is_initialized():
+                sample["cuda_allocated_bytes"] = torch.cuda.memory_allocated()
+                sample["cuda_reserved_bytes"] = torch.cuda.memory_reserved()
+                sample["cuda_peak_bytes"] = torch.cuda.max_memory_allocated()
+        except Exception:
+            pass
+    return sample
+
+class Span:
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.memory = memory_sample()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        after = memory_sample()
+        args = dict(self.args)
+        for key, value in after.items():
+            args[f"{key}_start"] = self.memory.get(key)
+            args[f"{key}_end"] = value
+        if exc_type is not None:
+            args["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.complete(self.name, self.start, end, self.cat, args)
+        self.tracer.counter("memory", end, {"rss_mb": after["rss_bytes"] / 2**20})
+        return False
+
+class Tracer:
+    """Process-wide span collector; runs decide which spans get written out"""
+
+    def __init__(self, trace_dir=DEFAULT_TRACE_DIR):
+        self.trace_dir = trace_dir
+        self.pid = os.getpid()
+        self.events = []
+        self.threads = {}
+        self.runs = {}
+        self._lock = threading.Lock()
+
+    def _ts(self, t):
+        return round(t * 1e6, 1)
+
+    def complete(self, name, start, end, cat="stage", args=None):
+        """Record a finished span from perf_counter() times"""
+        thread = threading.current_thread()
+        event = {"name": name, "cat": cat, "ph": "X", "ts": self._ts(start), "dur": self._ts(end - start),
+                 "pid": self.pid, "tid": thread.ident, "args": args or {}}
+        with self._lock:
+            if not self.runs or len(self.events) >= MAX_EVENTS:
+                return
+            self.threads[thread.ident] = thread.name
+            self.events.append(event)
+
+    def counter(self, name, t, values):
+        with self._lock:
+            if self.runs and len(self.events) < MAX_EVENTS:
+                self.events.append({"name": name, "ph": "C", "ts": self._ts(t), "pid": self.pid, "args": values})
+
+    def start_run(self, label):
+        run = {"id": uuid.uuid4().hex, "label": label, "start": time.perf_counter(), "wall": time.time()}
+        with self._lock:
+            self.runs[run["id"]] = run
+        return run
+
+    def finish_run(self, run, **args):
+        """Write the run's trace file and return its path"""
+        end = time.perf_counter()
+        self.complete(run["label"], run["start"], end, "run", args)
+        start_us = self._ts(run["start"])
+        with self._lock:
+            self.runs.pop(run["id"], None)
+            events = [e for e in self.events if e["ts"] + e.get("dur", 0) >= start_us]
+            threads = dict(self.threads)
+            if not self.runs:
+                self.events = []
+                self.threads = {}
+
+        meta = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": f"glitchstem {self.pid}"}}]
+        meta += [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                 for tid, name in threads.items()]
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", run["label"]).strip("-")[:60] or "run"
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(run["wall"]))
+        path = os.path.join(self.trace_dir, f"{stamp}-{slug}-{self.pid}-{run['id'][:6]}.json")
+        os.makedirs(self.trace_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": meta + events, "displayTimeUnit": "ms",
+                       "otherData": {"label": run["label"], "started": run["wall"]}}, f)
+        return path
+
+def enable_tracing(trace_dir=None):
+    """Turn tracing on for this process"""
+    global _tracer
+    _tracer = Tracer(trace_dir or DEFAULT_TRACE_DIR)
+    return _tracer
+
+def disable_tracing():
+    global _tracer
+    _tracer = None
+
+def tracing_enabled():
+    return _tracer is not None
+
+def span(name, cat="stage", **args):
+    """Context manager timing one stage (a shared no-op while tracing is off)"""
+    tracer = _tracer
+    if tracer is None:
+        return NULL_SPAN
+    return Span(tracer, name, cat, args)
+
+def complete(name, start, end, cat="stage", **args):
+    """Record a stage timed elsewhere, from perf_counter() times"""
+    tracer = _tracer
+    if tracer is not None:
+        tracer.complete(name, start, end, cat, args)
+
+def start_run(label):
+    """Open a traced run; returns a handle for finish_run (None while tracing is off)"""
+    tracer = _tracer
+    return (tracer, tracer.start_run(label)) if tracer is not None else None
+
+def finish_run(handle, log=None, **args):
+    """Write a run's trace file; returns its path (None if untraced or the write failed)"""
+    if handle is None:
+        return None
+    tracer, run = handle
+    try:
+        path = tracer.finish_run(run, **args)
+    except OSError as e:
+        if log:
+            log(f">> Could not write trace: {e}")
+        return None
+    if log:
+        log(f">> Trace written: {path}")
+    return path
+
+@contextlib.contextmanager
+def trace_run(label, log=None):
+    """start_run() / finish_run() around a block; the run's status is "failed" if it raises"""
+    handle = start_run(label)
+    status = "failed"
+    try:
+        yield handle
+        status = "ok"
+    finally:
+        finish_run(handle, log=log, status=status)
+
+_env = os.environ.get(TRACE_ENV, "")
+if _env and _env != "0":
+    enable_tracing(None if _env == "1" else _env)
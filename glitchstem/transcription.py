@@ -0,0 +1,245 @@
+"""Warm melodic transcription engine (piano_transcription_inference).
+
+Building a PianoTranscription reloads a ~170 MB checkpoint, so the model is
+loaded once per process, optionally in the background at startup, and
+requests are served one at a time from a queue by a single worker thread
+that owns it. The engine tracks its load time and per-request inference
+time.
+
+Long inputs go through ``transcribe_stream``: overlapping chunks are
+submitted as soon as they are decoded and their note events are merged
+into one MIDI file, so memory stays flat and inference starts before the
+decode is done.
+"""
+import collections
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+
+from .streaming import chunk_stream
+from .tracing import complete, span
+
+PIANO_SAMPLE_RATE = 16000  # piano_transcription expects 16kHz
+CHECKPOINT_PATH = os.path.join(os.path.expanduser('~'), 'piano_transcription_inference_data',
+                               'note_F1=0.9677_pedal_F1=0.9186.pth')
+
+# Streaming transcription: chunk length, shared context between chunks, and
+# how many chunks may wait for the model while decoding continues
+CHUNK_SECONDS = 120.0
+OVERLAP_SECONDS = 10.0
+MAX_PENDING_CHUNKS = 2
+
+
+def transcription_available():
+    """True when piano_transcription_inference and torch can be imported"""
+    import importlib.util
+    return all(importlib.util.find_spec(m) is not None for m in ("piano_transcription_inference", "torch"))
+
+def default_device():
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+class TranscriptionEngine:
+    """One loaded PianoTranscription model behind a request queue"""
+
+    def __init__(self, device=None, checkpoint_path=CHECKPOINT_PATH, log=None):
+        self.device = device
+        self.checkpoint_path = checkpoint_path
+        self.log = log or (lambda message: None)
+        self.model = None
+        self.load_seconds = None
+        self.load_error = None
+        self.requests = 0
+        self.inference_seconds = 0.0
+        self.last_inference_seconds = None
+        self._queue = queue.Queue()
+        self._outstanding = 0
+        self._ready = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def start(self, preload=True):
+        """Start the worker thread; with preload it loads the model right away"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, args=(preload,),
+                                                name="transcription", daemon=True)
+                self._thread.start()
+        return self
+
+    def _load(self):
+        if self.model is not None:
+            return
+        from piano_transcription_inference import PianoTranscription
+
+        self.device = self.device or default_device()
+        start = time.time()
+        # Explicit checkpoint path (fixes Windows path issue)
+        with span("transcription.load_model", device=self.device):
+            self.model = PianoTranscription(device=self.device, checkpoint_path=self.checkpoint_path)
+        self.load_seconds = time.time() - start
+        self.log(f">> Piano transcription model loaded on {self.device.upper()} in {self.load_seconds:.1f}s")
+
+    def _worker(self, preload):
+        if preload:
+            try:
+                self._load()
+            except Exception as e:
+                self.load_error = e
+                self.log(f">> Piano transcription preload failed: {str(e)}")
+        self._ready.set()
+
+        while True:
+            future, audio, midi_output = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._outstanding -= 1
+                continue
+            try:
+                self._load()
+                start = time.time()
+                with span("transcription.inference", seconds_of_audio=len(audio) / PIANO_SAMPLE_RATE):
+                    transcribed = self.model.transcribe(audio, midi_output)
+                seconds = time.time() - start
+                self.requests += 1
+                self.inference_seconds += seconds
+                self.last_inference_seconds = seconds
+                future.set_result({"output": midi_output, "seconds": seconds,
+                                   "notes": transcribed.get("est_note_events", []),
+                                   "pedals": transcribed.get("est_pedal_events", [])})
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._outstanding -= 1
+
+    def submit(self, audio, midi_output):
+        """Queue 16 kHz mono audio for transcription; returns a Future of
+        {"output", "seconds", "notes", "pedals"}. midi_output may be None to
+        only get the events back."""
+        self.start(preload=False)
+        future = concurrent.futures.Future()
+        with self._lock:
+            self._outstanding += 1
+        self._queue.put((future, audio, midi_output))
+        return future
+
+    def transcribe(self, audio, midi_output):
+        return self.submit(audio, midi_output).result()
+
+    def wait_ready(self, timeout=None):
+        """Block until a background preload has finished (or failed)"""
+        return self._ready.wait(timeout)
+
+    def pending(self):
+        """Requests queued or running"""
+        return self._outstanding
+
+    def stats(self):
+        return {
+            "device": self.device,
+            "loaded": self.loaded,
+            "load_seconds": self.load_seconds,
+            "requests": self.requests,
+            "inference_seconds": self.inference_seconds,
+            "last_inference_seconds": self.last_inference_seconds,
+            "pending": self.pending(),
+        }
+
+class TranscriptionPool:
+    """A few warm engines; each request goes to the least busy one.
+
+    The first engine is the process-wide one, so a GUI that already
+    preloaded it does not load the model again.
+    """
+
+    def __init__(self, size=1, log=None):
+        self.engines = [get_transcription_engine(log)]
+        self.engines += [TranscriptionEngine(log=log) for _ in range(max(1, size) - 1)]
+        for engine in self.engines:
+            engine.start(preload=True)
+
+    def submit(self, audio, midi_output):
+        return min(self.engines, key=lambda e: e.pending()).submit(audio, midi_output)
+
+    def stats(self):
+        return [engine.stats() for engine in self.engines]
+
+def transcribe_stream(engine, blocks, midi_output, chunk_seconds=CHUNK_SECONDS,
+                      overlap_seconds=OVERLAP_SECONDS):
+    """Transcribe a stream of 16 kHz mono blocks into one MIDI file.
+
+    ``engine`` is a TranscriptionEngine or TranscriptionPool. Chunks overlap
+    by overlap_seconds; every event is kept from the chunk whose core (the
+    span between the overlap midpoints) contains its onset, so each chunk
+    sees at least half the overlap of context around what it contributes.
+    Returns {"output", "seconds", "chunks", "notes", "decode_seconds",
+    "write_seconds"}; seconds is the model's inference time.
+    """
+    from piano_transcription_inference.utilities import write_events_to_midi
+
+    chunk_frames = int(chunk_seconds * PIANO_SAMPLE_RATE)
+    overlap_frames = int(overlap_seconds * PIANO_SAMPLE_RATE)
+    half_overlap = overlap_seconds / 2.0
+
+    notes, pedals = [], []
+    stats = {"seconds": 0.0, "chunks": 0, "decode_seconds": 0.0}
+    pending = collections.deque()
+
+    def decoded(blocks):
+        # Time spent waiting on the decoder, between chunk submissions
+        blocks = iter(blocks)
+        while True:
+            start = time.perf_counter()
+            block = next(blocks, None)
+            end = time.perf_counter()
+            stats["decode_seconds"] += end - start
+            complete("transcription.decode", start, end)
+            if block is None:
+                return
+            yield block
+
+    def collect():
+        future, offset, first, last = pending.popleft()
+        result = future.result()
+        lo = float("-inf") if first else offset + half_overlap
+        hi = float("inf") if last else offset + chunk_seconds - half_overlap
+        for events, merged in ((result["notes"], notes), (result["pedals"], pedals)):
+            for event in events:
+                onset = event["onset_time"] + offset
+                if lo <= onset < hi:
+                    merged.append(dict(event, onset_time=onset, offset_time=event["offset_time"] + offset))
+        stats["seconds"] += result["seconds"]
+        stats["chunks"] += 1
+
+    for start, chunk, last in chunk_stream(decoded(blocks), chunk_frames, overlap_frames):
+        pending.append((engine.submit(chunk, None), start / PIANO_SAMPLE_RATE, start == 0, last))
+        while len(pending) > MAX_PENDING_CHUNKS:
+            collect()
+    while pending:
+        collect()
+
+    write_start = time.perf_counter()
+    with span("transcription.write_midi", notes=len(notes)):
+        write_events_to_midi(start_time=0, note_events=notes, pedal_events=pedals, midi_path=midi_output)
+    return {"output": midi_output, "seconds": stats["seconds"], "chunks": stats["chunks"], "notes": len(notes),
+            "decode_seconds": stats["decode_seconds"], "write_seconds": time.perf_counter() - write_start}
+
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+def get_transcription_engine(log=None):
+    """Process-wide TranscriptionEngine (created on first use)"""
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = TranscriptionEngine(log=log)
+        elif log is not None:
+            _default_engine.log = log
+        return _default_engine
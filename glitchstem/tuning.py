@@ -0,0 +1,235 @@
+"""Per-model auto-tuning of segment size, overlap and batch size.
+
+HARDWARE_PRESETS choose inference settings from VRAM alone. ``tune_model``
+runs one model on a short clip for every combination in a grid instead,
+records the wall time and the separator process's peak memory (RAM, plus
+VRAM on NVIDIA), and keeps the fastest combination that succeeded within
+the pass memory budget. Results are stored per hardware fingerprint in
+``~/.glitchstem/tuning.json``; ``SeparationEngine(tuned_settings=...)``
+runs tuned models with them instead of the global settings.
+
+Only MDXC (Roformer ``.ckpt``) models take these flags; Demucs and MDX
+ONNX models are not tuned.
+"""
+import collections
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+from .hardware import CREATE_NO_WINDOW, cached_gpu_info, hardware_fingerprint, hardware_profile
+from .memory import GB, PeakSampler, default_pass_budget, estimate_pass_bytes
+from .models import MODEL_DATABASE
+from .paths import app_path
+
+DEFAULT_TUNING_PATH = app_path("tuning.json")
+
+# Overlap trades speed for smoothness, so the grid starts at the lowest
+# overlap that still sounds clean rather than at the fastest one
+TUNING_GRID = {
+    "seg_size": [128, 256, 512, 1024],
+    "overlap": [4, 8],
+    "batch_size": [1, 2, 4],
+}
+CLIP_SECONDS = 20.0
+CLIP_SAMPLE_RATE = 44100
+
+# A trial is stopped once it has run this much longer than the best so far
+SLOWER_CUTOFF = 1.5
+TRIAL_TIMEOUT = 30 * 60
+
+
+def tunable(model_name):
+    """True for models whose speed the mdxc_* flags control"""
+    model_filename = MODEL_DATABASE[model_name]["file"]
+    return model_filename.endswith(".ckpt") and "htdemucs" not in model_filename
+
+def grid_settings(grid=TUNING_GRID):
+    """Every seg_size/overlap/batch_size combination, cheapest first"""
+    keys = ("seg_size", "overlap", "batch_size")
+    combos = itertools.product(*(sorted(grid[k]) for k in keys))
+    return sorted((dict(zip(keys, c)) for c in combos),
+                  key=lambda s: (s["seg_size"] * s["batch_size"], s["overlap"], s["batch_size"]))
+
+def make_clip(path, seconds=CLIP_SECONDS, source=None):
+    """Write a stereo 44.1 kHz benchmark clip: the start of source, or synthetic audio"""
+    import numpy as np
+    import soundfile as sf
+
+    frames = int(seconds * CLIP_SAMPLE_RATE)
+    if source:
+        from .streaming import stream_frames
+
+        blocks, have = [], 0
+        for block in stream_frames(source, CLIP_SAMPLE_RATE):
+            blocks.append(block[:frames - have])
+            have += len(blocks[-1])
+            if have >= frames:
+                break
+        audio = np.concatenate(blocks)
+        if audio.shape[1] == 1:
+            audio = np.repeat(audio, 2, axis=1)
+    else:
+        # Chords, a bass line and noise bursts: enough spectral content for every model type
+        rng = np.random.default_rng(0)
+        t = np.arange(frames) / CLIP_SAMPLE_RATE
+        tones = sum(np.sin(2 * np.pi * f * t) for f in (110.0, 220.0, 277.2, 329.6, 440.0)) / 5
+        bursts = rng.standard_normal(frames) * (np.sin(2 * np.pi * 2 * t) > 0.9)
+        mono = 0.4 * tones + 0.2 * bursts
+        audio = np.stack([mono, np.roll(mono, 441)], axis=1)
+    sf.write(path, audio.astype(np.float32), CLIP_SAMPLE_RATE, subtype="PCM_16")
+    return path
+
+def run_trial(engine, model_name, clip, settings, output_dir, timeout=TRIAL_TIMEOUT, vram=False):
+    """One separator run with settings; returns its time, peak memory and outcome"""
+    trial = engine.for_pass("", engine.threads)
+    trial.settings = dict(engine.settings, **settings)
+    trial.tuned_settings = None
+    trial.settings_overrides = {}
+    os.makedirs(output_dir, exist_ok=True)
+    cmd = trial.build_command(model_name, clip, output_dir)
+
+    tail = collections.deque(maxlen=5)
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                            env=trial.subprocess_env(), creationflags=CREATE_NO_WINDOW)
+    reader = threading.Thread(target=lambda: [tail.append(line.strip()) for line in proc.stdout if line.strip()],
+                              daemon=True)
+    reader.start()
+    timed_out = False
+    with PeakSampler(proc.pid, vram) as sampler:
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            proc.kill()
+            proc.wait()
+    reader.join()
+    seconds = time.perf_counter() - start
+    ok = proc.returncode == 0 and not timed_out
+    return {"settings": dict(settings), "ok": ok, "timed_out": timed_out, "seconds": seconds,
+            "peak_ram_bytes": sampler.peak_ram, "peak_vram_bytes": sampler.peak_vram,
+            "error": None if ok or timed_out else (tail[-1] if tail else f"exit code {proc.returncode}")}
+
+def tune_model(engine, model_name, clip, grid=TUNING_GRID, budget_bytes=None, gpu_info=None, log=print):
+    """Benchmark model_name over the grid; returns the tuning record (best is None if nothing fit)"""
+    gpu_info = gpu_info or cached_gpu_info()
+    use_vram = bool(gpu_info.get("cuda_available"))
+    budget_bytes = budget_bytes or default_pass_budget(gpu_info)
+    model_filename = MODEL_DATABASE[model_name]["file"]
+    scratch = tempfile.mkdtemp(prefix="glitchstem-tune-")
+    trials = []
+    best = None
+
+    try:
+        candidates = grid_settings(grid)
+        # Untimed first run: downloads the checkpoint and warms the disk cache
+        log(f">> {model_name}: warm-up run...")
+        warmup = run_trial(engine, model_name, clip, candidates[0], os.path.join(scratch, "warmup"), vram=use_vram)
+        if not warmup["ok"]:
+            log(f">> {model_name}: warm-up failed ({warmup['error']}), not tuned")
+            return {"model": model_name, "best": None, "trials": [warmup], "error": warmup["error"]}
+
+        failed = []
+        for i, settings in enumerate(candidates, 1):
+            label = f"seg {settings['seg_size']}, overlap {settings['overlap']}, batch {settings['batch_size']}"
+            if any(settings["seg_size"] >= s and settings["batch_size"] >= b for s, b in failed):
+                log(f"   [{i}/{len(candidates)}] {label}: skipped (a smaller setting already failed)")
+                continue
+            if estimate_pass_bytes(model_filename, settings) > 2 * budget_bytes:
+                log(f"   [{i}/{len(candidates)}] {label}: skipped (estimated memory far over budget)")
+                continue
+
+            timeout = min(TRIAL_TIMEOUT, best["seconds"] * SLOWER_CUTOFF) if best else TRIAL_TIMEOUT
+            trial = run_trial(engine, model_name, clip, settings, os.path.join(scratch, str(i)),
+                              timeout=timeout, vram=use_vram)
+            peak = trial["peak_vram_bytes"] if use_vram else trial["peak_ram_bytes"]
+            # An unmeasured peak proves nothing about fitting the budget
+            trial["measured"] = bool(peak)
+            trial["fits"] = trial["ok"] and trial["measured"] and peak <= budget_bytes
+            trials.append(trial)
+
+            if trial["timed_out"]:
+                status = "stopped (slower than best)" if best else "timed out"
+            elif not trial["ok"]:
+                status = f"FAILED ({trial['error']})"
+                failed.append((settings["seg_size"], settings["batch_size"]))
+            elif not trial["measured"]:
+                status = f"{trial['seconds']:.1f}s, peak memory not measured"
+            else:
+                status = f"{trial['seconds']:.1f}s, peak {peak / GB:.2f} GB" + ("" if trial["fits"] else " (over budget)")
+            log(f"   [{i}/{len(candidates)}] {label}: {status}")
+
+            if trial["fits"] and (best is None or trial["seconds"] < best["seconds"]):
+                best = trial
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    clip_seconds = _clip_seconds(clip)
+    record = {"model": model_name, "file": model_filename, "tuned_at": time.time(),
+              "clip_seconds": clip_seconds, "budget_bytes": budget_bytes, "best": None, "trials": trials}
+    if best:
+        record["best"] = dict(best["settings"], seconds=best["seconds"],
+                              realtime=clip_seconds / best["seconds"] if clip_seconds else None,
+                              peak_ram_bytes=best["peak_ram_bytes"], peak_vram_bytes=best["peak_vram_bytes"])
+        log(f">> {model_name}: best seg {best['settings']['seg_size']}, overlap {best['settings']['overlap']}, "
+            f"batch {best['settings']['batch_size']} ({best['seconds']:.1f}s for {clip_seconds:.0f}s of audio)")
+    elif any(t["ok"] and not t["measured"] for t in trials):
+        log(f">> {model_name}: peak {'VRAM' if use_vram else 'RAM'} could not be measured "
+            f"(is psutil installed? nvidia-smi may report N/A per process), not tuned")
+    else:
+        log(f">> {model_name}: no setting ran within {budget_bytes / GB:.1f} GB")
+    return record
+
+def _clip_seconds(clip):
+    try:
+        import soundfile as sf
+        info = sf.info(clip)
+        return info.frames / info.samplerate
+    except Exception:
+        return None
+
+class TuningStore:
+    """tuning.json: {fingerprint: {"hardware": profile, "models": {name: record}}}"""
+
+    def __init__(self, path=DEFAULT_TUNING_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, model_name, record, profile=None):
+        """Store one model's tuning record under this machine's fingerprint"""
+        profile = profile or hardware_profile()
+        fingerprint = hardware_fingerprint(profile)
+        with self._lock:
+            data = self.load()
+            machine = data.setdefault(fingerprint, {"hardware": profile, "models": {}})
+            machine["hardware"] = profile
+            machine["models"][model_name] = record
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.path)
+        return fingerprint
+
+    def tuned_settings(self, fingerprint=None):
+        """{model_name: {"seg_size", "overlap", "batch_size"}} tuned on this (or the given) machine"""
+        machine = self.load().get(fingerprint or hardware_fingerprint(), {})
+        tuned = {}
+        for model_name, record in machine.get("models", {}).items():
+            best = record.get("best")
+            if best and model_name in MODEL_DATABASE:
+                tuned[model_name] = {k: int(best[k]) for k in ("seg_size", "overlap", "batch_size")}
+        return tuned
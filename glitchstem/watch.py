@@ -0,0 +1,288 @@
+"""Watch-folder daemon: separate every track dropped into the watched folders.
+
+Folders are polled (no platform file-watch API needed, works on network
+shares). A new file is queued once its size and mtime have not changed for
+``settle_seconds`` and it can be opened for reading, so half-copied tracks
+are never picked up. Each folder has its own model or ENSEMBLE_PRESETS
+workflow and output folder.
+
+Jobs go through a process pool of ``workers`` (``batch.run_job``, the same
+worker the CLI batch uses). What has been processed is kept in
+``~/.glitchstem/watch_state.json``, keyed by content hash and workflow, so
+restarting the daemon, or dropping the same audio again under another
+name, does not process it twice.
+"""
+import collections
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .batch import AUDIO_EXTENSIONS, run_job
+from .hashing import file_digest
+from .paths import app_path
+
+DEFAULT_STATE_PATH = app_path("watch_state.json")
+DEFAULT_INTERVAL = 2.0
+DEFAULT_SETTLE_SECONDS = 5.0
+# With --once, a settled file that still can't be opened or hashed after this long is given up on
+UNREADABLE_GIVE_UP_SECONDS = 30.0
+
+
+def state_key(digest, workflow):
+    """Processed-state key: the same audio may still be run through other workflows"""
+    return f"{digest}:{workflow}"
+
+class WatchState:
+    """watch_state.json: {"processed": {key: record}, "seen": {path: [size, mtime_ns, digest]}}"""
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.processed = data.get("processed", {})
+        self.seen = data.get("seen", {})
+
+    def digest(self, path, st):
+        """Content hash of path; rehashed only when size or mtime changed"""
+        cached = self.seen.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = file_digest(path)
+        self.seen[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def is_done(self, key, retry_failed=False):
+        record = self.processed.get(key)
+        return record is not None and (record["success"] or not retry_failed)
+
+    def mark(self, key, record):
+        self.processed[key] = record
+        self.save()
+
+    def save(self):
+        with self._lock:
+            # Forget files that are gone; processed keys stay (the same audio may come back)
+            self.seen = {path: v for path, v in self.seen.items() if os.path.exists(path)}
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"processed": self.processed, "seen": self.seen}, f, indent=1)
+            os.replace(tmp, self.path)
+
+class FolderWatcher:
+    """Poll folders, queue settled new files, run them through a bounded pool.
+
+    ``folders`` is a list of {"path", "model", "output_dir", "recursive"};
+    ``job_options`` holds the remaining batch.run_job fields (settings,
+    backend, caches, ...).
+    """
+
+    def __init__(self, folders, job_options, workers=1, state=None, interval=DEFAULT_INTERVAL,
+                 settle_seconds=DEFAULT_SETTLE_SECONDS, retry_failed=False, log=print):
+        self.folders = [dict(f, path=os.path.abspath(f["path"]), output_dir=os.path.abspath(f["output_dir"]))
+                        for f in folders]
+        self.job_options = job_options
+        self.workers = max(1, workers)
+        self.state = state or WatchState()
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.retry_failed = retry_failed
+        self.log = log
+        self.pending = {}       # path -> (size, mtime_ns, first seen with that size/mtime)
+        self.unreadable = {}    # path -> when it first settled but could not be opened or hashed
+        self.given_up = set()   # unreadable paths skipped from now on (--once only)
+        self.give_up_seconds = None
+        self.queue = collections.deque()
+        self.queued = set()     # state keys queued or running
+        self.running = {}       # future -> (job, key)
+        self.stopped = threading.Event()
+
+    def _scan(self, folder):
+        # Outputs written into a watched folder must not be picked up again
+        outputs = [f["output_dir"] + os.sep for f in self.folders]
+        for root, dirs, files in os.walk(folder["path"]):
+            if any((root + os.sep).startswith(out) for out in outputs):
+                dirs[:] = []
+                continue
+            for name in sorted(files):
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    yield os.path.join(root, name)
+            if not folder.get("recursive"):
+                break
+
+    def _settled(self, path, st, now):
+        """True once the file has stopped changing and can be opened"""
+        stamp = (st.st_size, st.st_mtime_ns)
+        seen = self.pending.get(path)
+        if seen is None or seen[:2] != stamp:
+            self.pending[path] = stamp + (now,)
+            return False
+        if now - seen[2] < self.settle_seconds or now - st.st_mtime < self.settle_seconds:
+            return False
+        try:
+            # Writers on Windows hold the file exclusively until they are done
+            with open(path, "rb"):
+                pass
+        except OSError:
+            self.unreadable.setdefault(path, now)
+            return False
+        return True
+
+    def _give_up(self, path, folder, now):
+        """True (and logged) once an unreadable file has waited give_up_seconds"""
+        since = self.unreadable.get(path)
+        if self.give_up_seconds is None or since is None or now - since < self.give_up_seconds:
+            return False
+        self.pending.pop(path, None)
+        self.unreadable.pop(path, None)
+        self.given_up.add(path)
+        self.log(f">> Gave up on {os.path.relpath(path, folder['path'])}: "
+                 f"could not be read for {now - since:.0f}s")
+        return True
+
+    def poll(self, now=None):
+        """Scan every folder once; queue new settled files. Returns how many were queued"""
+        now = now or time.time()
+        added = 0
+        hashed = False
+        scanned = set()
+        for folder in self.folders:
+            for path in self._scan(folder):
+                if path in self.given_up:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                scanned.add(path)
+                cached = self.state.seen.get(path)
+                if cached and cached[:2] == [st.st_size, st.st_mtime_ns]:
+                    key = state_key(cached[2], folder["model"])
+                    if key in self.queued or self.state.is_done(key, self.retry_failed):
+                        self.pending.pop(path, None)
+                        continue
+                if not self._settled(path, st, now):
+                    self._give_up(path, folder, now)
+                    continue
+                try:
+                    key = state_key(self.state.digest(path, st), folder["model"])
+                except OSError:
+                    self.unreadable.setdefault(path, now)
+                    self._give_up(path, folder, now)
+                    continue
+                self.pending.pop(path, None)
+                self.unreadable.pop(path, None)
+                hashed = True
+                if key in self.queued:
+                    continue
+                if self.state.is_done(key, self.retry_failed):
+                    done = self.state.processed[key]
+                    self.log(f">> Skipped: {os.path.relpath(path, folder['path'])} "
+                             f"(same audio as {os.path.basename(done['input'])}, already processed)")
+                    continue
+                job = dict(self.job_options, input=path, model=folder["model"], output_dir=folder["output_dir"])
+                self.queue.append((job, key))
+                self.queued.add(key)
+                added += 1
+                self.log(f">> Queued: {os.path.relpath(path, folder['path'])} -> {folder['model']}")
+        # Files deleted or renamed before they settled
+        for path in [p for p in self.pending if p not in scanned]:
+            del self.pending[path]
+        self.unreadable = {p: since for p, since in self.unreadable.items() if p in self.pending}
+        if hashed:
+            self.state.save()
+        return added
+
+    def mark_existing(self):
+        """Record every file already in the folders as processed (start without the backlog)"""
+        count = 0
+        for folder in self.folders:
+            for path in self._scan(folder):
+                try:
+                    key = state_key(self.state.digest(path, os.stat(path)), folder["model"])
+                except OSError:
+                    continue
+                if key not in self.state.processed:
+                    self.state.processed[key] = {"input": path, "model": folder["model"], "success": True,
+                                                 "skipped": True, "finished": time.time()}
+                    count += 1
+        self.state.save()
+        self.log(f">> Marked {count} existing file(s) as done")
+
+    def _finish(self, future):
+        job, key = self.running.pop(future)
+        try:
+            result = future.result()
+        except Exception as e:
+            # Worker crashed hard (killed, out of memory, ...)
+            result = {"input": job["input"], "model": job["model"], "success": False, "error": str(e), "seconds": 0.0}
+        self.queued.discard(key)
+        self.state.mark(key, {"input": job["input"], "model": job["model"], "output_dir": job["output_dir"],
+                              "success": result["success"], "error": result.get("error"),
+                              "seconds": result.get("seconds"), "finished": time.time()})
+        status = "OK" if result["success"] else f"FAILED ({result.get('error') or 'see log'})"
+        self.log(f">> {status}: {os.path.basename(job['input'])} in {result.get('seconds') or 0:.1f}s "
+                 f"({len(self.queue)} queued, {len(self.running)} running)")
+
+    def run(self, once=False):
+        """Watch until stop() (or, with once, until the current backlog is done)"""
+        for folder in self.folders:
+            self.log(f">> Watching {folder['path']} -> {folder['model']} (output: {folder['output_dir']})")
+        self.log(f">> {self.workers} worker(s), polling every {self.interval:g}s, "
+                 f"files settle after {self.settle_seconds:g}s")
+        if once:
+            self.give_up_seconds = max(UNREADABLE_GIVE_UP_SECONDS, self.settle_seconds)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                while not self.stopped.is_set():
+                    self.poll()
+                    while self.queue and len(self.running) < self.workers:
+                        job, key = self.queue.popleft()
+                        self.running[pool.submit(run_job, job)] = (job, key)
+                    if once and not self.queue and not self.running and not self.pending:
+                        break
+                    if self.running:
+                        done, _ = wait(list(self.running), timeout=self.interval, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self._finish(future)
+                    else:
+                        self.stopped.wait(self.interval)
+                for future in list(self.running):
+                    wait([future])
+                    self._finish(future)
+            except KeyboardInterrupt:
+                # Ctrl+C reaches the workers too: nothing running is recorded, so it all runs next time
+                self.log(f">> Interrupted: {len(self.running) + len(self.queue)} unfinished job(s) "
+                         f"will run on the next start")
+                pool.shutdown(wait=True, cancel_futures=True)
+        self.log(">> Watcher stopped")
+
+    def stop(self):
+        self.stopped.set()
+
+def load_watch_config(path, model=None, output_dir=None, recursive=False):
+    """Folder entries from a JSON config: {"folders": [{"path", "model", "output_dir", "recursive"}]}.
+
+    Entries without a model / output_dir / recursive use the given defaults;
+    relative paths are resolved against the config file's folder.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    folders = []
+    for entry in config.get("folders", []):
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        folder = {"path": os.path.join(base_dir, os.path.expanduser(entry["path"])),
+                  "model": entry.get("model", model),
+                  "output_dir": os.path.join(base_dir, os.path.expanduser(entry.get("output_dir") or output_dir)),
+                  "recursive": entry.get("recursive", recursive)}
+        folders.append(folder)
+    return folders
@@ -0,0 +1,399 @@
+"""Ensemble workflows as a graph of stages.
+
+A workflow is a list of nodes (ENSEMBLE_PRESETS[...]["graph"]):
+
+    {"id": "pass_1", "op": "separate", "model": "HTDemucs-ft"}
+    {"id": "split", "op": "post_process", "model": "DrumSep-6way", "input": "pass_1:drums"}
+    {"id": "midi", "op": "transcribe", "input": "split:*", "kind": "drums"}
+    {"id": "combined", "op": "combine", "input": ["pass_1", "pass_2"], "method": "mean"}
+
+``input`` is one reference or a list of them: ``"input"`` (the track being
+processed), ``"<node>:<tag>"`` (that node's outputs with this stem tag, see
+glitchstem.stems), or ``"<node>"`` / ``"<node>:*"`` (all its outputs).
+"separate" reads the track unless told otherwise. "post_process" and
+"transcribe" fan out to one task per matched stem; "combine" merges, per
+stem tag, the stems at least two of its inputs produced (one task per tag,
+``weights`` follow the input order). ``"first": true`` keeps only the first
+matched stem. Each node writes to ``<work dir>/<dir>`` (default
+``pass_<n>_<model>`` for separate nodes, else OP_FOLDERS).
+
+The runner starts every task whose inputs are finished, on up to
+``max_parallel_passes`` threads (default: one per core, and at least one
+per model stage). Model tasks also
+reserve their estimated memory from the engine's MemoryBudget first. With
+``stream_chunk_seconds`` set, a separate node on the track that feeds a
+post_process node runs chunk-pipelined into it (glitchstem.pipeline).
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .catalog import register_model
+from .delivery import INTERMEDIATE_SUBTYPE
+from .memory import GB
+from .stems import stem_tag, stem_tags
+from .tracing import span
+
+INPUT = "input"
+OPS = ("separate", "post_process", "combine", "transcribe")
+MODEL_OPS = ("separate", "post_process")
+OP_FOLDERS = {"post_process": "post_processed", "combine": "combined", "transcribe": "midi"}
+
+# Stem tags the legacy "output_stem" names (custom ensemble dialog) route to
+LEGACY_STEM_TAGS = {
+    "drums": ["drums"],
+    "vocals": ["vocals"],
+    "instrumental": ["instrumental", "other"],
+    "both": ["vocals"],
+}
+
+
+class WorkflowError(ValueError):
+    pass
+
+def parse_ref(ref):
+    """(node id, tag or None for every output)"""
+    node_id, _, tag = ref.partition(":")
+    tag = tag.strip().lower()
+    return node_id, None if tag in ("", "*") else tag
+
+def node_refs(node):
+    refs = node.get("input", INPUT)
+    return [refs] if isinstance(refs, str) else list(refs)
+
+def validate_graph(graph):
+    """Nodes of graph in a runnable (topological) order; raises WorkflowError"""
+    from .combine import METHODS
+
+    nodes = {}
+    for node in graph:
+        node_id = node.get("id")
+        if not node_id or node_id == INPUT or ":" in node_id:
+            raise WorkflowError(f"Bad node id: {node_id!r}")
+        if node_id in nodes:
+            raise WorkflowError(f"Duplicate node id: {node_id}")
+        if node.get("op") not in OPS:
+            raise WorkflowError(f"{node_id}: unknown op {node.get('op')!r} (use {', '.join(OPS)})")
+        if node["op"] in MODEL_OPS:
+            # Catalog models (models_list.json) are added to MODEL_DATABASE here
+            model = register_model(node.get("model") or "")
+            if model is None:
+                raise WorkflowError(f"{node_id}: unknown model {node.get('model')!r}")
+            if model != node["model"]:
+                node = dict(node, model=model)
+        if node["op"] == "combine":
+            if node.get("method", "mean") not in METHODS:
+                raise WorkflowError(f"{node_id}: unknown combine method {node.get('method')!r}")
+            if node.get("weights") and len(node["weights"]) != len(node_refs(node)):
+                raise WorkflowError(f"{node_id}: one weight per input needed")
+        nodes[node_id] = node
+
+    order, state = [], {}
+
+    def visit(node_id, path):
+        if state.get(node_id) == "done":
+            return
+        if state.get(node_id) == "visiting":
+            raise WorkflowError(f"Cycle: {' -> '.join(path + [node_id])}")
+        state[node_id] = "visiting"
+        for ref in node_refs(nodes[node_id]):
+            upstream, _ = parse_ref(ref)
+            if upstream == INPUT:
+                continue
+            if upstream not in nodes:
+                raise WorkflowError(f"{node_id}: input {ref!r} names no node")
+            visit(upstream, path + [node_id])
+        state[node_id] = "done"
+        order.append(nodes[node_id])
+
+    for node_id in nodes:
+        visit(node_id, [])
+    return order
+
+def upstream_ids(node):
+    return {parse_ref(ref)[0] for ref in node_refs(node)} - {INPUT}
+
+def graph_models(graph):
+    """Models the workflow runs, in node order"""
+    return [node["model"] for node in graph if node["op"] in MODEL_OPS]
+
+def describe_node(node):
+    """One-line summary for logs, e.g. "post: DrumSep-6way <- pass_1:drums"."""
+    what = node.get("model") or node.get("method") or node["op"]
+    refs = node_refs(node)
+    return f"{node['id']}: {what}" if refs == [INPUT] else f"{node['id']}: {what} <- {', '.join(refs)}"
+
+def legacy_graph(config, first_target_only=False):
+    """Graph for a {"models", "post_process", "output_stem", "combine", "weights"} workflow"""
+    models = config["models"]
+    graph = [{"id": f"pass_{i}", "op": "separate", "model": model} for i, model in enumerate(models, 1)]
+    if config.get("combine") and len(models) > 1:
+        node = {"id": "combined", "op": "combine", "input": [n["id"] for n in graph], "method": config["combine"]}
+        if config.get("weights"):
+            node["weights"] = config["weights"]
+        graph.append(node)
+    if config.get("post_process") and models:
+        output_stem = config.get("output_stem") or "vocals"
+        tags = LEGACY_STEM_TAGS.get(output_stem, [output_stem.lower()])
+        graph.append({"id": "post", "op": "post_process", "model": config["post_process"],
+                      "input": [f"pass_1:{tag}" for tag in tags], "first": first_target_only})
+    return graph
+
+def preset_graph(preset):
+    """A preset's graph (older dict-style presets are converted)"""
+    return preset["graph"] if "graph" in preset else legacy_graph(preset)
+
+def pass_outputs(folder, input_file):
+    """[(tag, path)] of the stems a pass on input_file wrote to folder"""
+    prefix = os.path.splitext(os.path.basename(input_file))[0] + "_("
+    if not os.path.isdir(folder):
+        return []
+    return [(stem_tag(name), os.path.join(folder, name)) for name in sorted(os.listdir(folder))
+            if name.startswith(prefix) and name.lower().endswith(".wav")]
+
+class WorkflowRunner:
+    """Runs one workflow graph for one input on an engine"""
+
+    def __init__(self, engine, graph, input_file, work_dir):
+        self.engine = engine
+        self.nodes = validate_graph(graph)
+        self.by_id = {node["id"]: node for node in self.nodes}
+        self.input_file = input_file
+        self.work_dir = work_dir
+        self.base_name = os.path.splitext(os.path.basename(input_file))[0]
+        self.outputs = {node["id"]: [] for node in self.nodes}
+        self.status = {node["id"]: None for node in self.nodes}
+        self.remaining = {}
+        self.failed_tasks = {}
+
+        models = [node for node in self.nodes if node["op"] in MODEL_OPS]
+        self.width = max(1, engine.max_parallel_passes or max(len(models), os.cpu_count() or 1))
+        parallel = min(self.width, len(models)) if models else 1
+        self.budget = engine.get_memory_budget() if parallel > 1 else None
+        # Concurrent CPU passes split the cores instead of each grabbing all of them
+        self.threads = max(1, (engine.threads or os.cpu_count() or 1) // parallel) if parallel > 1 else engine.threads
+        self.fused = self.stream_pairs() if engine.stream_chunk_seconds else {}
+        self._transcriber = None
+        self._lock = threading.Lock()
+
+    def folder(self, node):
+        if node.get("dir"):
+            return os.path.join(self.work_dir, node["dir"])
+        if node["op"] == "separate":
+            index = [n["id"] for n in self.nodes if n["op"] == "separate"].index(node["id"]) + 1
+            return os.path.join(self.work_dir, f"pass_{index}_{node['model']}")
+        return os.path.join(self.work_dir, OP_FOLDERS[node["op"]])
+
+    def stream_pairs(self):
+        """{separate node id: post_process node id} to run chunk-pipelined"""
+        from .audio_io import AudioReader
+
+        pairs = {}
+        for node in self.nodes:
+            refs = [parse_ref(ref) for ref in node_refs(node)]
+            upstream = {node_id for node_id, _ in refs}
+            if node["op"] != "post_process" or len(upstream) != 1 or any(tag is None for _, tag in refs):
+                continue
+            source = self.by_id.get(next(iter(upstream)))
+            if source and source["op"] == "separate" and node_refs(source) == [INPUT] and source["id"] not in pairs:
+                pairs[source["id"]] = node["id"]
+        if not pairs:
+            self.engine.log(">> --stream: no post-process stage reads a separate stage directly, "
+                            "running passes end to end")
+        else:
+            try:
+                AudioReader(self.input_file).close()
+            except Exception as e:
+                self.engine.log(f">> Streaming unavailable for this input ({str(e)}), running passes end to end")
+                return {}
+        return pairs
+
+    def resolve(self, node):
+        """[(path, ref index)] of the finished upstream stems node reads"""
+        matched = []
+        for index, ref in enumerate(node_refs(node)):
+            node_id, tag = parse_ref(ref)
+            if node_id == INPUT:
+                matched.append((self.input_file, index))
+                continue
+            matched += [(path, index) for out_tag, path in self.outputs[node_id] if tag is None or out_tag == tag]
+        if node.get("first"):
+            matched = matched[:1]
+        return matched
+
+    def tasks(self, node):
+        """Callables for node's tasks, each returning [(node id, ok, [(tag, path)])]"""
+        op = node["op"]
+        if op == "separate" and node["id"] in self.fused:
+            post = self.by_id[self.fused[node["id"]]]
+            return [lambda: self.run_streamed(node, post)]
+        inputs = self.resolve(node)
+        if op in MODEL_OPS:
+            return [lambda path=path: self.run_pass(node, path) for path, _ in inputs]
+        if op == "transcribe":
+            from .midi_batch import route_stem
+            return [lambda path=path: self.run_transcribe(node, path) for path, _ in inputs
+                    if node.get("kind") or route_stem(path)]
+        groups = {}
+        for path, index in inputs:
+            groups.setdefault(stem_tag(path), []).append((path, index))
+        groups = {tag: sources for tag, sources in groups.items() if tag and len(sources) > 1}
+        if not groups:
+            self.engine.log(f">> WARNING: [{node['id']}] no stem was produced by more than one input, "
+                            f"nothing to combine")
+        return [lambda tag=tag, sources=sources: self.run_combine(node, tag, sources)
+                for tag, sources in groups.items()]
+
+    def run_pass(self, node, input_file):
+        model_name = node["model"]
+        out_dir = self.folder(node)
+        os.makedirs(out_dir, exist_ok=True)
+        engine = self.engine
+        label = f"\n[{node['id']}] {model_name}: {os.path.basename(input_file)}"
+        if self.budget is None:
+            engine.log(label)
+            success = engine.run_model(model_name, input_file, out_dir)
+        else:
+            need = engine.pass_bytes(model_name)
+            if need > self.budget.total_bytes:
+                engine.log(f">> {model_name} may need ~{need / GB:.1f} GB, more than the "
+                           f"{self.budget.total_bytes / GB:.1f} GB budget: running it alone")
+            with self.budget.reserve(need):
+                engine.log(f"{label} (~{need / GB:.1f} GB, {self.budget.in_use / GB:.1f}/"
+                           f"{self.budget.total_bytes / GB:.1f} GB admitted)")
+                success = engine.for_pass(f"[{node['id']}] ", self.threads).run_model(model_name, input_file, out_dir)
+        return [(node["id"], bool(success), pass_outputs(out_dir, input_file))]
+
+    def run_streamed(self, node, post):
+        from .pipeline import run_pipelined
+
+        pass_dir, post_dir = self.folder(node), self.folder(post)
+        # Stitch the target stem into pass_dir too when anything besides post reads it
+        consumers = [n for n in self.nodes if node["id"] in upstream_ids(n) and n is not post]
+        tags = [parse_ref(ref)[1] for ref in node_refs(post)]
+        self.engine.log(f"\n[{node['id']}] Streaming {node['model']} -> {post['model']} "
+                        f"({self.engine.stream_chunk_seconds:g}s chunks)...")
+        primary_ok, post_ok = run_pipelined(self.engine, node["model"], post["model"], self.input_file,
+                                            pass_dir, post_dir, tags,
+                                            chunk_seconds=self.engine.stream_chunk_seconds,
+                                            keep_intermediate=bool(consumers), first_target_only=post.get("first"))
+        # Other post_process nodes may share post_dir: keep what came from the target stems
+        post_outputs = [(tag, path) for tag, path in pass_outputs(post_dir, self.input_file)
+                        if len(stem_tags(path)) > 1 and stem_tags(path)[0] in tags]
+        return [(node["id"], primary_ok, pass_outputs(pass_dir, self.input_file)),
+                (post["id"], primary_ok and post_ok, post_outputs)]
+
+    def run_combine(self, node, tag, sources):
+        from .combine import combine_files
+
+        method = node.get("method", "mean")
+        weights = [node["weights"][index] for _, index in sources] if node.get("weights") else None
+        if method == "weighted" and weights is None:
+            weights = [1.0] * len(sources)
+        output = os.path.join(self.folder(node), f"{self.base_name}_({tag.title()})_ensemble_{method}.wav")
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        self.engine.log(f">> [{node['id']}] Combining {len(sources)} x {tag} ({method})...")
+        with span("combine", method=method, tag=tag, sources=len(sources)):
+            combine_files([path for path, _ in sources], output, method, weights, subtype=INTERMEDIATE_SUBTYPE)
+        return [(node["id"], True, [(tag, output)])]
+
+    def run_transcribe(self, node, path):
+        from .midi_batch import drum_job, melodic_job, midi_output_path, route_stem
+
+        kind = node.get("kind") or route_stem(path)
+        output = midi_output_path(path, kind, self.folder(node))
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        self.engine.log(f">> [{node['id']}] Transcribing {kind}: {os.path.basename(path)}")
+        if kind == "drums":
+            record = drum_job(path, output)
+        else:
+            pool, store = self.transcriber()
+            record = melodic_job(path, output, pool, store)
+        self.engine.emit(dict(record, type="transcribe"))
+        return [(node["id"], True, [(stem_tag(path) or kind, output)])]
+
+    def transcriber(self):
+        """Warm melodic transcription model shared by this run's tasks (loaded on first use)"""
+        from .features import FeatureStore
+        from .transcription import TranscriptionPool, transcription_available
+
+        with self._lock:
+            if self._transcriber is None:
+                if not transcription_available():
+                    raise RuntimeError("piano_transcription_inference not available")
+                self._transcriber = (TranscriptionPool(1, log=self.engine.log), FeatureStore())
+            return self._transcriber
+
+    def ready(self):
+        """Nodes whose inputs have all finished and that have not started"""
+        finished = {node_id for node_id, status in self.status.items() if status not in (None, "running")}
+        return [node for node in self.nodes if self.status[node["id"]] is None and upstream_ids(node) <= finished]
+
+    def start(self, node, pool, futures):
+        covered = [node["id"]]
+        if node["id"] in self.fused:
+            covered.append(self.fused[node["id"]])
+        try:
+            tasks = self.tasks(node)
+        except Exception as e:
+            self.engine.log(f">> WARNING: [{node['id']}] {str(e)}")
+            tasks = None
+        if not tasks:
+            if tasks is not None and node["op"] == "combine":
+                status = "ok"
+            elif not all(self.status[u] == "ok" for u in upstream_ids(node)):
+                status = "skipped"
+                self.engine.log(f">> WARNING: [{node['id']}] skipped, an input stage did not succeed")
+            else:
+                status = "failed"
+                self.engine.log(f">> WARNING: [{node['id']}] could not find {', '.join(node_refs(node))}")
+            for node_id in covered:
+                self.status[node_id] = status
+            return
+        for node_id in covered:
+            self.status[node_id] = "running"
+            self.remaining[node_id] = len(tasks)
+            self.failed_tasks[node_id] = 0
+        for task in tasks:
+            futures[pool.submit(task)] = covered
+
+    def finish(self, future, covered):
+        try:
+            results = future.result()
+        except Exception as e:
+            self.engine.log(f">> WARNING: [{covered[0]}] {type(e).__name__}: {str(e)}")
+            results = [(node_id, False, []) for node_id in covered]
+        for node_id, success, outputs in results:
+            self.outputs[node_id] += outputs
+            self.remaining[node_id] -= 1
+            if not success:
+                self.failed_tasks[node_id] += 1
+            if self.remaining[node_id] == 0:
+                self.status[node_id] = "failed" if self.failed_tasks[node_id] else "ok"
+                if self.failed_tasks[node_id]:
+                    node = self.by_id[node_id]
+                    self.engine.log(f">> WARNING: [{node_id}] {node.get('model') or node['op']} failed "
+                                    f"({self.failed_tasks[node_id]} task(s)), continuing...")
+
+    def run(self):
+        """Run every node; returns True when all of them succeeded"""
+        os.makedirs(self.work_dir, exist_ok=True)
+        start = time.perf_counter()
+        futures = {}
+        with span("workflow", nodes=len(self.nodes)), \
+                ThreadPoolExecutor(max_workers=self.width, thread_name_prefix="stage") as pool:
+            while True:
+                for node in self.ready():
+                    self.start(node, pool, futures)
+                if not futures:
+                    if not self.ready():
+                        break
+                    continue
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.finish(future, futures.pop(future))
+        failed = [node_id for node_id, status in self.status.items() if status != "ok"]
+        self.engine.log(f"\n>> Workflow: {len(self.nodes) - len(failed)}/{len(self.nodes)} stage(s) ok "
+                        f"in {time.perf_counter() - start:.1f}s" + (f" (not ok: {', '.join(failed)})" if failed else ""))
+        return not failed